@@ -0,0 +1,168 @@
+"""
+Micro-benchmark delle funzioni "calde" di EasyBroadcast.
+
+Misura escape_markdown_v2, format_message (il formato di get_message),
+parse_version, parse_history (lo split "\\n\\n" di refresh_history) e
+load_json/save_json su bozze grandi, senza aprire alcuna finestra.
+
+Uso:
+    python bench_hotpaths.py                      # esegue e stampa i risultati
+    python bench_hotpaths.py --save baseline.json # salva una nuova baseline
+    python bench_hotpaths.py --baseline baseline.json --threshold 0.15
+                                                  # confronta, exit 1 se regressione
+    python bench_hotpaths.py --quick              # dataset ridotti (sviluppo)
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from ebapp import load_app
+
+EMOJIS = ["👍", "🎉", "🔥", "🚀", "💡", "✅", "❌", "🏐", "🏆", "📣"]
+SPECIALS = "_*[]()~`>#+-=|{}.!"
+WORDS = ["partita", "sabato", "ore", "palestra", "squadra", "risultato", "set",
+         "convocati", "allenamento", "annullato", "campionato", "under"]
+
+
+# ---------- Dataset sintetici ----------
+def make_text(rng, n_words, emoji_ratio=0.0, special_ratio=0.1):
+    out = []
+    for _ in range(n_words):
+        r = rng.random()
+        if r < emoji_ratio:
+            out.append(rng.choice(EMOJIS))
+        elif r < emoji_ratio + special_ratio:
+            out.append(rng.choice(WORDS) + rng.choice(SPECIALS))
+        else:
+            out.append(rng.choice(WORDS))
+    return " ".join(out)
+
+def make_history(rng, n_entries):
+    start = datetime(2024, 1, 1)
+    chunks = []
+    for i in range(n_entries):
+        ts = (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')
+        chunks.append(f"{ts} -> {make_text(rng, rng.randint(5, 40), 0.05)}\n\n")
+    return "".join(chunks)
+
+def make_drafts(rng, n_drafts, body_words):
+    return [{
+        "title": make_text(rng, 6, 0.1),
+        "body": make_text(rng, body_words, 0.1),
+        "signature": "La Segreteria",
+        "category": "Avvisi: 📣",
+        "chat": "Prima Squadra",
+        "attachment_path": None,
+        "attachment_type": None
+    } for _ in range(n_drafts)]
+
+
+# ---------- Misurazione ----------
+def measure(fn, repeat, number=1):
+    """Ritorna la mediana (in secondi) di `repeat` misure da `number` chiamate."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return statistics.median(samples)
+
+def run_benchmarks(app, quick=False):
+    rng = random.Random(1234)
+    results = {}
+
+    history_sizes = [10_000, 100_000] if quick else [10_000, 100_000, 1_000_000]
+    body_words = 300 if quick else 2000
+    repeat = 3 if quick else 5
+
+    plain = make_text(rng, body_words)
+    emoji_heavy = make_text(rng, body_words, emoji_ratio=0.5)
+    special_heavy = make_text(rng, body_words, special_ratio=0.6)
+
+    results["escape_markdown_v2.plain"] = measure(lambda: app.escape_markdown_v2(plain), repeat, 20)
+    results["escape_markdown_v2.emoji"] = measure(lambda: app.escape_markdown_v2(emoji_heavy), repeat, 20)
+    results["escape_markdown_v2.special"] = measure(lambda: app.escape_markdown_v2(special_heavy), repeat, 20)
+
+    title = make_text(rng, 8, 0.2)
+    results["format_message.long_body"] = measure(
+        lambda: app.format_message(title, emoji_heavy, "La Segreteria", "Avvisi: 📣"), repeat, 20)
+
+    versions = [f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 99)}" for _ in range(1000)]
+    versions += [f"EasyBroadcast-{v}" for v in versions[:100]] + ["non-valida"] * 10
+    results["parse_version.x1000"] = measure(lambda: [app.parse_version(v) for v in versions], repeat)
+
+    for n in history_sizes:
+        text = make_history(rng, n)
+        results[f"parse_history.{n}"] = measure(lambda: app.parse_history(text), repeat if n < 1_000_000 else 1)
+
+    drafts = make_drafts(rng, 1000, body_words // 4)
+    draft_path = os.path.join(app.DATA_DIR, "bench_draft.json")
+    results["save_json.drafts_1000"] = measure(lambda: app.save_json(draft_path, drafts), repeat)
+    results["load_json.drafts_1000"] = measure(lambda: app.load_json(draft_path, []), repeat)
+
+    return results
+
+
+# ---------- Baseline ----------
+def compare(results, baseline, threshold):
+    """Ritorna la lista dei benchmark peggiorati oltre la soglia."""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old and value > old * (1 + threshold):
+            regressions.append((name, old, value))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark delle funzioni calde di EasyBroadcast")
+    parser.add_argument("--quick", action="store_true", help="dataset ridotti")
+    parser.add_argument("--save", metavar="FILE", help="salva i risultati come baseline JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="baseline JSON da confrontare")
+    parser.add_argument("--threshold", type=float, default=0.15, help="regressione tollerata (0.15 = +15%%)")
+    args = parser.parse_args()
+
+    save_path = os.path.abspath(args.save) if args.save else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="eb_bench_") as workdir:
+        try:
+            app = load_app(workdir)
+            results = run_benchmarks(app, quick=args.quick)
+        finally:
+            os.chdir(cwd)
+
+    for name, value in results.items():
+        print(f"{name:<36} {value * 1000:10.3f} ms")
+
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "python": platform.python_version(),
+                "quick": args.quick,
+                "results": results
+            }, f, indent=2)
+        print(f"\nBaseline salvata in {save_path}")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressioni oltre il {args.threshold:.0%}:")
+            for name, old, new in regressions:
+                print(f"  {name}: {old * 1000:.3f} ms -> {new * 1000:.3f} ms")
+            sys.exit(1)
+        print("\nNessuna regressione rispetto alla baseline.")
+
+if __name__ == "__main__":
+    main()
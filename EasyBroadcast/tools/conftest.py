@@ -0,0 +1,20 @@
+"""
+Fixture comuni ai test degli strumenti: ogni test importa easybroadcast.py in
+una directory temporanea, così eb_data/ non tocca i dati reali.
+"""
+import os
+
+import pytest
+
+from ebapp import load_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    cwd = os.getcwd()
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    try:
+        yield load_app(str(workdir))
+    finally:
+        os.chdir(cwd)
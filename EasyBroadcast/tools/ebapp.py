@@ -0,0 +1,18 @@
+"""Import di easybroadcast.py per gli strumenti di sviluppo (benchmark, load test)."""
+import importlib.util
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(HERE, "..", "updates", "easybroadcast.py")
+
+def load_app(workdir):
+    """
+    Importa easybroadcast.py dentro workdir: il modulo crea eb_data/ nella
+    directory corrente, quindi non deve toccare i dati reali.
+    Non crea nessuna finestra Tk, quindi funziona anche senza display.
+    """
+    os.chdir(workdir)
+    spec = importlib.util.spec_from_file_location("easybroadcast", APP_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
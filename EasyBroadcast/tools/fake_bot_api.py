@@ -0,0 +1,222 @@
+"""
+Server locale che imita la Bot API di Telegram, per test di carico.
+
+Implementa sendMessage, sendPhoto, sendDocument, copyMessage, forwardMessage,
+editMessageText, editMessageCaption, deleteMessage, getMe, getUpdates e
+getChat sugli URL /bot<TOKEN>/<metodo>, con latenza configurabile ed errori iniettati
+(429 con retry_after, 403, 400). Per usarlo dall'applicazione impostare in
+eb_data/settings.json:
+
+    "BOT_API_BASE_URL": "http://127.0.0.1:8081/bot"
+
+Uso:
+    python fake_bot_api.py --port 8081 --latency-ms 40 --jitter-ms 20 \\
+        --rate-limit 30 --p429 0.01 --p403 0.005 --p400 0.005
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "copyMessage", "forwardMessage"}
+EDIT_METHODS = {"editMessageText", "editMessageCaption"}
+
+
+class FakeBotAPI:
+    """Stato condiviso del server: configurazione, contatori e limiti per token."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, rate_limit=0, retry_after=1,
+                 p429=0.0, p403=0.0, p400=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit # Messaggi al secondo per token, 0 = illimitato
+        self.retry_after = retry_after
+        self.p429 = p429
+        self.p403 = p403
+        self.p400 = p400
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count(1)
+        self.windows = {} # token -> (inizio finestra, messaggi nella finestra)
+        self.stats = {"requests": 0, "sent": 0, "429": 0, "403": 0, "400": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _over_rate_limit(self, token):
+        """Finestra fissa di un secondo per token, come il flood control di Telegram."""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            start, count = self.windows.get(token, (now, 0))
+            if now - start >= 1.0:
+                start, count = now, 0
+            if count >= self.rate_limit:
+                self.windows[token] = (start, count)
+                return True
+            self.windows[token] = (start, count + 1)
+            return False
+
+    def handle(self, token, method, params):
+        """Ritorna (status HTTP, corpo JSON) per una chiamata alla Bot API."""
+        self._count("requests")
+        delay = self.latency_ms + (self.rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if method in SEND_METHODS | EDIT_METHODS | {"deleteMessage"}:
+            if self._over_rate_limit(token) or self.rng.random() < self.p429:
+                self._count("429")
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {self.retry_after}",
+                             "parameters": {"retry_after": self.retry_after}}
+            r = self.rng.random()
+            if r < self.p403:
+                self._count("403")
+                return 403, {"ok": False, "error_code": 403,
+                             "description": "Forbidden: bot was blocked by the user"}
+            if r < self.p403 + self.p400:
+                self._count("400")
+                return 400, {"ok": False, "error_code": 400,
+                             "description": "Bad Request: chat not found"}
+            self._count("sent")
+            if method == "deleteMessage":
+                return 200, {"ok": True, "result": True}
+            if method == "copyMessage":
+                with self.lock:
+                    return 200, {"ok": True, "result": {"message_id": next(self.message_ids)}}
+            return 200, {"ok": True, "result": self._message(method, params)}
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": abs(hash(token)) % 10**9, "is_bot": True,
+                "first_name": "FakeBot", "username": "fake_eb_bot"}}
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": []}
+        if method == "getChat":
+            return 200, {"ok": True, "result": self._chat(params.get("chat_id"))}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def _chat(self, chat_id):
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            chat_id = 0
+        return {"id": chat_id, "type": "group" if chat_id < 0 else "private", "title": f"Chat {chat_id}"}
+
+    def _message(self, method, params):
+        with self.lock:
+            message_id = next(self.message_ids)
+        message = {"message_id": message_id, "date": int(time.time()),
+                   "chat": self._chat(params.get("chat_id"))}
+        if method in EDIT_METHODS:
+            message["message_id"] = int(params.get("message_id", message_id))
+            key = "text" if method == "editMessageText" else "caption"
+            message[key] = params.get(key, "")
+            message["edit_date"] = message["date"]
+        elif method in ("sendMessage", "forwardMessage"):
+            message["text"] = params.get("text", "")
+        else:
+            message["caption"] = params.get("caption", "")
+            file_obj = {"file_id": f"F{message_id}", "file_unique_id": f"U{message_id}"}
+            if method == "sendPhoto":
+                message["photo"] = [dict(file_obj, width=320, height=240)]
+            else:
+                message["document"] = file_obj
+        return message
+
+
+def parse_params(content_type, body):
+    """Legge i parametri di una richiesta urlencoded, JSON o multipart."""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name and part.get_filename() is None:
+                params[name] = part.get_content()
+        return params
+    return dict(parse_qsl(body.decode("utf-8")))
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _dispatch(self):
+            parts = self.path.split("?", 1)[0].strip("/").split("/")
+            if len(parts) != 2 or not parts[0].startswith("bot"):
+                status, payload = 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+            else:
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                params = parse_params(self.headers.get("Content-Type", ""), body)
+                status, payload = api.handle(parts[0][3:], parts[1], params)
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+
+        def log_message(self, format, *args):
+            pass # Silenzioso: sotto carico il log su stderr falserebbe le misure
+
+    return Handler
+
+
+def start_server(api, host="127.0.0.1", port=8081):
+    """Avvia il server in un thread daemon e lo ritorna (server.server_address per la porta)."""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    server.api = api
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0, help="latenza fissa per richiesta")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="latenza casuale aggiuntiva")
+    parser.add_argument("--rate-limit", type=int, default=0, help="messaggi/s per token prima del 429 (0 = nessuno)")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after restituito nei 429")
+    parser.add_argument("--p429", type=float, default=0.0, help="probabilità di 429 casuale")
+    parser.add_argument("--p403", type=float, default=0.0, help="probabilità di 403")
+    parser.add_argument("--p400", type=float, default=0.0, help="probabilità di 400")
+    parser.add_argument("--seed", type=int, default=None)
+
+def api_from_args(args):
+    return FakeBotAPI(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                      rate_limit=args.rate_limit, retry_after=args.retry_after,
+                      p429=args.p429, p403=args.p403, p400=args.p400, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Finta Bot API di Telegram per test locali")
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api_from_args(args)))
+    print(f"Fake Bot API in ascolto su http://{args.host}:{args.port}/bot<TOKEN>/<metodo>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
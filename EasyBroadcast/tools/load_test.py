@@ -0,0 +1,100 @@
+"""
+Test di carico del percorso di invio di EasyBroadcast contro la finta Bot API.
+
+Crea il Bot con create_bot() dell'applicazione puntandolo al server locale e
+invia N messaggi con deliver_message(), riportando messaggi al secondo,
+latenza p50/p99 e comportamento dei retry sui 429.
+
+Uso:
+    python load_test.py --messages 5000 --concurrency 16 --latency-ms 40 --p429 0.01
+    python load_test.py --server http://127.0.0.1:8081/bot   # server già avviato
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+import fake_bot_api
+from ebapp import load_app
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+async def run_load(app, base_url, token, messages, concurrency, chats, max_retries):
+    # Una connessione per invio concorrente: con il pool predefinito (1) le richieste
+    # si accoderebbero su un'unica connessione e il test misurerebbe solo la latenza
+    bot = app.create_bot(token, {"BOT_API_BASE_URL": base_url}, pool_size=concurrency)
+    text = app.format_message("Test di carico", "Messaggio di prova 🏐 con caratteri speciali: 3-1 (25-20)!",
+                              "La Segreteria", "Avvisi: 📣")
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    retries = Counter()
+    failures = Counter()
+
+    async def one(i):
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                _, n_retries = await app.deliver_message(bot, -1000 - (i % chats), text, max_retries=max_retries)
+                retries[n_retries] += 1
+                latencies.append(time.perf_counter() - t0)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    async with bot:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(messages)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, latencies, retries, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Test di carico dell'invio verso la finta Bot API")
+    fake_bot_api.add_arguments(parser)
+    parser.add_argument("--server", help="base URL di un server già avviato (es. http://127.0.0.1:8081/bot)")
+    parser.add_argument("--token", default="123456:LOADTEST")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chats", type=int, default=5000, help="numero di chat distinte simulate")
+    parser.add_argument("--max-retries", type=int, default=3)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.server
+    if not base_url:
+        server = fake_bot_api.start_server(fake_bot_api.api_from_args(args), args.host, 0)
+        base_url = f"http://{args.host}:{server.server_address[1]}/bot"
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="eb_load_") as workdir:
+        try:
+            app = load_app(workdir)
+            elapsed, latencies, retries, failures = asyncio.run(run_load(
+                app, base_url, args.token, args.messages, args.concurrency, args.chats, args.max_retries))
+        finally:
+            os.chdir(cwd)
+            if server:
+                server.shutdown()
+
+    sent = len(latencies)
+    print(f"Endpoint:          {base_url}")
+    print(f"Messaggi inviati:  {sent}/{args.messages} in {elapsed:.2f} s")
+    print(f"Throughput:        {sent / elapsed if elapsed else 0:.1f} msg/s")
+    if latencies:
+        print(f"Latenza p50:       {percentile(latencies, 50) * 1000:.1f} ms")
+        print(f"Latenza p99:       {percentile(latencies, 99) * 1000:.1f} ms")
+        print(f"Latenza media:     {statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"Retry per invio:   {dict(sorted(retries.items()))}")
+    print(f"Fallimenti:        {dict(failures) or 'nessuno'}")
+    if server:
+        print(f"Statistiche server: {server.api.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Test di andata e ritorno dei backup di EasyBroadcast: completo, incrementale
+e archivi costruiti apposta per scrivere fuori da eb_data.
+
+Uso:
+    python -m pytest test_backup.py
+"""
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+
+def write_file(app, rel, text):
+    path = os.path.join(app.DATA_DIR, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def read_file(app, rel):
+    with open(os.path.join(app.DATA_DIR, *rel.split("/")), encoding="utf-8") as f:
+        return f.read()
+
+def malicious_archive(path, rel, data=b"pwned"):
+    """Archivio con un membro data/<rel> e un manifest coerente con i suoi hash."""
+    manifest = {"backup_version": 2, "base": None, "archive": os.path.basename(path),
+                "files": {rel: {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data),
+                                "mtime_ns": 0, "in": os.path.basename(path)}}}
+    with tarfile.open(path, "w:gz") as tar:
+        info = tarfile.TarInfo(f"data/{rel}")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+        payload = json.dumps(manifest).encode("utf-8")
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+
+
+def test_full_round_trip(app, tmp_path):
+    write_file(app, "draft.json", "[1, 2, 3]")
+    write_file(app, "attachments/ab/abcdef.pdf", "pdf")
+    archive = str(tmp_path / "full.tar.gz")
+    app.write_backup_archive(archive)
+
+    write_file(app, "draft.json", "modificato")
+    os.remove(os.path.join(app.DATA_DIR, "attachments", "ab", "abcdef.pdf"))
+    app.restore_backup_archive(archive)
+
+    assert read_file(app, "draft.json") == "[1, 2, 3]"
+    assert read_file(app, "attachments/ab/abcdef.pdf") == "pdf"
+
+def test_incremental_round_trip(app, tmp_path):
+    write_file(app, "draft.json", "bozza")
+    write_file(app, "log.txt", "prima")
+    base = app.write_backup_archive(str(tmp_path / "base.tar.gz"))
+
+    write_file(app, "log.txt", "dopo, più lungo")
+    incremental = str(tmp_path / "incr.tar.gz")
+    manifest = app.write_backup_archive(incremental, base)
+    assert manifest["files"]["draft.json"]["in"] == "base.tar.gz"
+    assert manifest["files"]["log.txt"]["in"] == "incr.tar.gz"
+
+    write_file(app, "draft.json", "persa")
+    write_file(app, "log.txt", "persa")
+    app.restore_backup_archive(incremental)
+    assert read_file(app, "draft.json") == "bozza"
+    assert read_file(app, "log.txt") == "dopo, più lungo"
+
+@pytest.mark.parametrize("rel", ["../../escaped.txt", "../escaped.txt", "/tmp/escaped.txt", "img/../../escaped.txt"])
+def test_malicious_archive_is_rejected(app, tmp_path, rel):
+    write_file(app, "draft.json", "intatto")
+    archive = str(tmp_path / "evil.tar.gz")
+    malicious_archive(archive, rel)
+
+    with pytest.raises(ValueError):
+        app.restore_backup_archive(archive)
+    work = os.getcwd()
+    assert not os.path.exists(os.path.join(work, "escaped.txt"))
+    assert not os.path.exists(os.path.join(os.path.dirname(work), "escaped.txt"))
+    assert read_file(app, "draft.json") == "intatto"
+
+def test_malicious_base_archive_name_is_rejected(app, tmp_path):
+    write_file(app, "draft.json", "intatto")
+    archive = str(tmp_path / "incr.tar.gz")
+    manifest = {"backup_version": 2, "base": "../base.tar.gz", "archive": "incr.tar.gz",
+                "files": {"draft.json": {"sha256": "0" * 64, "size": 1, "mtime_ns": 0, "in": "../base.tar.gz"}}}
+    with tarfile.open(archive, "w:gz") as tar:
+        payload = json.dumps(manifest).encode("utf-8")
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+
+    with pytest.raises(ValueError):
+        app.restore_backup_archive(archive)
+    assert read_file(app, "draft.json") == "intatto"
+
+def test_non_regular_members_are_skipped(app, tmp_path):
+    archive = str(tmp_path / "link.tar.gz")
+    manifest = {"backup_version": 2, "base": None, "archive": "link.tar.gz", "files": {}}
+    with tarfile.open(archive, "w:gz") as tar:
+        info = tarfile.TarInfo("data/link")
+        info.type = tarfile.SYMTYPE
+        info.linkname = "/etc/passwd"
+        tar.addfile(info)
+        payload = json.dumps(manifest).encode("utf-8")
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+
+    app.restore_backup_archive(archive)
+    assert not os.path.lexists(os.path.join(app.DATA_DIR, "link"))
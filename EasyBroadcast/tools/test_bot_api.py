@@ -0,0 +1,26 @@
+"""
+Test degli indirizzi del server Bot API e della modalità locale.
+
+Uso:
+    python -m pytest test_bot_api.py
+"""
+import pytest
+
+
+@pytest.mark.parametrize("base, file, expected", [
+    ("", "", (None, None)),
+    ("http://host:8081", "", ("http://host:8081/bot", "http://host:8081/file/bot")),
+    ("http://host:8081/bot", "", ("http://host:8081/bot", "http://host:8081/file/bot")),
+    (" http://host:8081/bot/ ", "", ("http://host:8081/bot", "http://host:8081/file/bot")),
+    ("http://host:8081", "http://files:8082", ("http://host:8081/bot", "http://files:8082/file/bot")),
+    ("http://host:8081", "http://files:8082/file", ("http://host:8081/bot", "http://files:8082/file/bot")),
+    ("http://host:8081", "http://files:8082/file/bot", ("http://host:8081/bot", "http://files:8082/file/bot")),
+])
+def test_bot_api_urls(app, base, file, expected):
+    assert app.bot_api_urls({"BOT_API_BASE_URL": base, "BOT_API_FILE_URL": file}) == expected
+
+def test_local_mode_needs_a_server(app):
+    assert not app.local_mode({"BOT_API_LOCAL_MODE": True})
+    assert not app.local_mode({"BOT_API_LOCAL_MODE": True, "BOT_API_BASE_URL": "  "})
+    assert not app.local_mode({"BOT_API_LOCAL_MODE": False, "BOT_API_BASE_URL": "http://host:8081"})
+    assert app.local_mode({"BOT_API_LOCAL_MODE": True, "BOT_API_BASE_URL": "http://host:8081"})
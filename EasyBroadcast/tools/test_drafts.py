@@ -0,0 +1,49 @@
+"""
+Test delle revisioni delle bozze: i delta di testo e di bozza devono
+ricostruire esattamente la versione precedente.
+
+Uso:
+    python -m pytest test_drafts.py
+"""
+import pytest
+
+CASES = [
+    ("", ""),
+    ("", "testo"),
+    ("testo", ""),
+    ("riga 1\nriga 2\n", "riga 1\nriga 2\n"),
+    ("riga 1\nriga 2\nriga 3", "riga 1\nnuova\nriga 3"),
+    ("a\nb\nc\n", "c\nb\na\n"),
+    ("senza a capo finale", "senza a capo finale\n"),
+    ("uno\n\n\ndue\n", "uno\ndue\n\n\n"),
+    ("emoji 🚀\naccenti àèì\n", "emoji 🎉\naccenti àèì\naggiunta\n"),
+]
+
+
+@pytest.mark.parametrize("new, old", CASES)
+def test_text_delta_round_trip(app, new, old):
+    assert app.apply_text_delta(new, app.text_delta(new, old)) == old
+
+def test_text_delta_copies_unchanged_lines(app):
+    new = "".join(f"riga {i}\n" for i in range(100))
+    old = new.replace("riga 50\n", "modificata\n")
+    ops = app.text_delta(new, old)
+    assert ops == [[0, 50], "modificata\n", [51, 100]]
+
+def test_draft_delta_round_trip(app):
+    old = {"title": "Titolo", "body": "a\nb\nc", "signature": "Firma", "category": "Nessuna", "chat": "Tutti"}
+    new = dict(old, title="Nuovo titolo", body="a\nB\nc")
+    delta = app.draft_delta(new, old)
+    assert set(delta) == {"title", "body_delta"}
+    restored = app.apply_draft_delta(new, delta)
+    assert {k: restored[k] for k in old} == old
+
+def test_draft_revisions_rebuild_every_version(app):
+    draft = {"title": "v0", "body": "corpo\n"}
+    for i in range(1, 4):
+        assert app.add_draft_revision(draft, {"title": f"v{i}", "body": f"corpo\nriga {i}\n"})
+    assert not app.add_draft_revision(draft, {"title": "v3", "body": "corpo\nriga 3\n"})
+    versions = [fields for _, fields in app.draft_revisions(draft)]
+    assert [v["title"] for v in versions] == ["v3", "v2", "v1", "v0"]
+    assert versions[-1]["body"] == "corpo\n"
+    assert versions[1]["body"] == "corpo\nriga 2\n"
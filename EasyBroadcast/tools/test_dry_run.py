@@ -0,0 +1,67 @@
+"""
+Test della simulazione di un invio: validazione come Telegram e stima della
+durata con limitatore di velocità, concorrenza e caricamento degli allegati.
+
+Uso:
+    python -m pytest test_dry_run.py
+"""
+import os
+
+import pytest
+
+
+def dry_run(app, settings=None, bots=("1",), chat_bots=None, concurrency=8, latency=0.1, upload_rate=2**20):
+    return app.DryRun(settings or {}, list(bots), chat_bots or {}, concurrency, latency, upload_rate)
+
+def chats(n):
+    return [str(-1000 - i) for i in range(n)]
+
+def sparse_file(path, size):
+    with open(path, "wb") as f:
+        f.truncate(size)
+    return str(path)
+
+
+def test_concurrency_limits_parallel_requests(app):
+    run = dry_run(app)
+    assert run.add("ciao", chats(10)) == []
+    duration, requests, nbytes = run.estimate()
+    assert duration == pytest.approx(0.2) # 8 richieste insieme, poi le altre 2
+    assert requests == 10 and nbytes == 40
+
+def test_rate_limit_after_burst(app):
+    run = dry_run(app, {"BOT_RATE_LIMIT": 2})
+    run.add("ciao", chats(5))
+    duration, _, _ = run.estimate()
+    assert duration == pytest.approx(1.6) # 2 subito, poi una ogni 0.5 s, più la latenza dell'ultima
+
+def test_attachment_is_uploaded_once_per_bot(app, tmp_path):
+    path = sparse_file(tmp_path / "doc.pdf", 2**20)
+    run = dry_run(app)
+    assert run.add("ciao", chats(3), path, "document") == []
+    duration, requests, nbytes = run.estimate()
+    assert duration == pytest.approx(1.2) # Caricamento da 1 s, poi le altre chat col file_id
+    assert requests == 3 and nbytes == 3 * 4 + 2**20
+
+def test_unassigned_chats_cost_a_get_chat(app):
+    run = dry_run(app, bots=("1", "2"))
+    run.add("ciao", chats(4))
+    _, requests, _ = run.estimate()
+    assert requests == 8
+    assigned = dry_run(app, bots=("1", "2"), chat_bots={c: "1" for c in chats(4)})
+    assigned.add("ciao", chats(4))
+    assert assigned.estimate()[1] == 4
+
+def test_validation_errors(app, tmp_path):
+    run = dry_run(app)
+    assert run.add("x" * (app.TEXT_LIMIT + 1), chats(1))[0].startswith("Testo troppo lungo")
+    assert run.add("x" * (app.CAPTION_LIMIT + 1), chats(1), sparse_file(tmp_path / "a.pdf", 10), "document")[0].startswith("Didascalia")
+    assert run.add("ciao", chats(1), sparse_file(tmp_path / "a.pdf", 10), "photo") == ["L'allegato inviato come foto non è un'immagine"]
+    assert run.messages == 0 and run.estimate()[1] == 0
+
+def test_upload_limit_depends_on_local_server(app, tmp_path):
+    path = sparse_file(tmp_path / "grande.zip", 60 * 2**20)
+    assert dry_run(app, {"BOT_API_LOCAL_MODE": True}).add("ciao", chats(1), path, "document")[0].startswith("Allegato troppo grande")
+    local = dry_run(app, {"BOT_API_LOCAL_MODE": True, "BOT_API_BASE_URL": "http://host:8081"})
+    assert local.add("ciao", chats(1), path, "document") == []
+    assert local.estimate()[2] == 4 # Il server locale legge il file dal disco
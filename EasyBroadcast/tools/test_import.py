@@ -0,0 +1,63 @@
+"""
+Test della lettura delle campagne importate (CSV e JSONL) e della conversione
+di ogni riga in un payload di job.
+
+Uso:
+    python -m pytest test_import.py
+"""
+import json
+import os
+
+
+def write_text(path, text):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_csv_rows_keep_their_line_numbers(app, tmp_path):
+    path = write_text(tmp_path / "campagna.csv",
+                      'chat,title,body\nA,Uno,"corpo\nsu due righe"\nB,Due,corpo\n')
+    rows = list(app.iter_import_rows(path))
+    assert [(line, row["chat"], error) for line, row, error in rows] == [(2, "A", None), (4, "B", None)]
+    assert rows[0][1]["body"] == "corpo\nsu due righe"
+
+def test_csv_with_bom_header(app, tmp_path):
+    path = write_text(tmp_path / "campagna.csv", "\ufeffchat,title\nA,Uno\n")
+    (line, row, error), = app.iter_import_rows(path)
+    assert row["chat"] == "A" and error is None
+
+def test_jsonl_reports_bad_lines(app, tmp_path):
+    lines = [json.dumps({"chat": "A", "title": "Uno"}), "", "{non json", json.dumps([1, 2]), json.dumps({"chat": "B"})]
+    path = write_text(tmp_path / "campagna.jsonl", "\n".join(lines) + "\n")
+    rows = list(app.iter_import_rows(path))
+    assert [(line, error) for line, _, error in rows] == [
+        (1, None), (3, "JSON non valido"), (4, "La riga non è un oggetto JSON"), (5, None)]
+    assert rows[1][1] == {"raw": "{non json"}
+
+def test_payload_from_row(app, tmp_path):
+    payload = app.import_row_payload({"chat": " A ", "title": "Titolo", "body": "Corpo", "category": " Avvisi ",
+                                      "signature": " Firma ", "attachment": "img/foto.JPG"}, str(tmp_path))
+    assert payload == {
+        "chats": ["A"], "title": "Titolo", "body": "Corpo", "category": "Avvisi", "signature": "Firma",
+        "attachment_path": os.path.join(str(tmp_path), "img/foto.JPG"), "attachment_type": "photo"}
+
+def test_payload_defaults(app, tmp_path):
+    payload = app.import_row_payload({"chat": "A"}, str(tmp_path))
+    assert payload["category"] == "Nessuna"
+    assert payload["title"] == payload["body"] == payload["signature"] == ""
+    assert payload["attachment_path"] is None and payload["attachment_type"] is None
+
+def test_payload_attachment_type(app, tmp_path):
+    document = app.import_row_payload({"chat": "A", "attachment": "file.pdf"}, str(tmp_path))
+    forced = app.import_row_payload({"chat": "A", "attachment": "foto.png", "attachment_type": "document"}, str(tmp_path))
+    assert document["attachment_type"] == "document"
+    assert forced["attachment_type"] == "document"
+
+def test_payload_coerces_non_string_values(app, tmp_path):
+    payload = app.import_row_payload({"chat": -100123, "title": 5, "body": None, "category": 7,
+                                      "signature": False, "attachment": None}, str(tmp_path))
+    assert payload["chats"] == ["-100123"]
+    assert payload["title"] == "5" and payload["body"] == ""
+    assert payload["category"] == "7" and payload["signature"] == "False"
+    assert payload["attachment_path"] is None
@@ -0,0 +1,55 @@
+"""
+Test del registro delle consegne: chiavi deterministiche e hash del contenuto
+che non cambia quando l'allegato viene importato nell'archivio.
+
+Uso:
+    python -m pytest test_ledger.py
+"""
+import os
+
+
+def write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_key_is_deterministic(app):
+    key = app.DeliveryLedger.key("abc", "-100123", "")
+    assert key == app.DeliveryLedger.key("abc", "-100123", "")
+    assert len(key) == 32 and all(c in "0123456789abcdef" for c in key)
+
+def test_key_depends_on_chat_content_and_campaign(app):
+    keys = {app.DeliveryLedger.key("abc", "-1", ""), app.DeliveryLedger.key("abc", "-2", ""),
+            app.DeliveryLedger.key("abd", "-1", ""), app.DeliveryLedger.key("abc", "-1", "20250101")}
+    assert len(keys) == 4
+
+def test_ledger_survives_restart(app):
+    filename = os.path.join(app.DATA_DIR, "ledger.txt")
+    ledger = app.DeliveryLedger(filename)
+    key = app.DeliveryLedger.key("abc", "-1")
+    ledger.add(key)
+    ledger.add(key) # Una sola riga anche se aggiunta due volte
+    assert key in app.DeliveryLedger(filename)
+    with open(filename, encoding="ascii") as f:
+        assert f.read() == key + "\n"
+
+def test_content_hash_depends_on_text_and_attachment(app, tmp_path):
+    a = write_bytes(tmp_path / "a.pdf", b"uno")
+    b = write_bytes(tmp_path / "b.pdf", b"due")
+    assert app.content_hash("testo") == app.content_hash("testo")
+    assert app.content_hash("testo") != app.content_hash("altro")
+    assert app.content_hash("testo", a, "document") != app.content_hash("testo", b, "document")
+    assert app.content_hash("testo", a, "document") != app.content_hash("testo", a, "photo")
+
+def test_content_hash_is_stable_across_ingest(app, tmp_path):
+    original = write_bytes(tmp_path / "circolare.pdf", b"%PDF" * 1000)
+    before = app.content_hash("testo", original, "document")
+
+    store = app.AttachmentStore(app.ATTACHMENTS_DIR)
+    digest = store.ingest(original)
+    stored = store.path(digest)
+    os.utime(stored, ns=(0, 0)) # Data diversa dall'originale
+
+    assert app.content_hash("testo", stored, "document", digest) == before
+    assert app.content_hash("testo", stored, "document") == before
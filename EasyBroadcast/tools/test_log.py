@@ -0,0 +1,61 @@
+"""
+Test della rotazione della cronologia: log.txt diventa un segmento compresso
+con la sua voce nell'indice, e i segmenti vecchi si riducono a un riepilogo.
+
+Uso:
+    python -m pytest test_log.py
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+
+def entry(when, text):
+    return f"{when.strftime('%Y-%m-%d %H:%M:%S')} -> {text}\n\n"
+
+def write_log(app, text):
+    with open(app.LOG_FILE, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def load_index(app):
+    with open(app.LOG_INDEX_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_small_recent_log_is_not_rotated(app):
+    write_log(app, entry(datetime.now(), "ciao"))
+    assert app.rotate_log(app.DEFAULT_SETTINGS) is None
+    assert os.path.exists(app.LOG_FILE)
+
+def test_large_log_is_rotated(app):
+    now = datetime.now()
+    text = "".join(entry(now, f"messaggio {i}") for i in range(50))
+    write_log(app, text)
+
+    segment = app.rotate_log({"LOG_ROTATE_BYTES": 100})
+    assert segment["entries"] == 50
+    assert segment["first"] == segment["last"] == now.strftime('%Y-%m-%d')
+    assert not os.path.exists(app.LOG_FILE)
+    assert app.read_log_segment(segment["file"]) == text
+    assert load_index(app)["segments"] == [segment]
+
+    app.append_text(app.LOG_FILE, entry(now, "dopo la rotazione"))
+    with open(app.LOG_FILE, encoding="utf-8") as f:
+        assert f.read() == entry(now, "dopo la rotazione")
+
+def test_old_log_is_rotated(app):
+    write_log(app, entry(datetime.now() - timedelta(days=40), "vecchio"))
+    assert app.rotate_log({"LOG_ROTATE_DAYS": 30}) is not None
+
+def test_old_segments_are_compacted(app):
+    old = datetime.now() - timedelta(days=400)
+    write_log(app, entry(old, "uno") + entry(old, "due") + entry(old + timedelta(days=1), "tre"))
+    segment = app.rotate_log({}, force=True)
+    write_log(app, entry(datetime.now(), "recente"))
+    recent = app.rotate_log({}, force=True)
+
+    assert app.compact_log_archive({"LOG_COMPACT_DAYS": 365}) == [segment["file"]]
+    index = load_index(app)
+    assert index["segments"] == [recent]
+    assert index["summaries"] == {old.strftime('%Y-%m-%d'): 2, (old + timedelta(days=1)).strftime('%Y-%m-%d'): 1}
+    assert not os.path.exists(os.path.join(app.LOG_ARCHIVE_DIR, segment["file"]))
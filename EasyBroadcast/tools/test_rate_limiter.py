@@ -0,0 +1,54 @@
+"""
+Test del limitatore di velocità: le attese sono servite per priorità e un
+invio annullato mentre attende non consuma il suo turno.
+
+Uso:
+    python -m pytest test_rate_limiter.py
+"""
+import asyncio
+import time
+
+
+def test_waiters_are_served_by_priority(app):
+    async def run():
+        limiter = app.RateLimiter(50, burst=1)
+        await limiter.acquire() # Raffica esaurita: chi arriva ora resta in coda
+        order = []
+
+        async def take(name, lane):
+            await limiter.acquire(app.SEND_PRIORITIES[lane])
+            order.append(name)
+
+        tasks = [asyncio.create_task(take(f"bulk{i}", "bulk")) for i in range(3)]
+        tasks.append(asyncio.create_task(take("interactive", "interactive")))
+        tasks.append(asyncio.create_task(take("urgent", "urgent")))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["urgent", "interactive", "bulk0", "bulk1", "bulk2"]
+
+def test_burst_is_served_without_waiting(app):
+    async def run():
+        limiter = app.RateLimiter(1, burst=5)
+        t0 = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        return time.monotonic() - t0
+
+    assert asyncio.run(run()) < 0.5
+
+def test_cancelled_waiter_does_not_take_a_token(app):
+    async def run():
+        limiter = app.RateLimiter(10, burst=1)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire(app.SEND_PRIORITIES["urgent"]))
+        waiting = asyncio.create_task(limiter.acquire(app.SEND_PRIORITIES["bulk"]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        t0 = time.monotonic()
+        await waiting
+        return cancelled.cancelled(), time.monotonic() - t0
+
+    cancelled, elapsed = asyncio.run(run())
+    assert cancelled
+    assert elapsed < 0.18 # Il primo token (dopo 0.1 s) va a chi attende ancora, non al secondo
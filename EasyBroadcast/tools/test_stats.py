@@ -0,0 +1,63 @@
+"""
+Test delle statistiche: aggregazione dei bucket giornalieri per chat,
+categoria e giorno, e latenza misurata usata dalla simulazione.
+
+Uso:
+    python -m pytest test_stats.py
+"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def stats(app):
+    return app.BroadcastStats(os.path.join(app.DATA_DIR, "stats.json"))
+
+def today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def test_rollup_by_chat_category_and_day(stats):
+    stats.record("-1", "Avvisi", True, 100, 0.2)
+    stats.record("-1", "Avvisi", False, 0, 0.4)
+    stats.record("-2", "Eventi", True, 50, 0.1)
+    stats.flush()
+    day = today()
+
+    assert stats.rollup(day, day, "chat") == {"-1": [1, 100, 1, 600.0, 2], "-2": [1, 50, 0, 100.0, 1]}
+    assert stats.rollup(day, day, "category") == {"Avvisi": [1, 100, 1, 600.0, 2], "Eventi": [1, 50, 0, 100.0, 1]}
+    assert stats.rollup(day, day, "day") == {day: [2, 150, 1, 700.0, 3]}
+    assert stats.rollup("2000-01-01", "2000-01-02", "day") == {}
+
+def test_rollup_resolves_chat_names(stats):
+    stats.record("-1", "A|B", True, 10, 0.1) # "|" nella categoria non sposta la chat
+    stats.flush()
+    day = today()
+    assert stats.rollup(day, day, "chat", {"-1": "Classe 1A"}) == {"Classe 1A": [1, 10, 0, 100.0, 1]}
+    assert stats.rollup(day, day, "category") == {"A|B": [1, 10, 0, 100.0, 1]}
+
+def test_flush_adds_to_existing_buckets(stats):
+    for _ in range(2):
+        stats.record("-1", "Nessuna", True, 10, 0.1)
+        stats.flush()
+    day = today()
+    assert stats.rollup(day, day, "chat") == {"-1": [2, 20, 0, 200.0, 2]}
+
+def test_legacy_buckets_count_every_request(stats):
+    day = today()
+    with open(stats.filename, "w", encoding="utf-8") as f:
+        json.dump({"buckets": {day: {"Classe 1A|Nessuna": [3, 30, 1, 800.0]}}}, f)
+    stats.record("-1", "Nessuna", True, 10, 0.2)
+    stats.flush()
+    assert stats.rollup(day, day, "chat", {"-1": "Classe 1A"}) == {"Classe 1A": [4, 40, 1, 1000.0, 5]}
+
+def test_measured_latency_skips_uploads(stats):
+    stats.record("-1", "Nessuna", True, 10, None) # Richiesta che ha caricato l'allegato
+    stats.record("-2", "Nessuna", True, 10, 0.3)
+    stats.flush()
+    latency, upload_rate = stats.measured()
+    assert latency == pytest.approx(0.3)
+    assert upload_rate is None
@@ -3,12 +3,32 @@ import os
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from telegram import Bot
-from telegram.error import TelegramError
+from telegram.error import TelegramError, RetryAfter, TimedOut
+from telegram.request import HTTPXRequest
 import asyncio
+import time
+import hashlib
+import hmac
 from PIL import Image, ImageTk
 import requests
 import shutil
-from datetime import datetime
+import tarfile
+import io
+import copy
+import contextlib
+import gzip
+import re
+import difflib
+import collections
+import concurrent.futures
+import threading
+import zipfile
+import csv
+import itertools
+import heapq
+import pathlib
+import uuid
+from datetime import datetime, timedelta
 import markdown
 
 # ---------- Directory and File Definitions ----------
@@ -27,6 +47,20 @@ DRAFT_FILE = os.path.join(DATA_DIR, "draft.json")
 HISTORY_FILE = os.path.join(DATA_DIR, "history.json") # Non usato attivamente nel codice v1.1.9, ma migrato
 LOG_FILE = os.path.join(DATA_DIR, "log.txt")
 LOGO_FILE = os.path.join(IMG_DIR, "logo.png")
+DELIVERY_LEDGER_FILE = os.path.join(DATA_DIR, "delivered.txt") # Chiavi degli invii già consegnati
+BACKUP_STATE_FILE = os.path.join(DATA_DIR, "backup_state.json") # Manifest dell'ultimo backup, per gli incrementali
+RESTORE_TMP_DIR = os.path.join(DATA_DIR, ".restore_tmp")
+LOG_ARCHIVE_DIR = os.path.join(DATA_DIR, "log_archive") # Segmenti .txt.gz della cronologia ruotata
+LOG_INDEX_FILE = os.path.join(LOG_ARCHIVE_DIR, "index.json")
+STATS_FILE = os.path.join(DATA_DIR, "stats.json") # Statistiche aggregate per giorno, chat e categoria
+AUTOSAVE_FILE = os.path.join(DATA_DIR, "autosave.json") # Copia di lavoro del modulo Messaggi
+SENT_MESSAGES_FILE = os.path.join(DATA_DIR, "sent_messages.json") # Indice degli invii modificabili/eliminabili
+SENT_MESSAGES_DIR = os.path.join(DATA_DIR, "sent_messages") # message_id per chat, un file per invio
+DELIVERY_REPORTS_FILE = os.path.join(DATA_DIR, "delivery_reports.json") # Indice dei rapporti di consegna
+DELIVERY_REPORTS_DIR = os.path.join(DATA_DIR, "delivery_reports") # Esito per chat, un file per invio
+ATTACHMENTS_DIR = os.path.join(DATA_DIR, "attachments") # Allegati indirizzati per contenuto (sha256)
+THUMBNAIL_DIR = os.path.join(DATA_DIR, ".thumbnails") # Cache delle miniature (esclusa dai backup)
+COMPRESSED_DIR = os.path.join(DATA_DIR, ".compressed") # Cache degli allegati compressi (esclusa dai backup)
 
 # Vecchi percorsi per la migrazione
 OLD_CONFIG_FILE = "config.json"
@@ -37,6 +71,55 @@ OLD_LOG_FILE = "log.txt"
 OLD_LOGO_FILE = "logo.png"
 
 
+# Impostazioni predefinite, incluse le categorie
+DEFAULT_SETTINGS = {
+    "SIGNATURES": [],
+    "EMOJIS": ["👍", "🎉", "🔥", "🚀", "💡", "✅", "❌"],
+    "UPDATE_SERVER": "downloads.kekkotech.com",
+    "SERVICE_ID": "EasyBroadcast",
+    "isFirstOpen": True,
+    "checkUpdatesOnStart": True,
+    "CATEGORIES": [],
+    "BOT_API_BASE_URL": "", # Vuoto = api.telegram.org
+    "BOT_API_FILE_URL": "", # Vuoto = ricavato da BOT_API_BASE_URL
+    "BOT_API_LOCAL_MODE": False, # Server telegram-bot-api locale: allegati passati come percorso
+    "BOT_HTTP_VERSION": "2", # "2" se è installato il pacchetto h2, altrimenti si usa "1.1"
+    "BOT_CONNECT_TIMEOUT": 5.0,
+    "BOT_READ_TIMEOUT": 10.0,
+    "BOT_WRITE_TIMEOUT": 60.0, # Caricamento degli allegati
+    "BOT_POOL_TIMEOUT": 30.0, # Attesa di una connessione libera durante il fan-out
+    "BOT_CONCURRENCY": 8, # Invii contemporanei per bot, divisi tra le corsie di priorità
+    "BOT_RATE_LIMIT": 25, # Messaggi al secondo per bot (Telegram ne tollera ~30)
+    "COMPRESS_ATTACHMENTS": False, # Comprime i documenti prima del caricamento
+    "COMPRESS_MIN_SAVING": 0.2, # Risparmio minimo (frazione dei byte) per usare la versione compressa
+    "API_ENABLED": False, # API HTTP locale per inviare broadcast da altri programmi
+    "API_HOST": "127.0.0.1", # "0.0.0.0" per accettare richieste dalla rete locale
+    "API_PORT": 8765,
+    "API_SECRET": "", # Obbligatorio: senza segreto l'API non parte
+    "HUB_CHAT_ID": "", # Chat privata dove pubblicare una volta i messaggi da copiare
+    "FANOUT_MODE": "send", # "send" (reinvio), "copy" (copy_message) o "forward" (forward_message)
+    "LOG_ROTATE_BYTES": 1024 * 1024, # Dimensione massima di log.txt prima della rotazione
+    "LOG_ROTATE_DAYS": 30, # Età massima della voce più vecchia in log.txt
+    "LOG_COMPACT_DAYS": 365 # Oltre questa età i segmenti vengono ridotti a un riepilogo
+}
+DEFAULT_CONFIG = {"BOT_TOKEN": "", "CHAT_LIST": {}}
+
+WATCH_INTERVAL_MS = 1000 # Intervallo di controllo dei file modificati dall'esterno
+AUTOSAVE_DELAY_MS = 1500 # Inattività dopo cui il modulo Messaggi viene salvato
+RESULTS_FLUSH_MS = 250 # Cronologia, statistiche e rapporti degli invii conclusi vengono scritti a blocchi
+FANOUT_MODES = {"Invio diretto": "send", "Copia dalla chat hub": "copy", "Inoltra dalla chat hub (non modificabili)": "forward"}
+EXPIRY_CHECK_MS = 60 * 1000 # Intervallo di controllo dei messaggi scaduti da eliminare
+
+# Opzioni di scadenza dei messaggi inviati (eliminazione automatica). Un bot
+# può eliminare i messaggi solo nelle prime 48 ore: scadenze più lunghe fallirebbero
+EXPIRY_OPTIONS = {
+    "Nessuna": None,
+    "1 ora": timedelta(hours=1),
+    "6 ore": timedelta(hours=6),
+    "1 giorno": timedelta(days=1)
+}
+EXPIRY_MAX = timedelta(hours=47) # Margine sotto il limite di Telegram per il controllo periodico
+
 #---------- Software Info ----------
 SOFTWARE_VERSION = "1.2.0"
 SOFTWARE_VERSION_STR = f"{SOFTWARE_VERSION}"
@@ -86,8 +169,31 @@ def run_migration():
             # print(f"Errore migrazione: {e}")
 
 # ---------- Utility Functions ----------
+# Versione (mtime, dimensione) dei file come li ha letti/scritti questa istanza,
+# per distinguere le modifiche esterne dalle nostre
+_file_stamps = {}
+
+def file_stamp(filename):
+    try:
+        st = os.stat(filename)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def record_file_stamp(filename):
+    _file_stamps[os.path.abspath(filename)] = file_stamp(filename)
+
+def changed_on_disk(filename):
+    """True se il file è stato modificato da altri dopo l'ultima lettura/scrittura di questa istanza."""
+    key = os.path.abspath(filename)
+    return key in _file_stamps and _file_stamps[key] != file_stamp(filename)
+
 def load_json(filename, default):
     """Carica un file JSON, gestendo errori e file mancanti."""
+    record_file_stamp(filename)
+    return _read_json(filename, default)
+
+def _read_json(filename, default):
     if os.path.exists(filename):
         try:
             with open(filename, "r", encoding="utf-8") as f:
@@ -97,10 +203,121 @@ def load_json(filename, default):
             return default
     return default
 
-def save_json(filename, data):
-    """Salva i dati in un file JSON."""
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# ---------- Cross-Process Locking ----------
+# Più istanze (o script) possono usare la stessa eb_data: chi scrive prende un
+# lock esclusivo sul file, chi legge no (le scritture JSON sono atomiche).
+LOCK_ATTEMPTS = 6 # Windows: tentativi da ~10 s ciascuno prima di rinunciare
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_fd(fd):
+        for attempt in range(LOCK_ATTEMPTS):
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1) # Riprova da solo per ~10 s
+                return
+            except OSError:
+                if attempt == LOCK_ATTEMPTS - 1:
+                    raise # Lock tenuto da un processo bloccato: meglio un errore che un'attesa infinita
+
+    def _unlock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+@contextlib.contextmanager
+def file_lock(filename):
+    """Lock consultivo esclusivo tra processi su `filename` (tramite .<nome>.lock accanto)."""
+    lock_path = os.path.join(os.path.dirname(filename), f".{os.path.basename(filename)}.lock")
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _lock_fd(fd)
+        try:
+            yield
+        finally:
+            _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+def _write_json_atomic(filename, data, indent=2, stamp=True):
+    tmp = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, separators=None if indent else (",", ":"))
+    for attempt in range(5):
+        try:
+            os.replace(tmp, filename)
+            break
+        except PermissionError:
+            # Windows: un lettore ha il file aperto proprio ora
+            if attempt == 4:
+                raise
+            time.sleep(0.05)
+    if stamp:
+        record_file_stamp(filename)
+
+def save_json(filename, data, indent=2):
+    """
+    Salva i dati in un file JSON (scrittura atomica, un solo scrittore alla volta).
+    indent=None scrive JSON compatto, per i file grandi che nessuno modifica a mano.
+    """
+    with file_lock(filename):
+        _write_json_atomic(filename, data, indent)
+
+def update_json(filename, default, mutate, indent=2):
+    """
+    Legge, modifica e riscrive un file JSON tenendo il lock per tutto il tempo,
+    così le modifiche di altri processi non vanno perse. `mutate(data)` modifica
+    i dati sul posto o ne ritorna di nuovi. Ritorna i dati salvati.
+    Se il file era stato modificato da altri, la firma resta quella vecchia:
+    il watcher lo vede comunque cambiato e unisce le modifiche esterne.
+    """
+    with file_lock(filename):
+        external = changed_on_disk(filename)
+        data = _read_json(filename, default)
+        result = mutate(data)
+        if result is not None:
+            data = result
+        _write_json_atomic(filename, data, indent, stamp=not external)
+        return data
+
+def append_text(filename, text):
+    """
+    Aggiunge un record in coda al file con una sola write() in O_APPEND, così
+    i record di processi diversi non si mescolano. Il lock serve comunque: su
+    Windows O_APPEND non è atomico tra processi, e ovunque rotate_log sposta il
+    file sotto lo stesso lock (un append a metà finirebbe nel segmento già letto).
+    """
+    data = text.encode("utf-8")
+    with file_lock(filename):
+        fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+def load_config():
+    return load_json(CONFIG_FILE, copy.deepcopy(DEFAULT_CONFIG))
+
+def load_settings():
+    settings = load_json(SETTINGS_FILE, copy.deepcopy(DEFAULT_SETTINGS))
+    # Assicura che la chiave CATEGORIES esista se il file settings è vecchio
+    if "CATEGORIES" not in settings:
+        settings["CATEGORIES"] = []
+    return settings
+
+def bot_signature(config, settings):
+    """Tutto ciò che determina come vengono creati i Bot: se non cambia, i Bot restano."""
+    return (tuple(get_bot_tokens(config)), settings.get("BOT_API_BASE_URL", ""),
+            settings.get("BOT_API_FILE_URL", ""), settings.get("BOT_API_LOCAL_MODE", False),
+            settings.get("BOT_CONCURRENCY", 8), settings.get("BOT_RATE_LIMIT", 25),
+            tuple(settings.get(k) for k in BOT_HTTP_SETTINGS))
 
 def parse_version(v_str):
     """Converte una stringa di versione x.x.x in una tupla (x, x, x)."""
@@ -120,6 +337,1589 @@ def escape_markdown_v2(text):
     special_chars = r'_*[]()~`>#+-=|{}.!'
     return "".join(f"\\{c}" if c in special_chars else c for c in text)
 
+def format_message(title, body, signature="", category_full=""):
+    """
+    Compone il testo MarkdownV2 del messaggio a partire dai campi grezzi.
+    La firma deve essere già risolta (niente "Altro"/"Nessuna").
+    """
+    title = escape_markdown_v2(title.strip())
+    body = escape_markdown_v2(body.strip())
+    sig = escape_markdown_v2(signature.strip()) if signature else ""
+
+    category_emoji = ""
+    if category_full and category_full != "Nessuna" and ":" in category_full:
+        try:
+            category_emoji = category_full.split(":")[1].strip()
+        except IndexError:
+            category_emoji = "" # Gestisce il caso in cui c'è ":" ma nulla dopo
+
+    # Aggiungi la firma solo se non è vuota
+    final_sig = f"\n\n_{sig}_" if sig else ""
+    return f"{category_emoji} *{title}* {category_emoji}\n\n{body}{final_sig}"
+
+def parse_history(text):
+    """
+    Converte il contenuto di log.txt nelle righe da mostrare in cronologia,
+    dalla più recente alla più vecchia.
+    """
+    entries = []
+    for l in reversed(text.strip().split("\n\n")):
+        l_stripped = l.strip()
+        if not l_stripped:
+            continue
+        if " -> " in l_stripped:
+            parts = l_stripped.split(" -> ", 1)
+            timestamp = parts[0].strip()
+            message_preview = parts[1].strip().replace('\n', ' ')
+            if len(message_preview) > 80:
+                message_preview = message_preview[:80] + "..."
+            entries.append(f"{timestamp} -> {message_preview}")
+        else:
+            entries.append(l_stripped)
+    return entries
+
+# ---------- Telegram Helpers ----------
+# Opzione del menu chat per inviare a tutte le chat configurate
+ALL_CHATS_OPTION = "Tutte le chat"
+
+# ---------- Bot HTTP Layer ----------
+# HTTP/2 richiede il pacchetto opzionale h2 (pip install "httpx[http2]")
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+BOT_HTTP_SETTINGS = ["BOT_HTTP_VERSION", "BOT_CONNECT_TIMEOUT", "BOT_READ_TIMEOUT", "BOT_WRITE_TIMEOUT", "BOT_POOL_TIMEOUT"]
+BOT_POOL_SPARE = 2 # Connessioni oltre la concorrenza del fan-out (get_chat, modifiche, warm-up)
+
+def create_request(settings, pool_size=1):
+    """HTTPXRequest con pool, versione HTTP e timeout presi dalle impostazioni."""
+    http_version = str(settings.get("BOT_HTTP_VERSION", "2"))
+    if http_version == "2" and h2 is None:
+        http_version = "1.1"
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        http_version=http_version,
+        connect_timeout=settings.get("BOT_CONNECT_TIMEOUT", 5.0),
+        read_timeout=settings.get("BOT_READ_TIMEOUT", 10.0),
+        write_timeout=settings.get("BOT_WRITE_TIMEOUT", 60.0),
+        pool_timeout=settings.get("BOT_POOL_TIMEOUT", 30.0)
+    )
+
+def bot_api_urls(settings):
+    """
+    (base_url, base_file_url) del server Bot API, o (None, None) per
+    api.telegram.org. Accetta sia "http://host:8081" che "http://host:8081/bot"
+    (e per i file anche ".../file" o ".../file/bot"); se manca
+    BOT_API_FILE_URL viene ricavato dallo stesso server.
+    """
+    base_url = settings.get("BOT_API_BASE_URL", "").strip().rstrip("/")
+    file_url = settings.get("BOT_API_FILE_URL", "").strip().rstrip("/")
+    if base_url.endswith("/bot"):
+        base_url = base_url[:-len("/bot")]
+    for suffix in ("/file/bot", "/file"):
+        if file_url.endswith(suffix):
+            file_url = file_url[:-len(suffix)]
+            break
+    file_url = file_url or base_url
+    return (base_url + "/bot" if base_url else None), (file_url + "/file/bot" if file_url else None)
+
+def create_bot(token, settings, pool_size=1):
+    """
+    Crea il Bot per il token indicato, con un pool di `pool_size` connessioni.
+    Se è impostato BOT_API_BASE_URL (un server telegram-bot-api nella rete
+    locale, o "http://127.0.0.1:8081/bot" per il server finto di test) le
+    richieste vanno a quell'endpoint invece che a api.telegram.org.
+    Con BOT_API_LOCAL_MODE gli allegati vengono passati come percorso locale.
+    """
+    kwargs = {"token": token, "request": create_request(settings, pool_size)}
+    base_url, file_url = bot_api_urls(settings)
+    if base_url:
+        kwargs["base_url"] = base_url
+    if file_url:
+        kwargs["base_file_url"] = file_url
+    if local_mode(settings):
+        kwargs["local_mode"] = True
+    return Bot(**kwargs)
+
+def local_mode(settings):
+    """BOT_API_LOCAL_MODE vale solo con un server indicato: api.telegram.org non legge i file locali."""
+    return bool(settings.get("BOT_API_LOCAL_MODE", False) and bot_api_urls(settings)[0])
+
+def get_bot_tokens(config):
+    """Token principale (BOT_TOKEN) seguito dai token aggiuntivi (BOT_TOKENS), senza duplicati."""
+    tokens = []
+    for token in [config.get("BOT_TOKEN", "")] + list(config.get("BOT_TOKENS", [])):
+        token = token.strip()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+def retry_after_seconds(error):
+    """Secondi di attesa richiesti da un errore RetryAfter (int o timedelta)."""
+    delay = error.retry_after
+    if hasattr(delay, "total_seconds"):
+        delay = delay.total_seconds()
+    return float(delay)
+
+async def deliver_message(bot, chat_id, text, attachment_path=None, attachment_type=None, max_retries=3, media=None):
+    """
+    Invia un messaggio (o un allegato con didascalia) a una chat.
+    Sui 429 (RetryAfter) attende il tempo indicato da Telegram e riprova.
+    `media` sostituisce il file su disco: i byte già letti o il file_id di
+    un caricamento precedente (vedi AttachmentUpload).
+    Ritorna (messaggio, numero di tentativi ripetuti).
+    """
+    async def send():
+        if attachment_path and attachment_type:
+            with (contextlib.nullcontext(media) if media is not None else open(attachment_path, 'rb')) as f:
+                filename = os.path.basename(attachment_path)
+                if attachment_type == 'photo':
+                    return await bot.send_photo(chat_id=chat_id, photo=f, caption=text, parse_mode='MarkdownV2', filename=filename)
+                return await bot.send_document(chat_id=chat_id, document=f, caption=text, parse_mode='MarkdownV2', filename=filename)
+        return await bot.send_message(chat_id=chat_id, text=text, parse_mode='MarkdownV2')
+    return await call_with_retry(send, max_retries)
+
+async def relay_message(bot, chat_id, from_chat_id, message_id, mode="copy", max_retries=3):
+    """
+    Copia (copy_message) o inoltra (forward_message) un messaggio già
+    pubblicato nella chat hub: la richiesta non contiene testo né allegati.
+    Ritorna (messaggio, numero di tentativi ripetuti).
+    """
+    method = bot.forward_message if mode == "forward" else bot.copy_message
+    return await call_with_retry(lambda: method(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id), max_retries)
+
+async def call_with_retry(call, max_retries=3):
+    """Esegue la chiamata; sui 429 attende il retry_after di Telegram e riprova."""
+    retries = 0
+    while True:
+        try:
+            return await call(), retries
+        except RetryAfter as e:
+            if retries >= max_retries:
+                raise
+            retries += 1
+            await asyncio.sleep(retry_after_seconds(e))
+
+def read_attachment(path, progress=None):
+    """
+    Legge un allegato in un unico buffer (da eseguire in un thread), chiamando
+    progress(letti, totale) prima e dopo. PTB costruisce comunque il corpo
+    multipart in memoria: una sola copia del file, riusata da tutti i bot.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if progress:
+            progress(0, size)
+        data = f.read()
+    if progress:
+        progress(len(data), len(data))
+    return data
+
+class AttachmentUpload:
+    """
+    Allegato di un invio a più chat: letto dal disco una sola volta (in un
+    thread, a blocchi) e caricato una sola volta per bot; le altre chat
+    riusano il file_id restituito da Telegram invece di ricaricare il file.
+    """
+
+    def __init__(self, path, kind, progress=None):
+        self.path = path
+        self.kind = kind
+        self.size = os.path.getsize(path)
+        self.progress = progress # progress(fase, fatti, totale, byte/s), chiamata nel thread della GUI
+        self.data = None
+        self.read_lock = asyncio.Lock()
+        self.file_ids = {} # token del bot -> file_id
+        self.upload_locks = {}
+
+    async def read(self):
+        loop = asyncio.get_running_loop()
+        async with self.read_lock:
+            if self.data is None:
+                t0 = time.perf_counter()
+
+                def report(done, total):
+                    if self.progress:
+                        rate = done / max(time.perf_counter() - t0, 1e-6)
+                        loop.call_soon_threadsafe(self.progress, "read", done, total, rate)
+                self.data = await loop.run_in_executor(None, read_attachment, self.path, report)
+        return self.data
+
+    async def send(self, bot, chat_id, text, max_retries=3, timing=None):
+        """
+        Come deliver_message, ma il primo invio riuscito per bot fissa il file_id.
+        `timing` (dict), se indicato, riceve "uploaded" se questa richiesta ha
+        caricato il file, altrimenti "start": l'istante della richiesta dopo
+        l'attesa del file_id, per misurare la latenza senza il caricamento.
+        """
+        if timing is None:
+            timing = {}
+        if bot.token not in self.file_ids:
+            # Un solo caricamento alla volta per bot: gli altri attendono il file_id
+            async with self.upload_locks.setdefault(bot.token, asyncio.Lock()):
+                if bot.token not in self.file_ids:
+                    # Con un server Bot API locale il file viene letto direttamente dal disco
+                    data = pathlib.Path(self.path) if getattr(bot, "local_mode", False) else await self.read()
+                    if self.progress:
+                        self.progress("upload", 0, self.size, 0)
+                    t0 = time.perf_counter()
+                    timing["uploaded"] = True
+                    message, retries = await deliver_message(bot, chat_id, text, self.path, self.kind, max_retries, media=data)
+                    file = message.photo[-1] if self.kind == 'photo' else message.document
+                    self.file_ids[bot.token] = file.file_id
+                    if self.progress:
+                        self.progress("upload", self.size, self.size, self.size / max(time.perf_counter() - t0, 1e-6))
+                    return message, retries
+        timing["start"] = time.perf_counter()
+        return await deliver_message(bot, chat_id, text, self.path, self.kind, max_retries, media=self.file_ids[bot.token])
+
+def form_hash(data):
+    """Hash stabile di un dizionario (contenuto del modulo o di una bozza)."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+_attachment_digests = {} # (percorso, dimensione, mtime) -> sha256 degli allegati senza hash noto
+
+def attachment_digest(path):
+    """sha256 di un allegato, ricordato finché il file non cambia (la prima volta lo legge tutto)."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _attachment_digests:
+        _attachment_digests[key] = file_sha256(path)
+    return _attachment_digests[key]
+
+def content_hash(text, attachment_path=None, attachment_type=None, attachment_hash=None):
+    """
+    Hash del contenuto di un messaggio: testo + sha256 dell'allegato, quello
+    dell'archivio allegati se noto, altrimenti calcolato dal file. Non dipende
+    da percorso e data, che cambiano quando l'allegato viene importato.
+    """
+    h = hashlib.sha256(text.encode("utf-8"))
+    if attachment_path and attachment_type:
+        h.update(f"\0{attachment_type}\0{attachment_hash or attachment_digest(attachment_path)}".encode("utf-8"))
+    return h.hexdigest()
+
+class DeliveryLedger:
+    """
+    Insieme su disco delle consegne già avvenute, per non inviare due volte
+    lo stesso messaggio alla stessa chat (retry, doppio clic, riavvii).
+    Ogni consegna è una chiave di 32 caratteri esadecimali per riga, in append.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.keys = set()
+        if os.path.exists(filename):
+            with open(filename, "r", encoding="ascii") as f:
+                self.keys = {line.strip() for line in f if line.strip()}
+
+    @staticmethod
+    def key(content_hash, chat_id, campaign=""):
+        """Chiave deterministica: hash del contenuto + chat + campagna."""
+        return hashlib.sha256(f"{content_hash}\0{chat_id}\0{campaign}".encode("utf-8")).hexdigest()[:32]
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key):
+        if key in self.keys:
+            return
+        self.keys.add(key)
+        append_text(self.filename, key + "\n")
+
+# Corsie di priorità degli invii: valore più basso = servito prima
+SEND_PRIORITIES = {"urgent": 0, "interactive": 1, "bulk": 2}
+# Quota di BOT_CONCURRENCY che ogni corsia può occupare per bot
+LANE_SHARES = {"urgent": 1.0, "interactive": 1.0, "bulk": 0.5}
+
+class RateLimiter:
+    """
+    Token bucket asincrono: al massimo `rate` richieste al secondo, con raffiche fino a `burst`.
+    Le attese sono servite per priorità (poi in ordine di arrivo), così un invio
+    urgente passa davanti a una campagna già in corso tra una consegna e l'altra.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waiters = [] # heap di (priorità, ordine di arrivo, future)
+        self.arrivals = itertools.count()
+        self.dispatcher = None
+
+    async def acquire(self, priority=SEND_PRIORITIES["interactive"]):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.arrivals), future))
+        if not self.dispatcher or self.dispatcher.done():
+            self.dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        while self.waiters:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                continue # Invio annullato mentre attendeva
+            self.tokens -= 1
+            future.set_result(None)
+
+def preferred_bot(chat_id, bot_ids, chat_bots):
+    """
+    Indice del bot a cui è assegnata la chat; se non è ancora assegnata, quello
+    scelto dall'hash del chat_id, così le chat nuove si distribuiscono su tutti i bot.
+    """
+    bot_id = chat_bots.get(str(chat_id))
+    if bot_id in bot_ids:
+        return bot_ids.index(bot_id)
+    return int(hashlib.sha256(str(chat_id).encode("utf-8")).hexdigest()[:8], 16) % len(bot_ids)
+
+class BotPool:
+    """
+    Insieme di bot (uno per token) usato per distribuire gli invii.
+    Ogni chat viene assegnata al bot che ne fa parte; ogni bot ha il suo
+    limitatore di velocità e il suo pool di connessioni, così aggiungere
+    bot aumenta il numero di messaggi al secondo.
+    Gli invii concorrenti condividono il limitatore del bot ma ognuno nella
+    sua corsia (SEND_PRIORITIES), con un tetto di consegne in corso per corsia.
+    """
+
+    def __init__(self, tokens, settings, chat_bots=None):
+        self.concurrency = int(settings.get("BOT_CONCURRENCY", 8))
+        rate = settings.get("BOT_RATE_LIMIT", 25) # Telegram tollera ~30 msg/s per bot
+        self.lane_caps = {lane: max(1, int(self.concurrency * share)) for lane, share in LANE_SHARES.items()}
+        pool_size = sum(self.lane_caps.values()) + BOT_POOL_SPARE
+        self.bots = [create_bot(t, settings, pool_size=pool_size) for t in tokens]
+        self.bot_ids = [t.split(":", 1)[0] for t in tokens]
+        self.limiters = [RateLimiter(rate) for _ in tokens]
+        self.slots = [{lane: asyncio.Semaphore(cap) for lane, cap in self.lane_caps.items()} for _ in tokens]
+        self.active = 0 # Invii in corso: shutdown() attende che finiscano
+        self.warming = None # Task di warm_up()
+        # chat_id -> id del bot che ne fa parte (persistito in config["CHAT_BOTS"])
+        self.chat_bots = dict(chat_bots or {})
+
+    @property
+    def primary(self):
+        return self.bots[0] if self.bots else None
+
+    async def warm_up(self):
+        """
+        Apre in anticipo le connessioni di ogni bot (DNS, TCP, TLS) con get_me
+        concorrenti, così anche il primo invio non paga l'apertura.
+        Ritorna il numero di bot raggiungibili.
+        """
+        async def warm(bot):
+            try:
+                await bot.initialize()
+                await asyncio.gather(*(bot.get_me() for _ in range(self.concurrency)))
+                return True
+            except TelegramError:
+                return False # Offline o token non valido: l'errore emergerà al primo invio
+        return sum(await asyncio.gather(*(warm(bot) for bot in self.bots)))
+
+    @contextlib.asynccontextmanager
+    async def in_use(self):
+        """Segna il pool come in uso, così shutdown() non chiude le connessioni sotto un invio."""
+        self.active += 1
+        try:
+            yield self
+        finally:
+            self.active -= 1
+
+    async def shutdown(self):
+        """Chiude i client HTTP di tutti i bot, dopo la fine degli invii in corso."""
+        if self.warming:
+            self.warming.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.warming
+        while self.active:
+            await asyncio.sleep(0.5)
+        await asyncio.gather(*(bot.shutdown() for bot in self.bots), return_exceptions=True)
+
+    async def resolve(self, index, chat_id, priority=SEND_PRIORITIES["interactive"]):
+        """
+        Indice del bot da usare per la chat. Per una chat non ancora assegnata
+        verifica con get_chat che il bot `index` (quello di preferred_bot) ne
+        faccia parte, poi prova gli altri nell'ordine; il primo membro viene memorizzato.
+        Chiamata dai worker al momento dell'invio, non prima del fan-out.
+        """
+        chat_id = str(chat_id)
+        if len(self.bots) == 1 or self.chat_bots.get(chat_id) in self.bot_ids:
+            return index
+        for i in [(index + k) % len(self.bots) for k in range(len(self.bots))]:
+            await self.limiters[i].acquire(priority)
+            try:
+                await self.bots[i].get_chat(chat_id)
+            except TelegramError:
+                continue
+            self.chat_bots[chat_id] = self.bot_ids[i]
+            return i
+        return index # Nessun bot è membro: l'invio fallirà con l'errore di Telegram
+
+    def bot_id(self, bot):
+        return self.bot_ids[self.bots.index(bot)]
+
+    async def fan_out(self, chat_ids, send, lane="interactive", senders=None):
+        """
+        Esegue send(bot, chat_id) per ogni chat, in parallelo su tutti i bot.
+        `lane` è la corsia di priorità (urgent, interactive, bulk).
+        `senders` (chat_id -> bot_id) fissa il bot per le chat indicate: un
+        messaggio può essere modificato o eliminato solo dal bot che lo ha inviato.
+        Ritorna un dict chat_id -> risultato (o l'eccezione sollevata).
+        """
+        async with self.in_use():
+            return await self._fan_out(chat_ids, send, lane, senders or {})
+
+    async def _fan_out(self, chat_ids, send, lane, senders):
+        priority = SEND_PRIORITIES[lane]
+        queues = [[] for _ in self.bots]
+        pinned = set()
+        for chat_id in chat_ids:
+            if senders.get(chat_id) in self.bot_ids:
+                pinned.add(chat_id)
+                queues[self.bot_ids.index(senders[chat_id])].append(chat_id)
+            else:
+                queues[preferred_bot(chat_id, self.bot_ids, self.chat_bots)].append(chat_id)
+
+        results = {}
+
+        async def worker(home, queue):
+            slots = self.slots[home][lane]
+            while queue:
+                chat_id = queue.pop()
+                async with slots:
+                    try:
+                        index = home if chat_id in pinned else await self.resolve(home, chat_id, priority)
+                        await self.limiters[index].acquire(priority)
+                        results[chat_id] = await send(self.bots[index], chat_id)
+                    except Exception as e:
+                        results[chat_id] = e
+
+        workers = []
+        for index, queue in enumerate(queues):
+            queue.reverse() # pop() dalla fine mantiene l'ordine originale
+            workers += [worker(index, queue) for _ in range(min(self.lane_caps[lane], len(queue)))]
+        await asyncio.gather(*workers)
+        return results
+
+# ---------- Draft Revisions ----------
+DRAFT_FIELDS = ["title", "body", "signature", "category", "chat", "attachment_path", "attachment_type", "attachment_hash"]
+DRAFT_MAX_REVISIONS = 50
+
+def text_delta(new, old):
+    """
+    Delta (a livello di riga) per ricostruire `old` partendo da `new`:
+    lista di [inizio, fine] (righe da copiare da new) o stringhe da inserire.
+    """
+    new_lines = new.splitlines(keepends=True)
+    old_lines = old.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, new_lines, old_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(old_lines[j1:j2]))
+    return ops
+
+def apply_text_delta(new, ops):
+    new_lines = new.splitlines(keepends=True)
+    return "".join("".join(new_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+def draft_delta(new, old):
+    """Differenze per tornare da `new` a `old`: il corpo come delta, gli altri campi interi."""
+    delta = {}
+    for field in DRAFT_FIELDS:
+        if new.get(field) == old.get(field):
+            continue
+        if field == "body":
+            delta["body_delta"] = text_delta(new.get("body", ""), old.get("body", ""))
+        else:
+            delta[field] = old.get(field)
+    return delta
+
+def apply_draft_delta(draft, delta):
+    result = {field: draft.get(field) for field in DRAFT_FIELDS}
+    for field, value in delta.items():
+        if field == "body_delta":
+            result["body"] = apply_text_delta(draft.get("body", ""), value)
+        else:
+            result[field] = value
+    return result
+
+def draft_revisions(draft):
+    """
+    Tutte le versioni di una bozza, dalla più recente: [(data, campi), ...].
+    La più recente è la bozza stessa (O(1)); le precedenti si ricostruiscono
+    applicando i delta a catena.
+    """
+    current = {field: draft.get(field) for field in DRAFT_FIELDS}
+    versions = [(draft.get("updated", ""), current)]
+    for revision in draft.get("revisions", []):
+        current = apply_draft_delta(current, revision["delta"])
+        versions.append((revision.get("saved", ""), current))
+    return versions
+
+def add_draft_revision(draft, fields):
+    """Aggiorna la bozza con i nuovi campi, conservando la versione precedente come delta."""
+    old = {field: draft.get(field) for field in DRAFT_FIELDS}
+    new = {field: fields.get(field) for field in DRAFT_FIELDS}
+    if old == new:
+        return False
+    revisions = draft.setdefault("revisions", [])
+    revisions.insert(0, {"saved": draft.get("updated", ""), "delta": draft_delta(new, old)})
+    del revisions[DRAFT_MAX_REVISIONS:]
+    draft.update(new)
+    draft["updated"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return True
+
+# ---------- Attachment Store ----------
+ATTACHMENT_GC_GRACE = 3600 # Secondi prima che un allegato non referenziato possa essere eliminato
+
+class AttachmentStore:
+    """
+    Allegati copiati in eb_data e indirizzati per contenuto:
+    attachments/<sha256>/<nome originale>. Lo stesso file allegato a più
+    bozze viene salvato una volta sola, e le bozze restano valide anche se
+    l'originale (chiavetta USB, cartella di rete) non è più raggiungibile.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, digest):
+        """Percorso del file salvato con questo hash, o None se non c'è."""
+        folder = os.path.join(self.directory, digest)
+        try:
+            names = [n for n in os.listdir(folder) if not n.startswith(".")]
+        except OSError:
+            return None
+        return os.path.join(folder, names[0]) if names else None
+
+    def ingest(self, source):
+        """
+        Copia un file nell'archivio calcolandone l'hash nella stessa lettura
+        (da eseguire in un thread). Ritorna l'hash sha256.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}")
+        h = hashlib.sha256()
+        try:
+            with open(source, "rb") as src, open(tmp, "wb") as out:
+                for chunk in iter(lambda: src.read(BACKUP_CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+            digest = h.hexdigest()
+            if self.path(digest) is None:
+                folder = os.path.join(self.directory, digest)
+                os.makedirs(folder, exist_ok=True)
+                os.replace(tmp, os.path.join(folder, os.path.basename(source)))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp) # Già presente: il contenuto è deduplicato
+        return digest
+
+    def gc(self, references, grace=ATTACHMENT_GC_GRACE):
+        """
+        Elimina gli allegati con zero riferimenti (`references`: Counter
+        hash -> numero di usi). Quelli appena importati vengono risparmiati,
+        perché il modulo potrebbe non averli ancora salvati. Ritorna quanti ne ha eliminati.
+        """
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir() or references.get(entry.name):
+                continue
+            if time.time() - entry.stat().st_mtime < grace:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+        return removed
+
+# ---------- Thumbnails ----------
+# L'anteprima dei PDF è opzionale: richiede PyMuPDF (pip install pymupdf)
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+THUMBNAIL_SIZE = (96, 96)
+THUMBNAIL_WORKERS = 4 # Miniature generate in parallelo nella vista a griglia
+
+def make_thumbnail(path, digest, size=THUMBNAIL_SIZE):
+    """
+    Miniatura PNG di un'immagine o della prima pagina di un PDF, in cache per
+    hash del contenuto (da eseguire in un thread). Ritorna il percorso o None.
+    """
+    target = os.path.join(THUMBNAIL_DIR, f"{digest}.png")
+    if os.path.exists(target):
+        return target
+    try:
+        if path.lower().endswith(".pdf"):
+            if fitz is None:
+                return None
+            with fitz.open(path) as doc:
+                pix = doc[0].get_pixmap(matrix=fitz.Matrix(0.5, 0.5))
+                img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        else:
+            img = Image.open(path)
+            img.draft("RGB", size) # JPEG: decodifica già ridotta, molto più veloce
+        img.thumbnail(size)
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        img.convert("RGBA").save(tmp, "PNG")
+        os.replace(tmp, target)
+    except Exception:
+        return None # Formato non supportato o file danneggiato: nessuna anteprima
+    return target
+
+# ---------- Attachment Compression ----------
+# La riottimizzazione dei PDF è opzionale: richiede pikepdf
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+# Formati già compressi: comprimerli di nuovo non fa risparmiare nulla
+COMPRESSED_EXTENSIONS = {".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".jpg", ".jpeg", ".png",
+                         ".gif", ".webp", ".mp3", ".mp4", ".m4a", ".mov", ".docx", ".xlsx", ".pptx", ".odt", ".ods"}
+COMPRESSION_WORKERS = min(4, os.cpu_count() or 1) # zlib rilascia il GIL: bastano dei thread
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(BACKUP_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def compress_attachment(path, digest=None, min_saving=0.2):
+    """
+    Versione compressa di un documento se fa risparmiare almeno `min_saving`
+    dei byte (zip, o PDF riottimizzato con pikepdf), altrimenti il file
+    originale. Il risultato resta in cache per hash del contenuto insieme al
+    rapporto misurato (.ratio), che viene confrontato con la soglia attuale:
+    cambiare COMPRESS_MIN_SAVING non richiede di ricomprimere. Da eseguire in un thread.
+    """
+    name = os.path.basename(path)
+    ext = os.path.splitext(name)[1].lower()
+    if ext in COMPRESSED_EXTENSIONS or (ext == ".pdf" and pikepdf is None):
+        return path
+    digest = digest or file_sha256(path)
+    folder = os.path.join(COMPRESSED_DIR, digest)
+    ratio_file = os.path.join(folder, ".ratio")
+    for cached in os.listdir(folder) if os.path.isdir(folder) else []:
+        if not cached.startswith("."):
+            cached = os.path.join(folder, cached)
+            worth = os.path.getsize(cached) <= os.path.getsize(path) * (1 - min_saving)
+            return cached if worth else path
+    try:
+        with open(ratio_file, "r", encoding="ascii") as f:
+            if float(f.read()) > 1 - min_saving:
+                return path # Già misurato: con questa soglia non conviene
+    except (OSError, ValueError):
+        pass
+    # Senza file compresso in cache ma con un rapporto sotto la soglia (soglia abbassata): si ricomprime
+
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".tmp-{uuid.uuid4().hex}")
+    try:
+        if ext == ".pdf":
+            target = os.path.join(folder, name)
+            with pikepdf.open(path) as pdf:
+                pdf.save(tmp, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+        else:
+            target = os.path.join(folder, f"{name}.zip")
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+                zf.write(path, arcname=name)
+        ratio = os.path.getsize(tmp) / max(os.path.getsize(path), 1)
+        with open(ratio_file, "w", encoding="ascii") as f:
+            f.write(f"{ratio:.6f}")
+        if ratio <= 1 - min_saving:
+            os.replace(tmp, target)
+            return target
+        return path
+    except Exception:
+        return path # PDF non leggibile o simili: si invia l'originale
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def prune_derived_files(store):
+    """Elimina miniature e versioni compresse degli allegati non più presenti nell'archivio."""
+    for directory in (THUMBNAIL_DIR, COMPRESSED_DIR):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            digest = name.split(".", 1)[0]
+            if digest and store.path(digest) is None:
+                path = os.path.join(directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+
+def attachment_references(in_flight=None):
+    """
+    Conteggio degli usi di ogni allegato: bozze (con le revisioni), copia di
+    lavoro, rapporti di consegna (per "Riprova Solo Falliti"), invii archiviati
+    e `in_flight` (Counter degli invii in corso).
+    """
+    refs = collections.Counter(in_flight or {})
+    drafts = load_json(DRAFT_FILE, [])
+    for draft in drafts if isinstance(drafts, list) else []:
+        for _, fields in draft_revisions(draft):
+            if fields.get("attachment_hash"):
+                refs[fields["attachment_hash"]] += 1
+    autosave = load_json(AUTOSAVE_FILE, {})
+    if isinstance(autosave, dict) and autosave.get("attachment_hash"):
+        refs[autosave["attachment_hash"]] += 1
+    for report in load_json(DELIVERY_REPORTS_FILE, {"reports": []}).get("reports", []):
+        digest = report.get("attachment_hash") or report.get("job", {}).get("attachment_hash")
+        if digest:
+            refs[digest] += 1
+    for entry in load_json(SENT_MESSAGES_FILE, {"broadcasts": {}}).get("broadcasts", {}).values():
+        if entry.get("attachment_hash"):
+            refs[entry["attachment_hash"]] += 1
+    return refs
+
+# ---------- Delivery Reports ----------
+DELIVERY_REPORTS_MAX = 200 # Invii di cui si conserva il rapporto
+REPORT_FIELDS = ["chat_id", "chat", "status", "error", "latency_ms", "message_id"]
+REPORT_JOB_FIELDS = ["title", "body", "signature", "category", "attachment_path", "attachment_type", "attachment_hash", "expires", "campaign"]
+
+class DeliveryReportStore:
+    """
+    Rapporti di consegna: per ogni invio i campi del job (per riprovare) e una
+    riga compatta per chat, [chat_id, nome, esito, errore, latenza ms, message_id],
+    con esito "ok", "failed", "uncertain" (timeout: forse consegnato) o
+    "skipped" (già consegnato).
+    Ogni rapporto è un file JSON compatto in <cartella>/<id>.json, scritto una
+    volta sola; l'indice contiene solo id, data, titolo, conteggi e hash dell'allegato.
+    """
+
+    def __init__(self, filename, folder):
+        self.filename = filename
+        self.folder = folder
+
+    def _path(self, report_id):
+        return os.path.join(self.folder, f"{report_id}.json")
+
+    @staticmethod
+    def summary(report):
+        results = collections.Counter(row[2] for row in report["rows"])
+        return {"id": report["id"], "sent": report["sent"], "title": report["job"].get("title", "").strip()[:80],
+                "ok": results["ok"], "failed": results["failed"], "uncertain": results["uncertain"],
+                "skipped": results["skipped"],
+                "attachment_hash": report["job"].get("attachment_hash")}
+
+    def all(self):
+        """Voci dell'indice, dalla più vecchia alla più recente."""
+        reports = load_json(self.filename, {"reports": []}).get("reports", [])
+        # Formato precedente: rapporti completi nell'indice
+        return [self.summary(r) if "rows" in r else r for r in reports]
+
+    def get(self, report_id):
+        for entry in load_json(self.filename, {"reports": []}).get("reports", []):
+            if entry["id"] == report_id:
+                return entry if "rows" in entry else load_json(self._path(report_id), None)
+        return None
+
+    def add(self, *reports):
+        """Salva i rapporti e scarta i più vecchi oltre il limite. Chiamata fuori dal thread della GUI."""
+        if not reports:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        for report in reports:
+            # Id univoco e un solo scrittore: basta la scrittura atomica, senza file di lock
+            _write_json_atomic(self._path(report["id"]), report, indent=None)
+        dropped = []
+
+        def apply(data):
+            index = data.setdefault("reports", [])
+            index += [self.summary(r) for r in reports]
+            dropped.extend(r["id"] for r in index[:-DELIVERY_REPORTS_MAX])
+            del index[:-DELIVERY_REPORTS_MAX]
+        update_json(self.filename, {"reports": []}, apply, indent=None)
+        for report_id in dropped:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(report_id))
+
+# ---------- Sent Messages Store ----------
+SENT_MESSAGES_MAX = 200 # Invii conservati, oltre a quelli con una scadenza ancora da eseguire
+
+class SentMessageStore:
+    """
+    message_id di ogni (chat, invio), per modificare o eliminare un messaggio
+    già inviato su tutte le chat. L'indice contiene solo i metadati,
+    {"broadcasts": {id: {..., "chats": n}}}; le righe [chat_id, message_id, bot_id]
+    stanno in <cartella>/<id>.json, scritto una volta per invio (bot_id manca
+    negli invii registrati prima che venisse salvato).
+    Si conservano gli ultimi SENT_MESSAGES_MAX invii.
+    """
+
+    def __init__(self, filename, folder):
+        self.filename = filename
+        self.folder = folder
+
+    def _path(self, broadcast_id):
+        return os.path.join(self.folder, f"{broadcast_id}.json")
+
+    def all(self):
+        broadcasts = load_json(self.filename, {"broadcasts": {}}).get("broadcasts", {})
+        for entry in broadcasts.values():
+            if "messages" in entry: # Formato precedente: message_id nell'indice
+                entry.setdefault("chats", len(entry["messages"]))
+        return broadcasts
+
+    def messages(self, broadcast_id):
+        """[[chat_id, message_id, bot_id], ...] dell'invio."""
+        entry = self.all().get(broadcast_id)
+        if entry is None:
+            return []
+        if "messages" in entry:
+            return entry["messages"]
+        return load_json(self._path(broadcast_id), [])
+
+    def add(self, broadcast_id, meta, messages):
+        """Registra un invio e scarta i più vecchi oltre il limite. Chiamata fuori dal thread della GUI."""
+        os.makedirs(self.folder, exist_ok=True)
+        # Id univoco e un solo scrittore: basta la scrittura atomica, senza file di lock
+        _write_json_atomic(self._path(broadcast_id), messages, indent=None)
+        dropped = []
+
+        def apply(data):
+            broadcasts = data.setdefault("broadcasts", {})
+            broadcasts[broadcast_id] = dict(meta, chats=len(messages))
+            excess = len(broadcasts) - SENT_MESSAGES_MAX
+            for bid in sorted(broadcasts, key=lambda b: broadcasts[b]["sent"]):
+                if excess <= 0:
+                    break
+                if broadcasts[bid].get("expires"):
+                    continue # L'eliminazione programmata ha ancora bisogno dei message_id
+                del broadcasts[bid]
+                dropped.append(bid)
+                excess -= 1
+        update_json(self.filename, {"broadcasts": {}}, apply, indent=None)
+        for bid in dropped:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(bid))
+
+    def update(self, broadcast_id, **changes):
+        def apply(data):
+            entry = data.get("broadcasts", {}).get(broadcast_id)
+            if entry is not None:
+                entry.update(changes)
+        update_json(self.filename, {"broadcasts": {}}, apply, indent=None)
+
+    def remove_messages(self, broadcast_id, chat_ids):
+        """Toglie le chat indicate da un invio; elimina l'invio se non ne restano."""
+        chat_ids = {str(c) for c in chat_ids}
+        remaining = [m for m in self.messages(broadcast_id) if str(m[0]) not in chat_ids]
+
+        def apply(data):
+            broadcasts = data.get("broadcasts", {})
+            entry = broadcasts.get(broadcast_id)
+            if entry is None:
+                return
+            entry.pop("messages", None)
+            entry["chats"] = len(remaining)
+            if not remaining:
+                del broadcasts[broadcast_id]
+        if remaining:
+            os.makedirs(self.folder, exist_ok=True)
+            _write_json_atomic(self._path(broadcast_id), remaining, indent=None)
+        update_json(self.filename, {"broadcasts": {}}, apply, indent=None)
+        if not remaining:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(broadcast_id))
+
+    def expired(self, now=None):
+        now = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        return [bid for bid, entry in self.all().items() if entry.get("expires") and entry["expires"] <= now]
+
+def message_senders(messages):
+    """chat_id -> bot_id che ha inviato il messaggio, dalle righe di SentMessageStore."""
+    return {str(m[0]): m[2] for m in messages if len(m) > 2}
+
+# ---------- Broadcast Statistics ----------
+def category_name(category_full):
+    """Nome della categoria senza emoji ("Avvisi: 📣" -> "Avvisi")."""
+    if not category_full or category_full == "Nessuna":
+        return "Nessuna"
+    return category_full.split(":")[0].strip() or "Nessuna"
+
+class BroadcastStats:
+    """
+    Aggregati degli invii, aggiornati a ogni consegna e salvati in stats.json
+    come bucket giornalieri: {giorno: {"chat_id|categoria": [inviati, byte, falliti, latenza_ms, misure]}}.
+    `misure` conta le richieste di cui è sommata la latenza: quelle che caricano
+    un allegato ne sono escluse, perché il loro tempo è la misura del caricamento.
+    Le chat sono indicate per id (i nomi cambiano e possono contenere "|"):
+    i nomi si ricavano solo quando le statistiche vengono mostrate.
+    Le statistiche di un periodo si calcolano sommando i bucket, senza rileggere il log.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pending = {}
+        self.upload_rate = None # Ultima velocità di caricamento misurata, non ancora salvata
+
+    @staticmethod
+    def _values(values):
+        """Bucket nel formato corrente (prima di `misure` ogni richiesta era misurata)."""
+        return list(values) if len(values) > 4 else list(values) + [values[0] + values[2]]
+
+    def record(self, chat_id, category, ok, nbytes, latency):
+        """`latency` in secondi, o None se la richiesta non va nella media (caricamento)."""
+        day = datetime.now().strftime('%Y-%m-%d')
+        bucket = self.pending.setdefault(day, {}).setdefault(f"{chat_id}|{category}", [0, 0, 0, 0.0, 0])
+        if ok:
+            bucket[0] += 1
+            bucket[1] += nbytes
+        else:
+            bucket[2] += 1
+        if latency is not None:
+            bucket[3] += latency * 1000
+            bucket[4] += 1
+
+    def record_upload(self, nbytes, seconds):
+        """Velocità di un caricamento di allegato; quelli piccoli misurano solo la latenza."""
+        if nbytes >= UPLOAD_SAMPLE_MIN and seconds > 0:
+            self.upload_rate = nbytes / seconds
+
+    def take(self):
+        """Ritorna e azzera gli aggregati in memoria, (pending, upload_rate), da passare a write()."""
+        pending, self.pending = self.pending, {}
+        upload_rate, self.upload_rate = self.upload_rate, None
+        return pending, upload_rate
+
+    def flush(self):
+        """Somma gli aggregati in memoria a quelli su disco (una scrittura per invio massivo)."""
+        self.write(*self.take())
+
+    def write(self, pending, upload_rate=None):
+        """Somma aggregati presi con take() a quelli su disco (anche da un altro thread)."""
+        if not pending and not upload_rate:
+            return
+
+        def merge(stats):
+            if upload_rate:
+                # Media mobile: segue i cambi di rete senza dipendere da un solo invio
+                old = stats.get("upload_rate")
+                stats["upload_rate"] = upload_rate if not old else 0.7 * old + 0.3 * upload_rate
+            buckets = stats.setdefault("buckets", {})
+            for day, groups in pending.items():
+                day_buckets = buckets.setdefault(day, {})
+                for key, values in groups.items():
+                    old = self._values(day_buckets.get(key, [0, 0, 0, 0.0, 0]))
+                    day_buckets[key] = [a + b for a, b in zip(old, values)]
+
+        update_json(self.filename, {"buckets": {}}, merge)
+
+    def rollup(self, start, end, group_by, names=None):
+        """
+        Totali per "chat", "category" o "day" tra le date start ed end (YYYY-MM-DD, incluse).
+        Per "chat" i gruppi sono i chat_id, o i nomi di `names` (chat_id -> nome)
+        se indicato; i bucket salvati per nome dalle versioni precedenti restano col nome.
+        Ritorna {gruppo: [inviati, byte, falliti, latenza_ms, misure]}.
+        """
+        names = names or {}
+        buckets = load_json(self.filename, {"buckets": {}}).get("buckets", {})
+        totals = {}
+        for day, groups in buckets.items():
+            if not (start <= day <= end):
+                continue
+            for key, values in groups.items():
+                chat, _, category = key.partition("|") # Un id non contiene "|", la categoria sì
+                group = {"chat": names.get(chat, chat), "category": category, "day": day}[group_by]
+                old = totals.get(group, [0, 0, 0, 0.0, 0])
+                totals[group] = [a + b for a, b in zip(old, self._values(values))]
+        return totals
+
+    def measured(self, days=None):
+        """
+        (latenza media per richiesta in secondi, velocità di caricamento in byte/s)
+        degli ultimi `days` giorni; None dove non ci sono ancora misure.
+        """
+        end = datetime.now()
+        start = (end - timedelta(days=days or DRY_RUN_STATS_DAYS)).strftime('%Y-%m-%d')
+        totals = self.rollup(start, end.strftime('%Y-%m-%d'), "day").values()
+        samples = sum(t[4] for t in totals)
+        latency = sum(t[3] for t in totals) / samples / 1000 if samples else None
+        return latency, load_json(self.filename, {}).get("upload_rate")
+
+# ---------- History Log Rotation ----------
+LOG_ENTRY_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}) \d{2}:\d{2}:\d{2} -> ", re.MULTILINE)
+
+def _log_first_timestamp(filename):
+    """Data della prima voce del log, leggendo solo l'inizio del file."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return datetime.strptime(f.read(19), '%Y-%m-%d %H:%M:%S')
+    except (OSError, ValueError):
+        return None
+
+def rotate_log(settings, force=False):
+    """
+    Se log.txt supera la dimensione o l'età massima, lo sposta in un segmento
+    compresso in log_archive/ e aggiorna l'indice. Ritorna il segmento creato.
+    """
+    if not os.path.exists(LOG_FILE):
+        return None
+    max_bytes = settings.get("LOG_ROTATE_BYTES", DEFAULT_SETTINGS["LOG_ROTATE_BYTES"])
+    max_days = settings.get("LOG_ROTATE_DAYS", DEFAULT_SETTINGS["LOG_ROTATE_DAYS"])
+    first = _log_first_timestamp(LOG_FILE)
+    too_big = os.path.getsize(LOG_FILE) > max_bytes
+    too_old = first is not None and datetime.now() - first > timedelta(days=max_days)
+    if not (force or too_big or too_old):
+        return None
+
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    name = f"log-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.txt.gz"
+    rotating = os.path.join(LOG_ARCHIVE_DIR, f".{name}.rotating")
+    with file_lock(LOG_FILE):
+        if not os.path.exists(LOG_FILE):
+            return None
+        # Le nuove voci (append) creano subito un log.txt nuovo
+        os.replace(LOG_FILE, rotating)
+    with open(rotating, "r", encoding="utf-8") as f:
+        text = f.read()
+    days = LOG_ENTRY_RE.findall(text)
+    with gzip.open(os.path.join(LOG_ARCHIVE_DIR, name), "wt", encoding="utf-8", compresslevel=6) as gz:
+        gz.write(text)
+    os.remove(rotating)
+
+    segment = {
+        "file": name,
+        "first": days[0] if days else None,
+        "last": days[-1] if days else None,
+        "entries": len(days)
+    }
+    update_json(LOG_INDEX_FILE, {"segments": [], "summaries": {}},
+                lambda index: index.setdefault("segments", []).append(segment))
+    return segment
+
+def compact_log_archive(settings):
+    """
+    Sostituisce i segmenti più vecchi di LOG_COMPACT_DAYS con un riepilogo
+    (numero di messaggi per giorno) nell'indice. Ritorna i segmenti rimossi.
+    """
+    if not os.path.exists(LOG_INDEX_FILE):
+        return []
+    days = settings.get("LOG_COMPACT_DAYS", DEFAULT_SETTINGS["LOG_COMPACT_DAYS"])
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    removed = []
+
+    def compact(index):
+        summaries = index.setdefault("summaries", {})
+        keep = []
+        for segment in index.get("segments", []):
+            if not segment.get("last") or segment["last"] >= cutoff:
+                keep.append(segment)
+                continue
+            for day in LOG_ENTRY_RE.findall(read_log_segment(segment["file"])):
+                summaries[day] = summaries.get(day, 0) + 1
+            removed.append(segment["file"])
+        index["segments"] = keep
+
+    update_json(LOG_INDEX_FILE, {"segments": [], "summaries": {}}, compact)
+    for name in removed:
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(LOG_ARCHIVE_DIR, name))
+    return removed
+
+def read_log_segment(name):
+    """Testo di un segmento archiviato della cronologia."""
+    with gzip.open(os.path.join(LOG_ARCHIVE_DIR, name), "rt", encoding="utf-8") as gz:
+        return gz.read()
+
+# ---------- Backup Functions ----------
+BACKUP_MANIFEST_NAME = "manifest.json"
+BACKUP_CHUNK_SIZE = 1024 * 1024
+
+class HashingReader:
+    """File wrapper che calcola lo SHA-256 di ciò che viene letto (una sola passata sul disco)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        return data
+
+def iter_data_files():
+    """Percorsi relativi di tutti i file in eb_data da salvare nel backup."""
+    skip = {os.path.abspath(BACKUP_STATE_FILE)}
+    for dirpath, dirnames, filenames in os.walk(DATA_DIR):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if name.startswith(".") or os.path.abspath(path) in skip:
+                continue
+            yield os.path.relpath(path, DATA_DIR).replace(os.sep, "/")
+
+def write_backup_archive(dest, base=None):
+    """
+    Scrive un backup .tar.gz di eb_data in streaming, con un manifest degli hash.
+    Se `base` è il manifest di un backup precedente (stessa cartella), salva
+    solo i file cambiati e per gli altri rimanda all'archivio che li contiene.
+    Ritorna il manifest scritto.
+    """
+    archive_name = os.path.basename(dest)
+    base_files = base["files"] if base else {}
+    manifest = {
+        "backup_version": 2,
+        "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "base": base["archive"] if base else None,
+        "archive": archive_name,
+        "files": {}
+    }
+    with tarfile.open(dest, "w:gz", compresslevel=6) as tar:
+        for rel in iter_data_files():
+            path = os.path.join(DATA_DIR, rel)
+            st = os.stat(path)
+            old = base_files.get(rel)
+            if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                # Invariato dall'ultimo backup: resta nell'archivio che lo contiene già
+                manifest["files"][rel] = dict(old)
+                continue
+            info = tarfile.TarInfo(f"data/{rel}")
+            info.size = st.st_size
+            info.mtime = int(st.st_mtime)
+            with open(path, "rb") as f:
+                reader = HashingReader(f)
+                tar.addfile(info, reader)
+            manifest["files"][rel] = {
+                "sha256": reader.sha256.hexdigest(), "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns, "in": archive_name
+            }
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        info = tarfile.TarInfo(BACKUP_MANIFEST_NAME)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(data))
+    return manifest
+
+def backup_target(root, rel):
+    """
+    Percorso di `rel` (nome relativo con "/" preso da un archivio o dal suo
+    manifest) dentro root. Solleva ValueError per nomi assoluti, con "..",
+    o che comunque finirebbero fuori da root: un backup arriva da altre macchine.
+    """
+    parts = rel.split("/")
+    if not rel or rel.startswith("/") or "\\" in rel or ":" in parts[0] or any(p in ("", ".", "..") for p in parts):
+        raise ValueError(f"Percorso non valido nel backup: {rel!r}")
+    root = os.path.realpath(root)
+    target = os.path.realpath(os.path.join(root, *parts))
+    if os.path.commonpath([root, target]) != root or target == root:
+        raise ValueError(f"Percorso non valido nel backup: {rel!r}")
+    return target
+
+def _extract_verified(archive_path, staging, wanted=None):
+    """
+    Estrae in streaming da un archivio i file richiesti in staging, calcolando
+    l'hash durante la copia. `wanted` (rel -> sha256 atteso) limita e verifica
+    i file; se None estrae tutto. Ritorna (manifest, {rel: sha256 estratto}).
+    """
+    manifest = None
+    hashes = {}
+    with tarfile.open(archive_path, "r|gz") as tar:
+        for member in tar:
+            if member.name == BACKUP_MANIFEST_NAME:
+                manifest = json.load(tar.extractfile(member))
+                continue
+            if not member.isfile() or not member.name.startswith("data/"):
+                continue
+            rel = member.name[len("data/"):]
+            if wanted is not None and rel not in wanted:
+                continue
+            target = backup_target(staging, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            src = tar.extractfile(member)
+            h = hashlib.sha256()
+            with open(target, "wb") as out:
+                for chunk in iter(lambda: src.read(BACKUP_CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+            hashes[rel] = h.hexdigest()
+            if wanted is not None and hashes[rel] != wanted[rel]:
+                raise ValueError(f"Hash non valido per {rel} in {os.path.basename(archive_path)}")
+    return manifest, hashes
+
+def restore_backup_archive(archive_path):
+    """
+    Ripristina un backup .tar.gz (anche incrementale) in eb_data.
+    I file vengono prima estratti e verificati in una cartella temporanea e
+    solo alla fine sostituiscono quelli attuali. Ritorna il manifest.
+    """
+    shutil.rmtree(RESTORE_TMP_DIR, ignore_errors=True)
+    os.makedirs(RESTORE_TMP_DIR)
+    try:
+        manifest, extracted = _extract_verified(archive_path, RESTORE_TMP_DIR)
+        if not manifest or "files" not in manifest:
+            raise ValueError("Manifest mancante")
+
+        by_archive = {}
+        for rel, entry in manifest["files"].items():
+            backup_target(DATA_DIR, rel) # Rifiuta il manifest prima di toccare qualsiasi file
+            if entry["in"] == manifest["archive"]:
+                if extracted.get(rel) != entry["sha256"]:
+                    raise ValueError(f"Hash non valido per {rel}")
+            else:
+                by_archive.setdefault(entry["in"], {})[rel] = entry["sha256"]
+
+        # File invariati: si trovano nei backup precedenti, nella stessa cartella
+        folder = os.path.dirname(os.path.abspath(archive_path))
+        for name, wanted in by_archive.items():
+            if not name or os.path.basename(name) != name or name in (".", ".."):
+                raise ValueError(f"Nome di backup di base non valido: {name!r}")
+            base_path = os.path.join(folder, name)
+            if not os.path.exists(base_path):
+                raise FileNotFoundError(f"Backup di base mancante: {name}")
+            _, found = _extract_verified(base_path, RESTORE_TMP_DIR, wanted)
+            if set(found) != set(wanted):
+                raise ValueError(f"File mancanti nel backup di base {name}")
+
+        # Tutto verificato: sostituisci i file
+        for rel in manifest["files"]:
+            target = backup_target(DATA_DIR, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(backup_target(RESTORE_TMP_DIR, rel), target)
+        return manifest
+    finally:
+        shutil.rmtree(RESTORE_TMP_DIR, ignore_errors=True)
+
+# ---------- Local Submission API ----------
+API_MAX_BODY = 1024 * 1024 # Dimensione massima di una richiesta
+API_MAX_FINISHED_JOBS = 1000 # Job conclusi di cui si conserva lo stato
+API_STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+                   404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+class SubmissionServer:
+    """
+    Server HTTP/1.1 minimo sul loop asyncio dell'app, per inviare broadcast
+    da altri programmi senza bloccare la GUI:
+
+        POST /broadcasts       JSON del job -> 202 {"id": ..., "status_url": ...}
+        GET  /broadcasts/<id>  stato del job (queued/running/done/failed/cancelled)
+
+    Ogni richiesta deve avere "Authorization: Bearer <API_SECRET>". Gli allegati
+    si indicano con "attachment_hash" (sha256 di un file già nell'archivio
+    allegati), mai con un percorso: il server non legge altri file del disco.
+    `submit(payload)` ritorna (id, None) o (None, errore); `status(id)` il dict di stato.
+    """
+
+    def __init__(self, secret, submit, status):
+        self.secret = secret
+        self.submit = submit
+        self.status = status
+        self.server = None
+
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    def authorized(self, headers):
+        return hmac.compare_digest(headers.get("authorization", "").encode("utf-8"), f"Bearer {self.secret}".encode("utf-8"))
+
+    def dispatch(self, method, path, headers, body):
+        if not self.authorized(headers):
+            return 401, {"error": "Segreto non valido"}
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        if parts[0] != "broadcasts" or len(parts) > 2:
+            return 404, {"error": "Percorso sconosciuto"}
+        if len(parts) == 2:
+            if method != "GET":
+                return 405, {"error": "Metodo non consentito"}
+            status = self.status(parts[1])
+            return (200, status) if status is not None else (404, {"error": "Job sconosciuto"})
+        if method != "POST":
+            return 405, {"error": "Metodo non consentito"}
+        try:
+            payload = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return 400, {"error": "JSON non valido"}
+        if not isinstance(payload, dict):
+            return 400, {"error": "Il job deve essere un oggetto JSON"}
+        job_id, error = self.submit(payload)
+        if error:
+            return 400, {"error": error}
+        return 202, {"id": job_id, "status_url": f"/broadcasts/{job_id}"}
+
+    async def handle(self, reader, writer):
+        """Una connessione: più richieste in keep-alive finché il client non chiude."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > API_MAX_BODY:
+                    status, payload = 413, {"error": "Richiesta troppo grande"}
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = self.dispatch(method, path, headers, body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {API_STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass # Richiesta malformata o client disconnesso
+        finally:
+            writer.close()
+
+# ---------- Bulk Import ----------
+# Colonne CSV / chiavi JSONL di una campagna: una riga = un messaggio
+IMPORT_FIELDS = ["chat", "title", "body", "category", "signature", "attachment", "attachment_type"]
+IMPORT_PREVIEW_ROWS = 20
+IMPORT_BATCH = 200 # Righe lette per volta (nel thread) durante l'importazione
+IMPORT_CONCURRENCY = 8 # Messaggi della campagna inviati in parallelo
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".gif"}
+
+def iter_import_rows(path):
+    """
+    Righe di un file CSV (con intestazione) o JSONL lette in streaming, come
+    (numero di riga, dict, errore di lettura o None).
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    yield n, {"raw": line.rstrip("\r\n")}, "JSON non valido"
+                    continue
+                if isinstance(row, dict):
+                    yield n, row, None
+                else:
+                    yield n, {"raw": line.rstrip("\r\n")}, "La riga non è un oggetto JSON"
+        else:
+            reader = csv.DictReader(f)
+            line = 2 # Prima riga dopo l'intestazione
+            for row in reader:
+                yield line, row, None
+                line = reader.line_num + 1 # Un campo tra virgolette può occupare più righe
+
+def import_field(row, key):
+    """Campo di una riga importata come stringa: in JSONL può essere un numero, una lista, null..."""
+    value = row.get(key)
+    return "" if value is None else str(value)
+
+def import_row_payload(row, base_dir):
+    """Riga importata -> payload di job (percorsi degli allegati relativi al file importato)."""
+    attachment = import_field(row, "attachment").strip() or None
+    attachment_type = import_field(row, "attachment_type").strip() or None
+    if attachment:
+        attachment = os.path.join(base_dir, os.path.expanduser(attachment))
+        if not attachment_type:
+            attachment_type = "photo" if os.path.splitext(attachment)[1].lower() in IMAGE_EXTENSIONS else "document"
+    return {
+        "chats": [import_field(row, "chat").strip()],
+        "title": import_field(row, "title"),
+        "body": import_field(row, "body"),
+        "category": import_field(row, "category").strip() or "Nessuna",
+        "signature": import_field(row, "signature").strip(),
+        "attachment_path": attachment,
+        "attachment_type": attachment_type
+    }
+
+# ---------- Dry Run ----------
+TEXT_LIMIT = 4096 # Caratteri (UTF-16) di un messaggio, dopo l'interpretazione di MarkdownV2
+CAPTION_LIMIT = 1024 # Caratteri della didascalia di un allegato
+UPLOAD_LIMITS = {"photo": 10 * 2**20, "document": 50 * 2**20} # Bot API pubblica
+LOCAL_UPLOAD_LIMIT = 2000 * 2**20 # Server Bot API locale
+DRY_RUN_LATENCY = 0.3 # Secondi per richiesta se non ci sono statistiche
+DRY_RUN_UPLOAD_RATE = 2**20 # Byte/s di caricamento se non è mai stato misurato
+DRY_RUN_STATS_DAYS = 30 # Giorni di statistiche usati per la latenza misurata
+UPLOAD_SAMPLE_MIN = 256 * 1024 # Allegati più piccoli non misurano la banda
+
+def visible_length(text):
+    """Lunghezza in unità UTF-16 del testo MarkdownV2 una volta interpretato, come la conta Telegram."""
+    plain = re.sub(r"\\(.)|[*_]", lambda m: m.group(1) or "", text, flags=re.DOTALL)
+    return len(plain.encode("utf-16-le")) // 2
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds // 60 % 60:02d} min"
+
+class DryRun:
+    """
+    Stima di uno o più invii senza chiamate di rete: valida i messaggi come
+    farebbe Telegram, conta richieste e byte per bot come run_broadcast
+    (chat hub, un caricamento per bot, get_chat per le chat non assegnate)
+    e simula la coda del limitatore di ogni bot con la concorrenza della corsia.
+    """
+
+    def __init__(self, settings, bot_ids, chat_bots, concurrency, latency=None, upload_rate=None):
+        self.rate = float(settings.get("BOT_RATE_LIMIT", 25))
+        self.local_mode = local_mode(settings)
+        self.hub_chat = str(settings.get("HUB_CHAT_ID", "")).strip()
+        self.fanout_mode = settings.get("FANOUT_MODE", "send")
+        self.bot_ids = list(bot_ids) or [""]
+        self.chat_bots = dict(chat_bots)
+        self.concurrency = max(1, int(concurrency))
+        # Misure degli invii precedenti (BroadcastStats.measured), altrimenti valori prudenti
+        self.measured = latency is not None, upload_rate is not None
+        self.latency = latency or DRY_RUN_LATENCY
+        self.upload_rate = upload_rate or DRY_RUN_UPLOAD_RATE
+        self.requests = [] # (indice del bot, secondi, byte, richiesta da attendere o None)
+        self.messages = 0
+        self.chats = 0
+
+    def _request(self, bot, seconds, nbytes=0, after=None):
+        self.requests.append((bot, seconds, nbytes, after))
+        return len(self.requests) - 1
+
+    def _bot_for(self, chat_id):
+        """Come BotPool.resolve: le chat non ancora assegnate costano un get_chat al bot preferito."""
+        index = preferred_bot(chat_id, self.bot_ids, self.chat_bots)
+        if len(self.bot_ids) > 1 and self.chat_bots.get(str(chat_id)) not in self.bot_ids:
+            self._request(index, self.latency)
+            self.chat_bots[str(chat_id)] = self.bot_ids[index]
+        return index
+
+    def add(self, text, chat_ids, attachment_path=None, attachment_type=None):
+        """Aggiunge un invio (testo già formattato) alla stima. Ritorna la lista degli errori."""
+        errors = []
+        has_attachment = bool(attachment_path and attachment_type)
+        limit = CAPTION_LIMIT if has_attachment else TEXT_LIMIT
+        length = visible_length(text)
+        if length > limit:
+            errors.append(f"{'Didascalia' if has_attachment else 'Testo'} troppo lungo: {length}/{limit} caratteri")
+        size = 0
+        if has_attachment:
+            size = os.path.getsize(attachment_path)
+            max_size = LOCAL_UPLOAD_LIMIT if self.local_mode else UPLOAD_LIMITS[attachment_type]
+            if size > max_size:
+                errors.append(f"Allegato troppo grande: {size / 2**20:.1f}/{max_size / 2**20:.0f} MB")
+            if attachment_type == "photo" and os.path.splitext(attachment_path)[1].lower() not in IMAGE_EXTENSIONS:
+                errors.append("L'allegato inviato come foto non è un'immagine")
+        if errors or not chat_ids:
+            return errors
+
+        self.messages += 1
+        self.chats += len(chat_ids)
+        text_bytes = len(text.encode("utf-8"))
+        # Con un server locale il file viene letto dal disco: nessun caricamento
+        upload_bytes = 0 if self.local_mode else size
+        upload_seconds = upload_bytes / self.upload_rate
+        if self.hub_chat and self.fanout_mode != "send" and len(chat_ids) > 1:
+            hub = self._request(0, self.latency + upload_seconds, text_bytes + upload_bytes)
+            for chat_id in chat_ids:
+                self._request(self._bot_for(chat_id), self.latency, after=hub)
+            return []
+        uploads = {} # bot -> richiesta che ne fissa il file_id
+        for chat_id in chat_ids:
+            bot = self._bot_for(chat_id)
+            if has_attachment and bot not in uploads:
+                uploads[bot] = self._request(bot, self.latency + upload_seconds, text_bytes + upload_bytes)
+            else:
+                self._request(bot, self.latency, text_bytes, uploads.get(bot))
+        return []
+
+    def estimate(self):
+        """
+        Simula la coda: token bucket da BOT_RATE_LIMIT richieste/s per bot (raffica
+        iniziale compresa) e al massimo `concurrency` richieste in corso per bot.
+        Ritorna (durata in secondi, richieste, byte inviati).
+        """
+        finish = {}
+        duration = 0.0
+        # Il primo bot pubblica nella chat hub: le sue richieste vanno simulate per prime
+        for bot in range(len(self.bot_ids)):
+            workers = [0.0] * self.concurrency # Istante in cui ogni slot torna libero
+            tokens, updated = self.rate, 0.0
+            for index, (owner, seconds, _, after) in enumerate(self.requests):
+                if owner != bot:
+                    continue
+                start = max(heapq.heappop(workers), updated)
+                tokens = min(self.rate, tokens + (start - updated) * self.rate)
+                if tokens < 1:
+                    start += (1 - tokens) / self.rate
+                    tokens = 1.0
+                tokens -= 1
+                updated = start
+                # Chi attende il file_id (o la chat hub) ha già preso il suo token
+                finish[index] = max(start, finish[after]) + seconds if after is not None else start + seconds
+                heapq.heappush(workers, finish[index])
+                duration = max(duration, finish[index])
+        return duration, len(self.requests), sum(r[2] for r in self.requests)
+
+# ---------- File Watcher ----------
+# inotify è opzionale (solo Linux): senza, si controllano mtime e dimensione
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+class DataFileWatcher:
+    """
+    Rileva le modifiche esterne ai file di eb_data (script di provisioning,
+    altre istanze). Con inotify legge solo gli eventi pendenti; altrimenti
+    confronta mtime/dimensione. Le scritture di questa istanza vengono
+    ignorate grazie a _file_stamps.
+    """
+
+    def __init__(self, filenames):
+        self.filenames = [os.path.abspath(f) for f in filenames]
+        self.inotify = None
+        if INotify is not None:
+            try:
+                self.inotify = INotify()
+                self.inotify.add_watch(os.path.abspath(DATA_DIR), inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE | inotify_flags.DELETE)
+            except OSError:
+                self.inotify = None
+
+    def poll(self):
+        """Ritorna i file modificati dall'esterno dall'ultimo controllo."""
+        candidates = self.filenames
+        if self.inotify is not None:
+            names = {event.name for event in self.inotify.read(timeout=0)}
+            if not names:
+                return []
+            candidates = [f for f in self.filenames if os.path.basename(f) in names]
+        changed = [f for f in candidates if _file_stamps.get(f) != file_stamp(f)]
+        for f in changed:
+            record_file_stamp(f)
+        return changed
+
 # Simulazione temporanea per HTMLLabel per prevenire errori se l'utente non ce l'ha
 try:
     from tkhtmlview import HTMLLabel
@@ -137,36 +1937,35 @@ class EBGUI:
         self.root.title("EasyBroadcast for Telegram Bots")
         self.root.geometry("750x700")
 
-        # Impostazioni predefinite, incluse le categorie
-        default_settings = {
-            "SIGNATURES": [],
-            "EMOJIS": ["👍", "🎉", "🔥", "🚀", "💡", "✅", "❌"],
-            "UPDATE_SERVER": "downloads.kekkotech.com",
-            "SERVICE_ID": "EasyBroadcast",
-            "isFirstOpen": True,
-            "checkUpdatesOnStart": True,
-            "CATEGORIES": [] 
-        }
-
-        self.config = load_json(CONFIG_FILE, {"BOT_TOKEN": "", "CHAT_LIST": {}})
-        self.settings = load_json(SETTINGS_FILE, default_settings)
-        
-        # Assicura che la chiave CATEGORIES esista se il file settings è vecchio
-        if "CATEGORIES" not in self.settings:
-            self.settings["CATEGORIES"] = default_settings["CATEGORIES"]
+        self.config, self.settings = load_config(), load_settings()
         
         # Carica le opzioni delle categorie dalle impostazioni
-        self.category_options = self.settings.get("CATEGORIES", default_settings["CATEGORIES"])
-
+        self.category_options = self.settings.get("CATEGORIES", [])
 
-        # Inizializzazione del bot Telegram
-        self.bot = None
-        self.init_bot()
 
         # Corretta l'integrazione tra asyncio e tkinter
         # 1. Creo un nuovo event loop per asyncio
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
+
+        # Inizializzazione del bot Telegram (le connessioni si aprono in background)
+        self.bot = None
+        self.bot_pool = None
+        self.init_bot()
+        self.delivery_ledger = DeliveryLedger(DELIVERY_LEDGER_FILE)
+        self.stats = BroadcastStats(STATS_FILE)
+        self.sent_messages = SentMessageStore(SENT_MESSAGES_FILE, SENT_MESSAGES_DIR)
+        self.delivery_reports = DeliveryReportStore(DELIVERY_REPORTS_FILE, DELIVERY_REPORTS_DIR)
+        self.attachments = AttachmentStore(ATTACHMENTS_DIR)
+        self.compression_pool = concurrent.futures.ThreadPoolExecutor(COMPRESSION_WORKERS)
+        # Scritture dei file grandi dopo un invio: un solo thread, così restano in ordine
+        self.io_pool = concurrent.futures.ThreadPoolExecutor(1)
+        self.inflight_attachments = collections.Counter() # Allegati (hash) degli invii in corso, protetti dal gc
+        self.expiring = set() # Invii scaduti con l'eliminazione in corso
+        self.pending_log = [] # Voci della cronologia e rapporti in attesa di flush_send_results
+        self.pending_reports = []
+        self.results_flush_scheduled = False
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # 2. Avvio il gestore del loop dopo 1ms
         self.root.after(1, self.run_asyncio_loop)
@@ -210,7 +2009,7 @@ class EBGUI:
             return
         
         try:
-            self.bot = Bot(token=token)
+            self.bot = create_bot(token, self.settings)
             # Usiamo il loop che abbiamo creato per eseguire il task bloccante
             self.loop.run_until_complete(self.bot.get_me())
         except TelegramError as e:
@@ -224,6 +2023,7 @@ class EBGUI:
 
         self.config["BOT_TOKEN"] = token
         save_json(CONFIG_FILE, self.config)
+        self.init_bot()
 
         messagebox.showinfo("Azione richiesta", "Ora aggiungi il bot a un gruppo o inviagli un messaggio privato,\npoi premi OK per rilevare la chat.", parent=self.root)
 
@@ -279,16 +2079,35 @@ class EBGUI:
         self.create_tab_drafts()
         self.create_tab_history()
         self.create_tab_settings()
+        self.create_tab_stats()
         self.create_tab_info()
         self.create_tab_whats_new()
         self.load_draft()
 
+        # Controllo periodico delle modifiche esterne ai file dati
+        self.settings_conflict = False
+        self.data_watcher = DataFileWatcher([CONFIG_FILE, SETTINGS_FILE, DRAFT_FILE, LOG_FILE])
+        record_file_stamp(LOG_FILE)
+        self.root.after(WATCH_INTERVAL_MS, self.poll_data_files)
+        self.root.after(EXPIRY_CHECK_MS, self.check_expired_broadcasts)
+        self.loop.create_task(self.collect_attachments())
+        self.api_server = None
+        self.api_jobs = {} # id -> stato dei job ricevuti dall'API
+        self.loop.create_task(self.restart_api_server())
+
     def init_bot(self):
-        token = self.config.get("BOT_TOKEN", "")
-        if token:
-            self.bot = Bot(token=token)
+        old_pool = self.bot_pool
+        tokens = get_bot_tokens(self.config)
+        if tokens:
+            self.bot_pool = BotPool(tokens, self.settings, self.config.get("CHAT_BOTS", {}))
+            self.bot = self.bot_pool.primary
+            self.bot_pool.warming = self.loop.create_task(self.bot_pool.warm_up())
         else:
+            self.bot_pool = None
             self.bot = None
+        if old_pool:
+            # I bot sostituiti chiudono le loro connessioni quando gli invii in corso finiscono
+            self.loop.create_task(old_pool.shutdown())
 
     # ---------- Tab Creation Methods ----------
     def create_tab_messages(self):
@@ -314,7 +2133,7 @@ class EBGUI:
             pass
 
         ttk.Label(frame, text="Seleziona Chat:", font=("Frutiger", 12, "bold")).grid(row=2, column=0, sticky="w")
-        self.chat_combo = ttk.Combobox(frame, values=list(self.config.get("CHAT_LIST", {}).keys()), state="readonly", width=30)
+        self.chat_combo = ttk.Combobox(frame, values=self.get_chat_combo_values(), state="readonly", width=30)
         self.chat_combo.grid(row=3, column=0, pady=5, sticky="w")
         if self.chat_combo['values']:
             self.chat_combo.current(0)
@@ -330,6 +2149,17 @@ class EBGUI:
         if combobox_values:
             self.category_combo.set("Nessuna") # Imposta "Nessuna" come predefinito
 
+        # Scadenza: il messaggio viene eliminato automaticamente da tutte le chat
+        expiry_frame = ttk.Frame(frame)
+        expiry_frame.grid(row=5, column=0, sticky="e")
+        # Urgente: passa davanti alle campagne in corso sullo stesso bot
+        self.urgent_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(expiry_frame, text="Urgente", variable=self.urgent_var).pack(side="left", padx=5)
+        ttk.Label(expiry_frame, text="Scadenza:").pack(side="left", padx=5)
+        self.expiry_combo = ttk.Combobox(expiry_frame, values=list(EXPIRY_OPTIONS), state="readonly", width=12)
+        self.expiry_combo.set("Nessuna")
+        self.expiry_combo.pack(side="left")
+
         ttk.Label(frame, text="Corpo del Messaggio:", font=("Frutiger", 12, "bold")).grid(row=6, column=0, sticky="w")
         
         body_text_frame = ttk.Frame(frame)
@@ -356,6 +2186,8 @@ class EBGUI:
         
         self.attachment_label = ttk.Label(self.attachment_frame, text="Nessun allegato", font=("Frutiger", 9, "italic"))
         self.attachment_label.pack(side="top", anchor="w")
+        self.attachment_thumb = ttk.Label(self.attachment_frame) # Mostrata solo se c'è un'anteprima
+        self.thumbnail_images = {} # hash -> PhotoImage, condiviso con la vista a griglia
 
         attach_btn_frame = ttk.Frame(self.attachment_frame)
         attach_btn_frame.pack(side="top", anchor="w", pady=2)
@@ -368,6 +2200,7 @@ class EBGUI:
         
         self.current_attachment_path = None
         self.current_attachment_type = None # Sarà 'photo' o 'document'
+        self.current_attachment_hash = None # Hash nell'archivio allegati, quando importato
         # --- Fine Frame Allegati ---
 
         self.emoji_frame = ttk.Frame(frame)
@@ -391,7 +2224,10 @@ class EBGUI:
         btn_frame.grid(row=11, column=0, columnspan=2, pady=10)
         # --- FINE MODIFICA ---
         ttk.Button(btn_frame, text="Anteprima Messaggio", command=self.preview_message).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Simula Invio", command=self.dry_run_form).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Importa Campagna", command=self.import_campaign).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Salva Bozza", command=self.save_draft).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Salva come Nuova", command=lambda: self.save_draft(as_new=True)).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Invia Messaggio", command=self.send_message).pack(side="left", padx=5)
 
         self.status_label = ttk.Label(frame, text="", font=("Frutiger", 10, "italic"))
@@ -399,6 +2235,21 @@ class EBGUI:
         self.status_label.grid(row=12, column=0, columnspan=2)
         # --- FINE MODIFICA ---
 
+        # Invii in corso: una riga per invio con avanzamento e annullamento
+        self.sends_frame = ttk.Frame(frame)
+        self.sends_frame.grid(row=13, column=0, columnspan=2, sticky="ew")
+        self.active_sends = {} # hash del modulo -> task di invio
+
+        # Salvataggio automatico della copia di lavoro dopo un po' di inattività
+        self.autosave_job = None
+        self.autosave_hash = None
+        self.current_draft_id = None # Bozza da cui proviene il modulo (per le revisioni)
+        for widget in (self.title_entry, self.other_signature_entry):
+            widget.bind("<KeyRelease>", self.schedule_autosave, add="+")
+        for combo in (self.chat_combo, self.category_combo, self.signature_combo):
+            combo.bind("<<ComboboxSelected>>", self.schedule_autosave, add="+")
+        self.body_text.bind("<<Modified>>", self.on_body_modified, add="+")
+
     def create_tab_drafts(self):
         self.tab_drafts = ttk.Frame(self.notebook)
         self.notebook.add(self.tab_drafts, text="Bozze")
@@ -412,6 +2263,8 @@ class EBGUI:
         btn_frame = ttk.Frame(frame)
         btn_frame.pack(pady=5)
         ttk.Button(btn_frame, text="Carica Bozza Selezionata", command=self.load_selected_draft).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Revisioni", command=self.show_draft_revisions).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Vista Griglia", command=self.show_draft_grid).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="Elimina Bozza Selezionata", command=self.delete_selected_draft).pack(side="left", padx=5)
 
         self.refresh_draft_list()
@@ -427,10 +2280,29 @@ class EBGUI:
         self.log_listbox.pack(fill="both", expand=True, pady=5)
         
         btn_frame = ttk.Frame(frame)
-        btn_frame.pack(pady=5, anchor="e") # Allineato a destra
-        ttk.Button(btn_frame, text="Pulisci Cronologia", command=self.clear_history).pack()
+        btn_frame.pack(pady=5, fill="x")
+        self.archive_label = ttk.Label(btn_frame, text="", font=("Frutiger", 9, "italic"))
+        self.archive_label.pack(side="left")
+        ttk.Button(btn_frame, text="Pulisci Cronologia", command=self.clear_history).pack(side="right") # Allineato a destra
+        self.load_archive_btn = ttk.Button(btn_frame, text="Carica Archivio", command=self.load_older_history)
+        self.load_archive_btn.pack(side="right", padx=5)
+        ttk.Button(btn_frame, text="Gestisci Inviati", command=self.show_sent_broadcasts).pack(side="right", padx=5)
+        ttk.Button(btn_frame, text="Rapporti", command=self.show_delivery_reports).pack(side="right", padx=5)
 
         self.refresh_history()
+        # Manutenzione all'avvio: rotazione e compattazione della cronologia, nel thread di I/O
+        settings = dict(self.settings)
+
+        def maintain():
+            rotate_log(settings)
+            compact_log_archive(settings)
+
+        def done(future):
+            if future.exception() is None: # Errori di rotazione: si riprova al prossimo avvio
+                record_file_stamp(LOG_FILE)
+                self.refresh_history()
+
+        self.io_pool.submit(maintain).add_done_callback(lambda f: self.loop.call_soon_threadsafe(done, f))
 
     def create_tab_settings(self):
         self.tab_settings = ttk.Frame(self.notebook)
@@ -456,18 +2328,35 @@ class EBGUI:
         self.token_entry.grid(row=1, column=0, pady=5, sticky="ew")
         self.token_entry.insert(0, self.config.get("BOT_TOKEN", ""))
 
-        ttk.Label(lf_bot, text="Lista Chat:", font=("Frutiger", 12, "bold")).grid(row=2, column=0, sticky="w", pady=(10, 0))
+        # Token aggiuntivi: le chat vengono distribuite tra tutti i bot
+        ttk.Label(lf_bot, text="Token aggiuntivi (separati da virgola):").grid(row=2, column=0, sticky="w")
+        self.extra_tokens_entry = ttk.Entry(lf_bot, width=60)
+        self.extra_tokens_entry.grid(row=3, column=0, pady=5, sticky="ew")
+        self.extra_tokens_entry.insert(0, ", ".join(self.config.get("BOT_TOKENS", [])))
+
+        ttk.Label(lf_bot, text="Lista Chat:", font=("Frutiger", 12, "bold")).grid(row=4, column=0, sticky="w", pady=(10, 0))
         self.chat_listbox = tk.Listbox(lf_bot, height=8)
-        self.chat_listbox.grid(row=3, column=0, sticky="ew", pady=5)
+        self.chat_listbox.grid(row=5, column=0, sticky="ew", pady=5)
         for chat_name, chat_id in self.config.get("CHAT_LIST", {}).items():
             self.chat_listbox.insert("end", f"{chat_name} -> {chat_id}")
 
         chat_btn_frame = ttk.Frame(lf_bot)
-        chat_btn_frame.grid(row=4, column=0, pady=5, sticky="w")
+        chat_btn_frame.grid(row=6, column=0, pady=5, sticky="w")
         ttk.Button(chat_btn_frame, text="Aggiungi", command=self.add_chat).pack(side="left", padx=5)
         ttk.Button(chat_btn_frame, text="Modifica", command=self.edit_chat).pack(side="left", padx=5)
         ttk.Button(chat_btn_frame, text="Rimuovi", command=self.remove_chat).pack(side="left", padx=5)
 
+        # Invii a più chat: pubblicazione unica nella chat hub, poi copia o inoltro
+        ttk.Label(lf_bot, text="Chat hub (ID) e modalità di invio multiplo:").grid(row=7, column=0, sticky="w", pady=(10, 0))
+        hub_frame = ttk.Frame(lf_bot)
+        hub_frame.grid(row=8, column=0, pady=5, sticky="ew")
+        self.hub_chat_entry = ttk.Entry(hub_frame, width=20)
+        self.hub_chat_entry.pack(side="left")
+        self.hub_chat_entry.insert(0, self.settings.get("HUB_CHAT_ID", ""))
+        self.fanout_mode_combo = ttk.Combobox(hub_frame, values=list(FANOUT_MODES), state="readonly", width=36)
+        self.fanout_mode_combo.pack(side="left", padx=5)
+        self.fanout_mode_combo.set(self.fanout_mode_label())
+
         # --- GRUPPO 2: Connessione e Aggiornamenti (Alto Destra) ---
         lf_conn = ttk.LabelFrame(frame, text="Connessione e Aggiornamenti", padding=10)
         lf_conn.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
@@ -493,6 +2382,44 @@ class EBGUI:
         self.checkupdates_cb = ttk.Checkbutton(update_widgets_frame, text="Controlla all'avvio", variable=self.checkupdates_var, command=self.toggle_startup_update_check)
         self.checkupdates_cb.pack(side="left", pady=5)
 
+        ttk.Label(lf_conn, text="Bot API Server:", font=("Frutiger", 12, "bold")).grid(row=5, column=0, sticky="w", pady=(10, 0))
+        self.bot_api_url_entry = ttk.Entry(lf_conn, width=60)
+        self.bot_api_url_entry.grid(row=6, column=0, pady=5, sticky="ew")
+        self.bot_api_url_entry.insert(0, self.settings.get("BOT_API_BASE_URL", ""))
+        self.bot_api_url_entry.bind("<KeyRelease>", lambda e: self.update_local_mode_state())
+
+        ttk.Label(lf_conn, text="Bot API File URL:", font=("Frutiger", 12, "bold")).grid(row=7, column=0, sticky="w", pady=(10, 0))
+        self.bot_api_file_url_entry = ttk.Entry(lf_conn, width=60)
+        self.bot_api_file_url_entry.grid(row=8, column=0, pady=5, sticky="ew")
+        self.bot_api_file_url_entry.insert(0, self.settings.get("BOT_API_FILE_URL", ""))
+
+        self.bot_api_local_var = tk.BooleanVar(value=self.settings.get("BOT_API_LOCAL_MODE", False))
+        self.bot_api_local_cb = ttk.Checkbutton(lf_conn, text="Server locale (allegati inviati come percorso, senza limite di 50 MB)",
+                                                variable=self.bot_api_local_var)
+        self.bot_api_local_cb.grid(row=9, column=0, sticky="w")
+        self.update_local_mode_state()
+        ttk.Label(lf_conn, text="Vuoto = api.telegram.org", font=("Frutiger", 9, "italic")).grid(row=10, column=0, sticky="w")
+
+        compress_frame = ttk.Frame(lf_conn)
+        compress_frame.grid(row=11, column=0, sticky="w", pady=(10, 0))
+        self.compress_var = tk.BooleanVar(value=self.settings.get("COMPRESS_ATTACHMENTS", False))
+        ttk.Checkbutton(compress_frame, text="Comprimi i documenti se si risparmia almeno il", variable=self.compress_var).pack(side="left")
+        self.compress_saving_spin = ttk.Spinbox(compress_frame, from_=5, to=90, increment=5, width=4)
+        self.compress_saving_spin.pack(side="left", padx=2)
+        self.compress_saving_spin.set(int(self.settings.get("COMPRESS_MIN_SAVING", 0.2) * 100))
+        ttk.Label(compress_frame, text="%").pack(side="left")
+
+        throughput_frame = ttk.Frame(lf_conn)
+        throughput_frame.grid(row=12, column=0, sticky="w", pady=(10, 0))
+        ttk.Label(throughput_frame, text="Invii contemporanei per bot:").pack(side="left")
+        self.bot_concurrency_spin = ttk.Spinbox(throughput_frame, from_=1, to=64, increment=1, width=4)
+        self.bot_concurrency_spin.pack(side="left", padx=(2, 10))
+        self.bot_concurrency_spin.set(self.settings.get("BOT_CONCURRENCY", 8))
+        ttk.Label(throughput_frame, text="Messaggi/s per bot:").pack(side="left")
+        self.bot_rate_spin = ttk.Spinbox(throughput_frame, from_=1, to=30, increment=1, width=4)
+        self.bot_rate_spin.pack(side="left", padx=2)
+        self.bot_rate_spin.set(self.settings.get("BOT_RATE_LIMIT", 25))
+
 
         # --- GRUPPO 3: Contenuti (Basso Sinistra) ---
         lf_content = ttk.LabelFrame(frame, text="Contenuti", padding=10)
@@ -552,6 +2479,7 @@ class EBGUI:
         lf_backup.grid(row=1, column=1, sticky="nsew", padx=5, pady=5)
         
         ttk.Button(lf_backup, text="Crea Backup", command=self.create_backup).pack(pady=10, padx=10, fill="x")
+        ttk.Button(lf_backup, text="Crea Backup Incrementale", command=lambda: self.create_backup(incremental=True)).pack(pady=(0, 10), padx=10, fill="x")
         ttk.Button(lf_backup, text="Carica Backup", command=self.load_backup).pack(pady=10, padx=10, fill="x")
         ttk.Label(lf_backup, text="Salva o ricarica impostazioni, bozze e cronologia.", wraplength=200).pack(pady=10, padx=10, fill="x", expand=True)
 
@@ -561,6 +2489,67 @@ class EBGUI:
         ttk.Button(save_btn_frame, text="Salva impostazioni", command=self.save_settings).pack()
 
 
+    def create_tab_stats(self):
+        self.tab_stats = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_stats, text="Statistiche")
+        frame = ttk.Frame(self.tab_stats, padding=10)
+        frame.pack(fill="both", expand=True)
+
+        filter_frame = ttk.Frame(frame)
+        filter_frame.pack(fill="x", pady=5)
+        today = datetime.now()
+        ttk.Label(filter_frame, text="Dal:").pack(side="left")
+        self.stats_from_entry = ttk.Entry(filter_frame, width=11)
+        self.stats_from_entry.pack(side="left", padx=5)
+        self.stats_from_entry.insert(0, today.replace(day=1).strftime('%Y-%m-%d'))
+        ttk.Label(filter_frame, text="Al:").pack(side="left")
+        self.stats_to_entry = ttk.Entry(filter_frame, width=11)
+        self.stats_to_entry.pack(side="left", padx=5)
+        self.stats_to_entry.insert(0, today.strftime('%Y-%m-%d'))
+        ttk.Label(filter_frame, text="Raggruppa per:").pack(side="left", padx=(10, 0))
+        self.stats_group_combo = ttk.Combobox(filter_frame, values=["Chat", "Categoria", "Giorno"], state="readonly", width=10)
+        self.stats_group_combo.set("Chat")
+        self.stats_group_combo.pack(side="left", padx=5)
+        self.stats_group_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_stats())
+        ttk.Button(filter_frame, text="Aggiorna", command=self.refresh_stats).pack(side="left", padx=5)
+
+        columns = ("group", "sent", "failed", "bytes", "latency")
+        self.stats_tree = ttk.Treeview(frame, columns=columns, show="headings", height=18)
+        for col, text, width in [("group", "Gruppo", 220), ("sent", "Inviati", 80), ("failed", "Falliti", 80),
+                                 ("bytes", "KB inviati", 100), ("latency", "Latenza media (ms)", 140)]:
+            self.stats_tree.heading(col, text=text)
+            self.stats_tree.column(col, width=width, anchor="w" if col == "group" else "e")
+        self.stats_tree.pack(fill="both", expand=True, pady=5)
+
+        self.stats_total_label = ttk.Label(frame, text="", font=("Frutiger", 10, "bold"))
+        self.stats_total_label.pack(anchor="w")
+
+        self.refresh_stats()
+
+    def refresh_stats(self, quiet=False):
+        """Ricalcola la tabella delle statistiche dai bucket giornalieri."""
+        start, end = self.stats_from_entry.get().strip(), self.stats_to_entry.get().strip()
+        try:
+            datetime.strptime(start, '%Y-%m-%d')
+            datetime.strptime(end, '%Y-%m-%d')
+        except ValueError:
+            if not quiet:
+                messagebox.showwarning("Statistiche", "Le date devono essere nel formato AAAA-MM-GG.")
+            return
+        group_by = {"Chat": "chat", "Categoria": "category", "Giorno": "day"}[self.stats_group_combo.get()]
+        names = {str(chat_id): name for name, chat_id in self.config.get("CHAT_LIST", {}).items()}
+        totals = self.stats.rollup(start, end, group_by, names)
+
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        order = sorted(totals) if group_by == "day" else sorted(totals, key=lambda g: -totals[g][0])
+        for group in order:
+            sent, nbytes, failed, latency, samples = totals[group]
+            self.stats_tree.insert("", "end", values=(group, sent, failed, f"{nbytes / 1024:.1f}",
+                                                      f"{latency / samples:.0f}" if samples else "-"))
+        sent_total = sum(t[0] for t in totals.values())
+        failed_total = sum(t[2] for t in totals.values())
+        self.stats_total_label.config(text=f"Totale: {sent_total} inviati, {failed_total} falliti")
+
     def create_tab_info(self):
         self.tab_info = ttk.Frame(self.notebook)
         self.notebook.add(self.tab_info, text="Info")
@@ -631,21 +2620,29 @@ class EBGUI:
         drafts = load_json(DRAFT_FILE, [])
         if isinstance(drafts, list):
             for i, d in enumerate(drafts):
-                self.draft_listbox.insert("end", f"{i+1} - {d.get('title', 'Senza titolo')}")
+                n_revisions = len(d.get("revisions", []))
+                suffix = f" ({n_revisions} rev.)" if n_revisions else ""
+                self.draft_listbox.insert("end", f"{i+1} - {d.get('title', 'Senza titolo')}{suffix}")
 
     def delete_selected_draft(self):
         sel = self.draft_listbox.curselection()
         if not sel: return
         idx = sel[0]
-        drafts = load_json(DRAFT_FILE, [])
-        if isinstance(drafts, list) and len(drafts) > idx:
-            drafts.pop(idx)
-            save_json(DRAFT_FILE, drafts)
+        deleted = []
+
+        def delete(drafts):
+            if isinstance(drafts, list) and len(drafts) > idx:
+                deleted.append(drafts.pop(idx))
+
+        update_json(DRAFT_FILE, [], delete)
+        if deleted:
             self.refresh_draft_list()
+            self.loop.create_task(self.collect_attachments())
             messagebox.showinfo("Bozza", "Bozza eliminata correttamente!")
 
-    def save_draft(self):
-        draft = {
+    def get_form_data(self):
+        """Contenuto attuale del modulo Messaggi, nel formato delle bozze."""
+        return {
             "title": self.title_entry.get(),
             "body": self.body_text.get("1.0", "end-1c"),
             "signature": self.other_signature_entry.get() if self.signature_combo.get() == "Altro" else self.signature_combo.get(),
@@ -653,33 +2650,204 @@ class EBGUI:
             "chat": self.chat_combo.get(),
             # Salva info allegati
             "attachment_path": self.current_attachment_path,
-            "attachment_type": self.current_attachment_type
+            "attachment_type": self.current_attachment_type,
+            "attachment_hash": self.current_attachment_hash
         }
-        drafts = load_json(DRAFT_FILE, [])
-        if not isinstance(drafts, list):
-            drafts = [drafts] if drafts else []
-        drafts.append(draft)
-        save_json(DRAFT_FILE, drafts)
+
+    def save_draft(self, as_new=False):
+        """
+        Salva il modulo come bozza. Se il modulo viene da una bozza esistente,
+        la aggiorna aggiungendo una revisione; altrimenti ne crea una nuova.
+        """
+        fields = self.get_form_data()
+        outcome = []
+
+        def save(drafts):
+            if not isinstance(drafts, list):
+                drafts = [drafts] if drafts else []
+            if not as_new and self.current_draft_id:
+                for d in drafts:
+                    if d.get("id") == self.current_draft_id:
+                        outcome.append("updated" if add_draft_revision(d, fields) else "unchanged")
+                        return drafts
+            draft = dict(fields, id=uuid.uuid4().hex[:12], updated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self.current_draft_id = draft["id"]
+            drafts.append(draft)
+            outcome.append("created")
+            return drafts
+
+        update_json(DRAFT_FILE, [], save)
         self.refresh_draft_list()
-        messagebox.showinfo("Bozza", "Bozza salvata correttamente!")
+        self.schedule_autosave()
+        if outcome == ["unchanged"]:
+            messagebox.showinfo("Bozza", "Nessuna modifica rispetto alla bozza salvata.")
+        else:
+            messagebox.showinfo("Bozza", "Bozza salvata correttamente!")
 
     def load_draft(self):
+        # La copia di lavoro salvata automaticamente ha la precedenza sull'ultima bozza
+        working_copy = load_json(AUTOSAVE_FILE, {})
+        if isinstance(working_copy, dict) and (working_copy.get("title") or working_copy.get("body")):
+            self.load_message_data(working_copy)
+            self.autosave_hash = form_hash(working_copy)
+            return
         drafts = load_json(DRAFT_FILE, [])
         if isinstance(drafts, list) and drafts:
             d = drafts[-1]
             self.load_message_data(d)
+
+    def on_body_modified(self, event=None):
+        # <<Modified>> scatta una sola volta finché il flag non viene azzerato
+        if self.body_text.edit_modified():
+            self.body_text.edit_modified(False)
+            self.schedule_autosave()
+
+    def schedule_autosave(self, event=None):
+        """Riprogramma il salvataggio automatico: parte solo dopo AUTOSAVE_DELAY_MS di inattività."""
+        if self.autosave_job is not None:
+            self.root.after_cancel(self.autosave_job)
+        self.autosave_job = self.root.after(AUTOSAVE_DELAY_MS, self.autosave)
+
+    def autosave(self):
+        """Salva la copia di lavoro in un thread, solo se il contenuto è cambiato."""
+        self.autosave_job = None
+        data = dict(self.get_form_data(), id=self.current_draft_id)
+        digest = form_hash(data)
+        if digest == self.autosave_hash:
+            return
+        self.autosave_hash = digest
+        self.loop.run_in_executor(None, save_json, AUTOSAVE_FILE, data)
         
-    def load_selected_draft(self):
+    def get_selected_draft(self):
+        """Bozza selezionata nella lista, con un id assegnato (le bozze vecchie non lo hanno)."""
         sel = self.draft_listbox.curselection()
-        if not sel: return
+        if not sel: return None
         idx = sel[0]
+        selected = []
+
+        def ensure_id(drafts):
+            if isinstance(drafts, list) and len(drafts) > idx:
+                drafts[idx].setdefault("id", uuid.uuid4().hex[:12])
+                selected.append(drafts[idx])
+
         drafts = load_json(DRAFT_FILE, [])
-        if isinstance(drafts, list) and len(drafts) > idx:
-            d = drafts[idx]
+        if isinstance(drafts, list) and len(drafts) > idx and "id" in drafts[idx]:
+            return drafts[idx]
+        update_json(DRAFT_FILE, [], ensure_id)
+        return selected[0] if selected else None
+
+    def load_selected_draft(self):
+        d = self.get_selected_draft()
+        if d:
             self.load_message_data(d)
             self.notebook.select(self.tab_messages) # Switch to messages tab
 
+    def show_draft_grid(self, columns=4):
+        """
+        Bozze come griglia di anteprime. Le miniature arrivano in background,
+        poche alla volta, così la finestra resta fluida anche con centinaia di bozze.
+        """
+        drafts = load_json(DRAFT_FILE, [])
+        if not isinstance(drafts, list):
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Bozze - Griglia")
+        win.geometry("620x500")
+
+        canvas = tk.Canvas(win, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(win, orient="vertical", command=canvas.yview)
+        grid = ttk.Frame(canvas, padding=5)
+        grid.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=grid, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        win.bind("<MouseWheel>", lambda e: canvas.yview_scroll(int(-e.delta / 120), "units"))
+
+        def open_draft(index):
+            self.draft_listbox.selection_clear(0, "end")
+            self.draft_listbox.selection_set(index)
+            win.destroy()
+            self.load_selected_draft()
+
+        semaphore = asyncio.Semaphore(THUMBNAIL_WORKERS)
+
+        async def fill(label, path, digest):
+            async with semaphore:
+                if not win.winfo_exists():
+                    return
+                image = await self.load_thumbnail(path, digest)
+            if image and label.winfo_exists():
+                label.config(image=image, text="")
+
+        for i, d in enumerate(drafts):
+            tile = ttk.Frame(grid, padding=5, relief="groove")
+            tile.grid(row=i // columns, column=i % columns, padx=4, pady=4, sticky="n")
+            thumb = ttk.Label(tile, text=d.get("attachment_type") or "—", width=12, anchor="center")
+            thumb.pack()
+            title = ttk.Label(tile, text=f"{i+1} - {d.get('title', 'Senza titolo')}"[:24], font=("Frutiger", 9))
+            title.pack()
+            for widget in (tile, thumb, title):
+                widget.bind("<Double-Button-1>", lambda e, i=i: open_draft(i))
+            digest = d.get("attachment_hash")
+            path = self.attachments.path(digest) if digest else None
+            if path:
+                self.loop.create_task(fill(thumb, path, digest))
+
+    def show_draft_revisions(self):
+        """Finestra con le revisioni della bozza selezionata e il ripristino con un clic."""
+        draft = self.get_selected_draft()
+        if not draft:
+            return
+        versions = draft_revisions(draft)
+
+        win = tk.Toplevel(self.root)
+        win.title(f"Revisioni - {draft.get('title', 'Senza titolo')}")
+        win.geometry("600x450")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+
+        listbox = tk.Listbox(frame, height=8)
+        listbox.pack(fill="x")
+        for i, (saved, _) in enumerate(versions):
+            label = "Attuale" if i == 0 else f"Revisione {i}"
+            listbox.insert("end", f"{label} - {saved or 'data sconosciuta'}")
+
+        preview = tk.Text(frame, height=14, wrap="word", font=("Frutiger", 10))
+        preview.pack(fill="both", expand=True, pady=5)
+
+        def show(event=None):
+            sel = listbox.curselection()
+            if not sel: return
+            fields = versions[sel[0]][1]
+            preview.config(state="normal")
+            preview.delete("1.0", "end")
+            preview.insert("1.0", f"{fields.get('title') or ''}\n\n{fields.get('body') or ''}")
+            preview.config(state="disabled")
+
+        def revert():
+            sel = listbox.curselection()
+            if not sel or sel[0] == 0: return
+            fields = versions[sel[0]][1]
+
+            def apply(drafts):
+                for d in drafts if isinstance(drafts, list) else []:
+                    if d.get("id") == draft["id"]:
+                        add_draft_revision(d, fields) # Il ripristino è a sua volta una revisione
+
+            update_json(DRAFT_FILE, [], apply)
+            self.refresh_draft_list()
+            self.load_message_data(dict(fields, id=draft["id"]))
+            self.notebook.select(self.tab_messages)
+            win.destroy()
+
+        listbox.bind("<<ListboxSelect>>", show)
+        ttk.Button(frame, text="Ripristina Revisione", command=revert).pack(pady=5)
+        listbox.selection_set(0)
+        show()
+
     def load_message_data(self, d):
+        self.current_draft_id = d.get("id")
         self.title_entry.delete(0, "end")
         self.title_entry.insert(0, d.get("title", ""))
         self.body_text.delete("1.0", "end")
@@ -694,7 +2862,7 @@ class EBGUI:
             self.category_combo.set("Nessuna")
         
         chat = d.get("chat", "")
-        if chat in self.config.get("CHAT_LIST", {}):
+        if chat in self.config.get("CHAT_LIST", {}) or chat in self.chat_combo['values']:
             self.chat_combo.set(chat)
         
         sig = d.get("signature", "")
@@ -708,51 +2876,78 @@ class EBGUI:
             self.other_signature_entry.delete(0, "end")
             self.other_signature_entry.insert(0, sig)
             
-        # Carica info allegati
+        # Carica info allegati: prima dall'archivio allegati, poi dal percorso originale
         path = d.get("attachment_path")
         type = d.get("attachment_type")
+        digest = d.get("attachment_hash")
+        stored = self.attachments.path(digest) if digest else None
         
         # Pulisci sempre prima
         self.remove_attachment() 
         
-        if path and type and os.path.exists(path):
-            self.current_attachment_path = path
-            self.current_attachment_type = type
-            filename = os.path.basename(path)
-            self.attachment_label.config(text=f"{filename} ({type})")
-            self.remove_attachment_btn.pack(side="top", anchor="w", fill="x", pady=2)
+        if type and stored:
+            self.set_attachment(stored, type, f"{os.path.basename(stored)} ({type})", digest)
+        elif path and type and os.path.exists(path):
+            self.set_attachment(path, type, f"{os.path.basename(path)} ({type})")
         else:
             self.remove_attachment() # Assicura che sia pulito se il file non esiste più
 
     def refresh_history(self):
         self.log_listbox.delete(0, "end")
+        # I segmenti archiviati si aprono solo su richiesta (Carica Archivio)
+        self.history_index = load_json(LOG_INDEX_FILE, {"segments": [], "summaries": {}})
+        self.history_segments_loaded = 0
+        self.update_archive_label()
         if os.path.exists(LOG_FILE):
             try:
                 with open(LOG_FILE, "r", encoding="utf-8") as f:
-                    # Legge le linee e le inverte per mostrare le più recenti in alto
-                    lines = f.read().strip().split("\n\n")
-                
-                for l in reversed(lines):
-                    l_stripped = l.strip()
-                    if l_stripped:
-                        if " -> " in l_stripped:
-                            parts = l_stripped.split(" -> ", 1)
-                            timestamp = parts[0].strip()
-                            message_preview = parts[1].strip().replace('\n', ' ')
-                            if len(message_preview) > 80:
-                                message_preview = message_preview[:80] + "..."
-                            self.log_listbox.insert("end", f"{timestamp} -> {message_preview}")
-                        else:
-                            self.log_listbox.insert("end", l_stripped)
+                    # Le righe arrivano già invertite, le più recenti in alto
+                    entries = parse_history(f.read())
+                if entries:
+                    self.log_listbox.insert("end", *entries)
             except Exception as e:
                 # print(f"Errore lettura log: {e}")
                 pass
 
+    def update_archive_label(self):
+        segments = self.history_index.get("segments", [])
+        remaining = len(segments) - self.history_segments_loaded
+        archived = sum(s.get("entries", 0) for s in segments[:remaining])
+        if remaining > 0:
+            self.archive_label.config(text=f"{archived} messaggi più vecchi in archivio ({remaining} file)")
+            self.load_archive_btn.config(state="normal")
+        else:
+            self.archive_label.config(text="")
+            self.load_archive_btn.config(state="disabled")
+
+    def load_older_history(self):
+        """Aggiunge in fondo alla cronologia il segmento archiviato successivo (dal più recente)."""
+        segments = self.history_index.get("segments", [])
+        remaining = len(segments) - self.history_segments_loaded
+        if remaining <= 0:
+            return
+        try:
+            entries = parse_history(read_log_segment(segments[remaining - 1]["file"]))
+            if entries:
+                self.log_listbox.insert("end", *entries)
+        except (OSError, EOFError):
+            messagebox.showerror("Errore", "Impossibile leggere il file di archivio.")
+        self.history_segments_loaded += 1
+        if remaining == 1:
+            # Dopo l'ultimo segmento, i riepiloghi delle voci compattate
+            summaries = self.history_index.get("summaries", {})
+            for day in sorted(summaries, reverse=True):
+                self.log_listbox.insert("end", f"{day} -> [Riepilogo] {summaries[day]} messaggi inviati")
+        self.update_archive_label()
+
     def clear_history(self):
         if messagebox.askyesno("Pulisci Cronologia", "Sei sicuro di voler eliminare permanentemente tutta la cronologia dei messaggi?"):
             try:
-                if os.path.exists(LOG_FILE):
-                    os.remove(LOG_FILE)
+                with file_lock(LOG_FILE):
+                    if os.path.exists(LOG_FILE):
+                        os.remove(LOG_FILE)
+                    shutil.rmtree(LOG_ARCHIVE_DIR, ignore_errors=True)
+                record_file_stamp(LOG_FILE)
                 self.refresh_history() # Aggiorna la listbox (ora vuota)
                 messagebox.showinfo("Cronologia", "Cronologia pulita con successo.")
             except OSError as e:
@@ -877,7 +3072,18 @@ class EBGUI:
                 self.category_listbox.delete(sel[0])
 
     def save_settings(self):
-        self.config["BOT_TOKEN"] = self.token_entry.get().strip()
+        # Modifiche esterne non ancora rilevate: uniscile prima di scrivere
+        changed = [f for f in (CONFIG_FILE, SETTINGS_FILE) if changed_on_disk(f)]
+        if changed:
+            self.merge_external_changes(changed)
+        if self.settings_conflict:
+            if not messagebox.askyesno("Conflitto Impostazioni", "Le impostazioni sono state modificate da un altro programma mentre le stavi modificando.\n\nSovrascriverle con i valori inseriti qui?\n(No = scarta le tue modifiche e mostra quelle esterne)"):
+                self.settings_conflict = False
+                self.refresh_settings_tab()
+                return
+            self.settings_conflict = False
+
+        old_config, old_settings = copy.deepcopy(self.config), copy.deepcopy(self.settings)
         chat_dict = {}
         for i in range(self.chat_listbox.size()):
             try:
@@ -887,40 +3093,148 @@ class EBGUI:
                 messagebox.showwarning("Errore", f"Il formato della chat '{self.chat_listbox.get(i)}' non è valido. Deve essere 'Nome -> ID'.")
                 return
 
-        self.config["CHAT_LIST"] = chat_dict
-        save_json(CONFIG_FILE, self.config)
+        config_edits = {
+            "BOT_TOKEN": self.token_entry.get().strip(),
+            "BOT_TOKENS": [t.strip() for t in self.extra_tokens_entry.get().split(",") if t.strip()],
+            "CHAT_LIST": chat_dict
+        }
+        settings_edits = {
+            "SIGNATURES": [self.sign_listbox.get(i) for i in range(self.sign_listbox.size())],
+            "EMOJIS": [self.emoji_listbox.get(i) for i in range(self.emoji_listbox.size())],
+            "CATEGORIES": [self.category_listbox.get(i) for i in range(self.category_listbox.size())],
+            "UPDATE_SERVER": self.update_server_entry.get().strip(),
+            "SERVICE_ID": self.service_id_entry.get().strip(),
+            "BOT_API_BASE_URL": self.bot_api_url_entry.get().strip(),
+            "BOT_API_FILE_URL": self.bot_api_file_url_entry.get().strip(),
+            "BOT_API_LOCAL_MODE": self.bot_api_local_var.get(),
+            "HUB_CHAT_ID": self.hub_chat_entry.get().strip(),
+            "COMPRESS_ATTACHMENTS": self.compress_var.get(),
+            "FANOUT_MODE": FANOUT_MODES[self.fanout_mode_combo.get()]
+        }
+        try:
+            settings_edits["COMPRESS_MIN_SAVING"] = min(max(int(self.compress_saving_spin.get()), 1), 99) / 100
+        except ValueError:
+            pass # Valore non numerico: resta quello precedente
+        for key, spin, low, high in [("BOT_CONCURRENCY", self.bot_concurrency_spin, 1, 64),
+                                     ("BOT_RATE_LIMIT", self.bot_rate_spin, 1, 30)]:
+            try:
+                settings_edits[key] = min(max(int(spin.get()), low), high)
+            except ValueError:
+                pass
 
-        sigs = [self.sign_listbox.get(i) for i in range(self.sign_listbox.size())]
-        self.settings["SIGNATURES"] = sigs
+        # Sul disco cambiano solo le chiavi della tab: il resto (CHAT_BOTS, preferenze) resta com'è
+        self.config.update(config_edits)
+        self.settings.update(settings_edits)
+        update_json(CONFIG_FILE, copy.deepcopy(self.config), lambda config: config.update(config_edits))
+        update_json(SETTINGS_FILE, copy.deepcopy(self.settings), lambda settings: settings.update(settings_edits))
 
-        emojis = [self.emoji_listbox.get(i) for i in range(self.emoji_listbox.size())]
-        self.settings["EMOJIS"] = emojis
-        
-        cats = [self.category_listbox.get(i) for i in range(self.category_listbox.size())]
-        self.settings["CATEGORIES"] = cats
+        # La tab Impostazioni mostra già i valori salvati: aggiorna solo il resto
+        self.apply_data_changes(old_config, old_settings, refresh_settings_tab=False)
+        messagebox.showinfo("Impostazioni", "Salvate correttamente!")
 
-        self.settings["UPDATE_SERVER"] = self.update_server_entry.get().strip()
-        self.settings["SERVICE_ID"] = self.service_id_entry.get().strip()
-        save_json(SETTINGS_FILE, self.settings)
+    def poll_data_files(self):
+        """Controlla periodicamente i file dati e unisce le modifiche esterne."""
+        try:
+            changed = self.data_watcher.poll()
+            if changed:
+                self.merge_external_changes(changed)
+        except Exception as e:
+            # print(f"Errore controllo file: {e}")
+            pass
+        self.root.after(WATCH_INTERVAL_MS, self.poll_data_files)
+
+    def merge_external_changes(self, changed):
+        """
+        Porta nello stato in memoria le modifiche fatte da altri ai file dati e
+        aggiorna solo le viste interessate. Se nella tab Impostazioni ci sono
+        modifiche non salvate, non vengono toccate: il conflitto viene chiesto
+        al salvataggio.
+        """
+        changed = {os.path.abspath(f) for f in changed}
+        if changed & {os.path.abspath(CONFIG_FILE), os.path.abspath(SETTINGS_FILE)}:
+            dirty = self.settings_tab_dirty()
+            old_config, old_settings = self.config, self.settings
+            if os.path.abspath(CONFIG_FILE) in changed:
+                self.config = load_config()
+            if os.path.abspath(SETTINGS_FILE) in changed:
+                self.settings = load_settings()
+            self.settings_conflict = self.settings_conflict or dirty
+            self.apply_data_changes(old_config, old_settings, refresh_settings_tab=not dirty)
+        if os.path.abspath(DRAFT_FILE) in changed:
+            self.refresh_draft_list()
+        if os.path.abspath(LOG_FILE) in changed:
+            self.refresh_history()
+
+    def settings_tab_dirty(self):
+        """True se i campi della tab Impostazioni differiscono dai valori in memoria."""
+        current = (
+            self.token_entry.get().strip(),
+            [t.strip() for t in self.extra_tokens_entry.get().split(",") if t.strip()],
+            list(self.chat_listbox.get(0, "end")),
+            list(self.sign_listbox.get(0, "end")),
+            list(self.emoji_listbox.get(0, "end")),
+            list(self.category_listbox.get(0, "end")),
+            self.update_server_entry.get().strip(),
+            self.service_id_entry.get().strip(),
+            self.bot_api_url_entry.get().strip(),
+            self.bot_api_file_url_entry.get().strip(),
+            self.bot_api_local_var.get(),
+            self.hub_chat_entry.get().strip(),
+            self.fanout_mode_combo.get(),
+            self.compress_var.get(),
+            self.compress_saving_spin.get(),
+            self.bot_concurrency_spin.get(),
+            self.bot_rate_spin.get()
+        )
+        saved = (
+            self.config.get("BOT_TOKEN", ""),
+            list(self.config.get("BOT_TOKENS", [])),
+            [f"{name} -> {chat_id}" for name, chat_id in self.config.get("CHAT_LIST", {}).items()],
+            list(self.settings.get("SIGNATURES", [])),
+            list(self.settings.get("EMOJIS", [])),
+            list(self.settings.get("CATEGORIES", [])),
+            self.settings.get("UPDATE_SERVER", ""),
+            self.settings.get("SERVICE_ID", ""),
+            self.settings.get("BOT_API_BASE_URL", ""),
+            self.settings.get("BOT_API_FILE_URL", ""),
+            self.settings.get("BOT_API_LOCAL_MODE", False),
+            self.settings.get("HUB_CHAT_ID", ""),
+            self.fanout_mode_label(),
+            self.settings.get("COMPRESS_ATTACHMENTS", False),
+            str(int(self.settings.get("COMPRESS_MIN_SAVING", 0.2) * 100)),
+            str(self.settings.get("BOT_CONCURRENCY", 8)),
+            str(self.settings.get("BOT_RATE_LIMIT", 25))
+        )
+        return current != saved
+
+    def reload_data(self):
+        """
+        Ricarica config, impostazioni, bozze e cronologia dal disco nell'app
+        in esecuzione (es. dopo il ripristino di un backup), senza riavvio.
+        """
+        old_config, old_settings = self.config, self.settings
+        self.config, self.settings = load_config(), load_settings()
+        self.delivery_ledger = DeliveryLedger(DELIVERY_LEDGER_FILE)
+        self.apply_data_changes(old_config, old_settings)
+        self.refresh_draft_list()
+        self.refresh_history()
+
+    def apply_data_changes(self, old_config, old_settings, refresh_settings_tab=True):
+        """Aggiorna Bot e viste che dipendono da config/impostazioni cambiate."""
+        # Il Bot viene ricreato solo se token o endpoint sono cambiati
+        if bot_signature(old_config, old_settings) != bot_signature(self.config, self.settings):
+            self.init_bot()
+        elif self.bot_pool:
+            self.bot_pool.chat_bots = dict(self.config.get("CHAT_BOTS", {}))
+
+        api_keys = ["API_ENABLED", "API_HOST", "API_PORT", "API_SECRET"]
+        if [old_settings.get(k) for k in api_keys] != [self.settings.get(k) for k in api_keys]:
+            self.loop.create_task(self.restart_api_server())
 
-        self.init_bot()
-        
         # Aggiorna GUI
-        self.update_signature_combobox()
-        self.update_emoji_buttons() # Aggiunto aggiornamento emoji
-        self.chat_combo['values'] = list(self.config.get("CHAT_LIST",{}).keys())
-        if self.chat_combo['values']:
-            self.chat_combo.current(0)
-            
-        # Aggiornamento Categorie Combobox
-        self.category_options = self.settings.get("CATEGORIES", [])
-        
-        # --- CORREZIONE: 'combobox_values' definito qui ---
-        combobox_values = self.category_options + ["Nessuna"]
-        self.category_combo['values'] = combobox_values
-        if combobox_values:
-            self.category_combo.set("Nessuna") # Imposta "Nessuna" come predefinito
-        # --- FINE CORREZIONE ---
+        self.refresh_compose_options()
+        if refresh_settings_tab:
+            self.refresh_settings_tab()
             
         # --- MODIFICA: Aggiorna dinamicamente le tab Info e Novità ---
         try:
@@ -930,54 +3244,124 @@ class EBGUI:
             self.info_update_server_label.config(text=f"Update Server: {new_server}")
             self.info_service_id_label.config(text=f"Service ID: {new_service}")
             
-            # Aggiorna tab Novità
-            self.refresh_tab_whats_new()
+            # Aggiorna tab Novità solo se la sorgente è cambiata (evita un download inutile)
+            if (old_settings.get("UPDATE_SERVER"), old_settings.get("SERVICE_ID")) != (new_server, new_service):
+                self.refresh_tab_whats_new()
         except Exception as e:
             # print(f"Erroro nell'aggiornamento dinamico delle tab: {e}")
             pass # Non critico se fallisce
         # --- FINE MODIFICA ---
-            
-        messagebox.showinfo("Impostazioni", "Salvate correttamente!")
 
-    # Metodi Backup e Ripristino
-    def create_backup(self):
-        """Salva tutte le configurazioni, bozze e cronologia in un unico file JSON."""
-        try:
-            config_data = load_json(CONFIG_FILE, {})
-            settings_data = load_json(SETTINGS_FILE, {})
-            draft_data = load_json(DRAFT_FILE, [])
-            history_data = ""
-            if os.path.exists(LOG_FILE):
-                with open(LOG_FILE, "r", encoding="utf-8") as f:
-                    history_data = f.read()
-
-            backup_data = {
-                "backup_version": 1,
-                "config": config_data,
-                "settings": settings_data,
-                "drafts": draft_data,
-                "history_log": history_data
-            }
-            
-            filepath = filedialog.asksaveasfilename(
-                defaultextension=".json",
-                filetypes=[("Backup JSON EasyBroadcast", "*.json"), ("Tutti i file", "*.*")],
-                title="Salva Backup"
-            )
+    def refresh_compose_options(self):
+        """Aggiorna firme, emoji, chat e categorie della tab Messaggi, mantenendo le scelte ancora valide."""
+        signature = self.signature_combo.get()
+        self.update_signature_combobox()
+        if signature in self.signature_combo['values']:
+            self.signature_combo.set(signature)
+        self.update_emoji_buttons() # Aggiunto aggiornamento emoji
+
+        chat = self.chat_combo.get()
+        self.chat_combo['values'] = self.get_chat_combo_values()
+        if chat in self.chat_combo['values']:
+            self.chat_combo.set(chat)
+        elif self.chat_combo['values']:
+            self.chat_combo.current(0)
+        else:
+            self.chat_combo.set("")
             
-            if not filepath:
-                return
+        # Aggiornamento Categorie Combobox
+        self.category_options = self.settings.get("CATEGORIES", [])
+        category = self.category_combo.get()
+        combobox_values = self.category_options + ["Nessuna"]
+        self.category_combo['values'] = combobox_values
+        self.category_combo.set(category if category in combobox_values else "Nessuna")
+
+    def refresh_settings_tab(self):
+        """Riempie i campi della tab Impostazioni con i valori correnti."""
+        for entry, value in [
+            (self.token_entry, self.config.get("BOT_TOKEN", "")),
+            (self.extra_tokens_entry, ", ".join(self.config.get("BOT_TOKENS", []))),
+            (self.update_server_entry, self.settings.get("UPDATE_SERVER", "")),
+            (self.service_id_entry, self.settings.get("SERVICE_ID", "")),
+            (self.bot_api_url_entry, self.settings.get("BOT_API_BASE_URL", "")),
+            (self.bot_api_file_url_entry, self.settings.get("BOT_API_FILE_URL", "")),
+            (self.hub_chat_entry, self.settings.get("HUB_CHAT_ID", ""))
+        ]:
+            entry.delete(0, "end")
+            entry.insert(0, value)
+
+        for listbox, values in [
+            (self.chat_listbox, [f"{name} -> {chat_id}" for name, chat_id in self.config.get("CHAT_LIST", {}).items()]),
+            (self.sign_listbox, self.settings.get("SIGNATURES", [])),
+            (self.emoji_listbox, self.settings.get("EMOJIS", [])),
+            (self.category_listbox, self.settings.get("CATEGORIES", []))
+        ]:
+            listbox.delete(0, "end")
+            if values:
+                listbox.insert("end", *values)
+        self.checkupdates_var.set(self.settings.get("checkUpdatesOnStart", True))
+        self.bot_api_local_var.set(self.settings.get("BOT_API_LOCAL_MODE", False))
+        self.update_local_mode_state()
+        self.fanout_mode_combo.set(self.fanout_mode_label())
+        self.compress_var.set(self.settings.get("COMPRESS_ATTACHMENTS", False))
+        self.compress_saving_spin.set(int(self.settings.get("COMPRESS_MIN_SAVING", 0.2) * 100))
+        self.bot_concurrency_spin.set(self.settings.get("BOT_CONCURRENCY", 8))
+        self.bot_rate_spin.set(self.settings.get("BOT_RATE_LIMIT", 25))
+
+    def update_local_mode_state(self):
+        """La modalità locale ha senso solo con un server Bot API indicato."""
+        self.bot_api_local_cb.config(state="normal" if self.bot_api_url_entry.get().strip() else "disabled")
+
+    def fanout_mode_label(self):
+        mode = self.settings.get("FANOUT_MODE", "send")
+        return next((label for label, value in FANOUT_MODES.items() if value == mode), "Invio diretto")
 
-            save_json(filepath, backup_data)
-            messagebox.showinfo("Backup", f"Backup creato con successo in:\n{filepath}")
+    # Metodi Backup e Ripristino
+    def create_backup(self, incremental=False):
+        """
+        Salva tutta la cartella eb_data in un archivio .tar.gz compresso.
+        Se incrementale, salva solo i file cambiati dall'ultimo backup.
+        """
+        base = None
+        if incremental:
+            state = load_json(BACKUP_STATE_FILE, {})
+            if not state.get("files") or not os.path.exists(state.get("path", "")):
+                messagebox.showwarning("Backup", "Nessun backup precedente trovato.\nVerrà creato un backup completo.")
+            else:
+                base = state
+
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".tar.gz",
+            initialdir=os.path.dirname(base["path"]) if base else None,
+            initialfile=f"easybroadcast_{'incr' if base else 'full'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar.gz",
+            filetypes=[("Backup EasyBroadcast", "*.tar.gz"), ("Tutti i file", "*.*")],
+            title="Salva Backup"
+        )
+        if not filepath:
+            return
+        if base and os.path.dirname(os.path.abspath(filepath)) != os.path.dirname(os.path.abspath(base["path"])):
+            messagebox.showerror("Backup", "Il backup incrementale deve essere salvato nella stessa cartella del backup precedente.")
+            return
+        self.loop.create_task(self._create_backup_async(filepath, base))
 
+    async def _create_backup_async(self, filepath, base):
+        try:
+            self.status_label.config(text="Creazione backup in corso...", foreground="blue")
+            # Compressione e hash in un thread: la GUI resta reattiva
+            manifest = await self.loop.run_in_executor(None, write_backup_archive, filepath, base)
+            manifest["path"] = os.path.abspath(filepath)
+            save_json(BACKUP_STATE_FILE, manifest)
+            changed = sum(1 for e in manifest["files"].values() if e["in"] == manifest["archive"])
+            self.status_label.config(text="")
+            messagebox.showinfo("Backup", f"Backup creato con successo in:\n{filepath}\n\nFile salvati: {changed} su {len(manifest['files'])}")
         except Exception as e:
+            self.status_label.config(text="Errore backup.", foreground="red")
             messagebox.showerror("Backup", f"Errore during la creazione del backup.") # Rimossi: {e}
 
     def load_backup(self):
         """Carica un file di backup e ripristina tutte le impostazioni."""
         filepath = filedialog.askopenfilename(
-            filetypes=[("Backup JSON EasyBroadcast", "*.json"), ("Tutti i file", "*.*")],
+            filetypes=[("Backup EasyBroadcast", "*.tar.gz"), ("Backup JSON (vecchio formato)", "*.json"), ("Tutti i file", "*.*")],
             title="Carica Backup"
         )
         
@@ -986,7 +3370,28 @@ class EBGUI:
 
         if not messagebox.askyesno("Carica Backup", "ATTENZIONE!\n\nQuesto sovrascriverà TUTTE le impostazioni, bozze e cronologia correnti.\nL'operazione non è reversibile.\n\nContinuare?"):
             return
-            
+
+        if filepath.endswith(".json"):
+            self.load_legacy_backup(filepath)
+        else:
+            self.loop.create_task(self._load_backup_async(filepath))
+
+    async def _load_backup_async(self, filepath):
+        try:
+            self.status_label.config(text="Verifica e ripristino del backup...", foreground="blue")
+            await self.loop.run_in_executor(None, restore_backup_archive, filepath)
+            self.reload_data()
+            self.status_label.config(text="")
+            messagebox.showinfo("Backup", "Backup ripristinato con successo!")
+        except FileNotFoundError:
+            self.status_label.config(text="Errore backup.", foreground="red")
+            messagebox.showerror("Backup", "Backup incrementale incompleto: i backup precedenti devono trovarsi nella stessa cartella.")
+        except Exception as e:
+            self.status_label.config(text="Errore backup.", foreground="red")
+            messagebox.showerror("Backup", f"Errore during il caricamento del backup.\nIl file potrebbe essere corrotto; nessun dato è stato modificato.") # Rimossi: {e}
+
+    def load_legacy_backup(self, filepath):
+        """Ripristina un backup JSON creato dalle versioni precedenti."""
         try:
             backup_data = load_json(filepath, {})
             
@@ -1000,11 +3405,11 @@ class EBGUI:
             save_json(SETTINGS_FILE, backup_data["settings"])
             save_json(DRAFT_FILE, backup_data["drafts"])
             
-            with open(LOG_FILE, "w", encoding="utf-8") as f:
+            with file_lock(LOG_FILE), open(LOG_FILE, "w", encoding="utf-8") as f:
                 f.write(backup_data.get("history_log", "")) # .get per retrocompatibilità se log fosse assente
             
-            messagebox.showinfo("Backup", "Backup ripristinato con successo!\n\nL'applicazione verrà ora chiusa.\nSi prega di riavviarla per applicare le modifiche.")
-            self.root.quit()
+            self.reload_data()
+            messagebox.showinfo("Backup", "Backup ripristinato con successo!")
 
         except Exception as e:
             messagebox.showerror("Backup", f"Errore during il caricamento del backup.") # Rimossi: {e}
@@ -1140,7 +3545,8 @@ Esegue il download e il backup dello script.
         """Aggiorna la preferenza del controllo aggiornamenti all'avvio."""
         new_value = self.checkupdates_var.get()
         self.settings["checkUpdatesOnStart"] = new_value
-        save_json(SETTINGS_FILE, self.settings)
+        # Aggiorna solo questa chiave sul disco, senza riscrivere il resto
+        update_json(SETTINGS_FILE, {}, lambda settings: settings.update(checkUpdatesOnStart=new_value))
 
     # ---------- Message Sending Methods ----------
     
@@ -1148,12 +3554,7 @@ Esegue il download e il backup dello script.
     def attach_file(self):
         filepath = filedialog.askopenfilename(title="Seleziona un file")
         if filepath:
-            self.current_attachment_path = filepath
-            self.current_attachment_type = 'document'
-            filename = os.path.basename(filepath)
-            self.attachment_label.config(text=f"{filename} (File)")
-            # Mostra il bottone Rimuovi
-            self.remove_attachment_btn.pack(side="top", anchor="w", fill="x", pady=2)
+            self.set_attachment(filepath, 'document', f"{os.path.basename(filepath)} (File)")
 
     def attach_image(self):
         filepath = filedialog.askopenfilename(
@@ -1161,57 +3562,105 @@ Esegue il download e il backup dello script.
             filetypes=[("Immagini", "*.png *.jpg *.jpeg *.bmp *.gif"), ("Tutti i file", "*.*")]
         )
         if filepath:
-            self.current_attachment_path = filepath
-            self.current_attachment_type = 'photo'
-            filename = os.path.basename(filepath)
-            self.attachment_label.config(text=f"{filename} (Immagine)")
-            # Mostra il bottone Rimuovi
-            self.remove_attachment_btn.pack(side="top", anchor="w", fill="x", pady=2)
+            self.set_attachment(filepath, 'photo', f"{os.path.basename(filepath)} (Immagine)")
+
+    def set_attachment(self, path, type, label, digest=None):
+        """Imposta l'allegato del modulo; se non è ancora nell'archivio lo importa in background."""
+        self.current_attachment_path = path
+        self.current_attachment_type = type
+        self.current_attachment_hash = digest
+        self.attachment_label.config(text=label)
+        self.attachment_thumb.pack_forget() # L'anteprima del file precedente, se c'era
+        # Mostra il bottone Rimuovi
+        self.remove_attachment_btn.pack(side="top", anchor="w", fill="x", pady=2)
+        self.schedule_autosave()
+        if digest is None:
+            self.loop.create_task(self.ingest_attachment(path))
+        else:
+            self.loop.create_task(self.show_attachment_thumbnail(path, digest))
+
+    async def ingest_attachment(self, path):
+        try:
+            digest = await self.loop.run_in_executor(None, self.attachments.ingest, path)
+        except OSError:
+            return # Si continua con il percorso originale
+        if self.current_attachment_path != path:
+            return # L'allegato è cambiato nel frattempo
+        self.current_attachment_path = self.attachments.path(digest)
+        self.current_attachment_hash = digest
+        self.schedule_autosave()
+        await self.show_attachment_thumbnail(self.current_attachment_path, digest)
+
+    async def load_thumbnail(self, path, digest):
+        """PhotoImage della miniatura (generata in un thread la prima volta), o None."""
+        if digest not in self.thumbnail_images:
+            thumb = await self.loop.run_in_executor(None, make_thumbnail, path, digest)
+            if thumb is None:
+                return None
+            self.thumbnail_images[digest] = ImageTk.PhotoImage(file=thumb)
+        return self.thumbnail_images[digest]
+
+    async def show_attachment_thumbnail(self, path, digest):
+        image = await self.load_thumbnail(path, digest)
+        if image and self.current_attachment_hash == digest:
+            self.attachment_thumb.config(image=image)
+            self.attachment_thumb.pack(side="top", anchor="w", pady=2, after=self.attachment_label)
+
+    async def collect_attachments(self):
+        """Elimina dall'archivio gli allegati non più usati da bozze, rapporti o invii."""
+        in_flight = collections.Counter(self.inflight_attachments) # Copia: il thread non deve leggere quello vivo
+
+        def collect():
+            if self.attachments.gc(attachment_references(in_flight)):
+                prune_derived_files(self.attachments)
+        try:
+            await self.loop.run_in_executor(None, collect)
+        except OSError:
+            pass
 
     def remove_attachment(self):
         self.current_attachment_path = None
         self.current_attachment_type = None
+        self.current_attachment_hash = None
         self.attachment_label.config(text="Nessun allegato")
+        self.attachment_thumb.pack_forget()
         # Nascondi il bottone Rimuovi
         self.remove_attachment_btn.pack_forget()
+        self.schedule_autosave()
     
-    def get_message(self):
-        title = escape_markdown_v2(self.title_entry.get().strip())
-        body = escape_markdown_v2(self.body_text.get("1.0", "end-1c").strip())
-        
+    def get_chat_combo_values(self):
+        """Nomi delle chat, più l'opzione per inviare a tutte se ce n'è più d'una."""
+        names = list(self.config.get("CHAT_LIST", {}).keys())
+        if len(names) > 1:
+            names.append(ALL_CHATS_OPTION)
+        return names
+
+    def get_selected_chats(self):
+        """Ritorna le chat selezionate come lista di (nome, chat_id)."""
+        chat_list = self.config.get("CHAT_LIST", {})
+        chat_name = self.chat_combo.get()
+        if chat_name == ALL_CHATS_OPTION:
+            return [(name, chat_id) for name, chat_id in chat_list.items() if chat_id]
+        chat_id = chat_list.get(chat_name)
+        return [(chat_name, chat_id)] if chat_id else []
+
+    def get_signature(self):
+        """Ritorna la firma selezionata, vuota se 'Nessuna'."""
         sig_value = self.signature_combo.get()
-        sig = "" # Inizia vuota
         if sig_value == "Altro":
-            sig = escape_markdown_v2(self.other_signature_entry.get().strip())
-        elif sig_value != "Nessuna": # Aggiungi solo se non è "Nessuna"
-            sig = escape_markdown_v2(sig_value)
-        
-        category_full = self.category_combo.get()
-        category_emoji = ""
-        if category_full and category_full != "Nessuna" and ":" in category_full:
-            try:
-                category_emoji = category_full.split(":")[1].strip()
-            except IndexError:
-                category_emoji = "" # Gestisce il caso in cui c'è ":" ma nulla dopo
-        
-        # Aggiungi la firma solo se non è vuota
-        final_sig = f"\n\n_{sig}_" if sig else ""
-        
-        # Se c'è un allegato, il titolo va nel messaggio, il body nella didascalia (o viceversa, a seconda dell'uso)
-        # Per ora, gestiamo solo il testo
-        
-        # Testo formattato
-        formatted_text = f"{category_emoji} *{title}* {category_emoji}\n\n{body}{final_sig}"
-        
-        # Testo per la didascalia (se c'è allegato, il body diventa la didascalia)
-        caption_text = f"{category_emoji} *{title}* {category_emoji}\n\n{body}{final_sig}"
-        
-        # Se c'è un allegato, il "messaggio" è solo il testo della didascalia
-        if self.current_attachment_type:
-            return caption_text
-        else:
-            # Se non c'è allegato, il messaggio è il testo completo
-            return formatted_text
+            return self.other_signature_entry.get().strip()
+        if sig_value != "Nessuna": # Aggiungi solo se non è "Nessuna"
+            return sig_value
+        return ""
+
+    def get_message(self):
+        # Il testo è lo stesso sia come messaggio sia come didascalia dell'allegato
+        return format_message(
+            self.title_entry.get(),
+            self.body_text.get("1.0", "end-1c"),
+            self.get_signature(),
+            self.category_combo.get()
+        )
 
     def preview_message(self):
         msg = self.get_message()
@@ -1222,70 +3671,355 @@ Esegue il download e il backup dello script.
 
 
     def log_message(self, message):
-        try:
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -> {message}\n\n")
-            self.refresh_history()
-        except Exception as e:
-            # print(f"Errore scrittura log: {e}")
-            pass
+        """Accoda una voce della cronologia: viene scritta con le altre da flush_send_results."""
+        self.pending_log.append(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -> {message}\n\n")
+        self.schedule_results_flush()
+
+    def schedule_results_flush(self):
+        if not self.results_flush_scheduled:
+            self.results_flush_scheduled = True
+            self.root.after(RESULTS_FLUSH_MS, self.flush_send_results)
+
+    def flush_send_results(self):
+        """
+        Scrive insieme, nel thread di I/O, le voci di cronologia, le statistiche
+        e i rapporti accumulati dagli invii conclusi, poi aggiorna le viste una
+        volta sola: molti invii al secondo (API, importazioni) non bloccano la GUI.
+        """
+        self.results_flush_scheduled = False
+        log_text, self.pending_log = "".join(self.pending_log), []
+        stats, upload_rate = self.stats.take()
+        reports, self.pending_reports = self.pending_reports, []
+        settings = dict(self.settings)
+
+        def write():
+            if log_text:
+                # Un blocco = una sola write in append, sicura con più istanze
+                append_text(LOG_FILE, log_text)
+                rotate_log(settings)
+            self.stats.write(stats, upload_rate)
+            self.delivery_reports.add(*reports) # Una sola riscrittura dell'indice per blocco
+
+        def done(future):
+            if future.exception():
+                self.status_label.config(text=f"Errore di scrittura dei dati: {future.exception()}", foreground="red")
+            if log_text:
+                record_file_stamp(LOG_FILE)
+                self.refresh_history()
+            if stats:
+                self.refresh_stats(quiet=True)
+
+        future = self.io_pool.submit(write)
+        future.add_done_callback(lambda f: self.loop.call_soon_threadsafe(done, f))
+        return future
+
+    def on_close(self):
+        """Chiusura della finestra: scrive i risultati ancora in coda e attende le scritture in corso."""
+        self.flush_send_results()
+        self.io_pool.shutdown(wait=True)
+        self.root.destroy()
 
     def send_message(self):
-        self.loop.create_task(self.send_message_async())
+        # Un doppio clic (o un secondo clic durante l'invio) non deve inviare due volte
+        key = form_hash(self.get_form_data())
+        task = self.active_sends.get(key)
+        if task and not task.done():
+            self.status_label.config(text="Invio di questo messaggio già in corso.", foreground="orange")
+            return
+        task = self.loop.create_task(self.send_message_async())
+        self.active_sends[key] = task
+        task.add_done_callback(lambda t: self.active_sends.pop(key, None) if self.active_sends.get(key) is t else None)
+
+    def add_send_progress(self, task, label, total):
+        """Riga di avanzamento di un invio, con pulsante per annullarlo."""
+        row = ttk.Frame(self.sends_frame)
+        row.pack(fill="x", pady=2)
+        ttk.Label(row, text=label, width=25).pack(side="left", padx=5)
+        bar = ttk.Progressbar(row, maximum=max(total, 1), length=200)
+        bar.pack(side="left", padx=5)
+        info = ttk.Label(row, text=f"0/{total} chat", font=("Frutiger", 9, "italic"))
+        info.pack(side="left", padx=5)
+        ttk.Button(row, text="Annulla", command=task.cancel).pack(side="right", padx=5)
+        return row, bar, info
+
+    def form_job(self):
+        """Job di invio con il contenuto del modulo Messaggi."""
+        expiry = EXPIRY_OPTIONS.get(self.expiry_combo.get())
+        return {
+            "title": self.title_entry.get(),
+            "body": self.body_text.get("1.0", "end-1c"),
+            "signature": self.get_signature(),
+            "category": self.category_combo.get(),
+            "chats": self.get_selected_chats(),
+            "attachment_path": self.current_attachment_path,
+            "attachment_type": self.current_attachment_type,
+            "attachment_hash": self.current_attachment_hash,
+            "expires": (datetime.now() + expiry).strftime('%Y-%m-%d %H:%M:%S') if expiry else None,
+            "priority": "urgent" if self.urgent_var.get() else "interactive"
+        }
+
+    def validate_job(self, job):
+        """Ritorna il messaggio d'errore se il job non può essere inviato, altrimenti None."""
+        if not self.bot_pool:
+            return "Errore: Bot non inizializzato."
+        if not job.get("chats"):
+            return "Errore: Seleziona una chat valida."
+        # Verifica se titolo O corpo sono vuoti (necessario per didascalia e testo)
+        if not str(job.get("title", "")).strip() or not str(job.get("body", "")).strip():
+            return "Errore: Titolo e corpo del messaggio non possono essere vuoti."
+        if job.get("attachment_path") or job.get("attachment_type"):
+            if job.get("attachment_type") not in ("photo", "document"):
+                return "Errore: Tipo di allegato non valido."
+            if not job.get("attachment_path") or not os.path.isfile(job["attachment_path"]):
+                return "Errore: File allegato non trovato."
+        if job.get("priority", "interactive") not in SEND_PRIORITIES:
+            return "Errore: Priorità non valida."
+        return None
+
+    def job_digest(self, job):
+        """Hash del contenuto del job, usato dal registro delle consegne."""
+        text = format_message(job["title"], job["body"], job.get("signature", ""), job.get("category", ""))
+        return content_hash(text, job.get("attachment_path"), job.get("attachment_type"), job.get("attachment_hash"))
+
+    def undelivered_chats(self, job):
+        digest = self.job_digest(job)
+        return [chat_id for _, chat_id in job["chats"]
+                if DeliveryLedger.key(digest, chat_id, job.get("campaign", "")) not in self.delivery_ledger]
+
+    async def run_broadcast(self, job, status=None, progress=None):
+        """
+        Invia un job (titolo, corpo, firma, categoria, chat, allegato) con la
+        pipeline comune a modulo Messaggi, API locale e importazioni: registro
+        delle consegne, compressione, chat hub, fan-out sul pool di bot,
+        statistiche, archivio dei message_id e cronologia.
+        job["priority"] sceglie la corsia del fan-out (predefinita "interactive").
+        `status` (dict) viene aggiornato durante l'invio; `progress(testo, fatti, totale)`
+        riceve l'avanzamento. Solleva il primo errore se nessuna chat è stata raggiunta.
+        Finché l'invio è in corso il suo allegato non viene eliminato dal gc.
+        """
+        digest = job.get("attachment_hash")
+        if digest:
+            self.inflight_attachments[digest] += 1
+        try:
+            return await self._run_broadcast(job, status, progress)
+        finally:
+            if digest:
+                self.inflight_attachments[digest] -= 1
+                if not self.inflight_attachments[digest]:
+                    del self.inflight_attachments[digest]
+
+    async def _run_broadcast(self, job, status=None, progress=None):
+        status = status if status is not None else {}
+        message_text_or_caption = format_message(job["title"], job["body"], job.get("signature", ""), job.get("category", ""))
+        chats = job["chats"]
+        attachment_path = job.get("attachment_path")
+        attachment_type = job.get("attachment_type")
+        category = category_name(job.get("category", ""))
+        chat_names = {chat_id: name for name, chat_id in chats}
+        campaign = job.get("campaign", "")
+        lane = job.get("priority", "interactive")
+        broadcast_meta = {
+            "sent": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "expires": job.get("expires"),
+            "title": job["title"].strip(),
+            "body": job["body"].strip(),
+            "signature": job.get("signature", ""),
+            "category": job.get("category", ""),
+            "caption": bool(attachment_path and attachment_type),
+            "attachment_hash": job.get("attachment_hash")
+        }
+
+        hub_chat = str(self.settings.get("HUB_CHAT_ID", "")).strip()
+        fanout_mode = self.settings.get("FANOUT_MODE", "send")
+        sent_ids = [] # [chat_id, message_id, bot_id] delle consegne riuscite, anche se l'invio viene annullato
+        report_rows = [] # Una riga di REPORT_FIELDS per chat
+
+        attachment_hash = job.get("attachment_hash")
+        if attachment_path and attachment_type and not attachment_hash:
+            # Allegato fuori dall'archivio (importazioni): l'hash si calcola fuori dal thread della UI
+            attachment_hash = await self.loop.run_in_executor(None, attachment_digest, attachment_path)
+        digest = content_hash(message_text_or_caption, attachment_path, attachment_type, attachment_hash)
+        payload_bytes = len(message_text_or_caption.encode("utf-8"))
+        if attachment_path and attachment_type:
+            payload_bytes += os.path.getsize(attachment_path)
+        chat_ids = [chat_id for _, chat_id in chats]
+        pending = [c for c in chat_ids if DeliveryLedger.key(digest, c, campaign) not in self.delivery_ledger]
+        status.update(state="running", total=len(chat_ids), skipped=len(chat_ids) - len(pending),
+                      delivered=0, failed=0, uncertain=0, errors={}, report=uuid.uuid4().hex[:12])
+        report_rows += [[str(c), chat_names[c], "skipped", "", 0, None] for c in chat_ids if c not in pending]
+
+        def report(text=None):
+            if progress:
+                progress(text, status["delivered"] + status["failed"], len(pending))
+
+        def show_progress(phase, current, total, rate):
+            if phase == "read":
+                report(f"Lettura allegato {current * 100 // max(total, 1)}% ({rate / 2**20:.1f} MB/s)")
+            elif current < total:
+                report(f"Caricamento allegato ({total / 2**20:.1f} MB)...")
+            else:
+                self.stats.record_upload(total, total / rate if rate else 0)
+                report(f"Allegato caricato ({rate / 2**20:.1f} MB/s)")
+
+        async def send(bot, chat_id):
+            key = DeliveryLedger.key(digest, chat_id, campaign)
+            if key in self.delivery_ledger:
+                report_rows.append([str(chat_id), chat_names[chat_id], "skipped", "", 0, None])
+                return None # Già consegnato in un tentativo precedente
+            t0 = time.perf_counter()
+            timing = {}
+
+            def request_latency():
+                # Senza caricamento e attesa del file_id: il caricamento ha già la sua misura (record_upload)
+                return None if timing.get("uploaded") else time.perf_counter() - timing.get("start", t0)
+
+            try:
+                if hub_message_id:
+                    message, _ = await relay_message(bot, chat_id, hub_chat, hub_message_id, fanout_mode)
+                elif upload:
+                    message, _ = await upload.send(bot, chat_id, message_text_or_caption, timing=timing)
+                else:
+                    message, _ = await deliver_message(bot, chat_id, message_text_or_caption)
+            except asyncio.CancelledError:
+                # Annullato a richiesta in corso: Telegram potrebbe averla già accettata
+                status["uncertain"] += 1
+                status["failed"] += 1
+                report_rows.append([str(chat_id), chat_names[chat_id], "uncertain", "Annullato durante l'invio",
+                                    round((time.perf_counter() - t0) * 1000), None])
+                raise
+            except Exception as e:
+                self.stats.record(chat_id, category, False, 0, request_latency())
+                # Dopo un timeout Telegram potrebbe averlo consegnato comunque: non va nel
+                # registro (sarebbe perso per sempre) ma il rapporto lo segna come incerto
+                result = "uncertain" if isinstance(e, TimedOut) else "failed"
+                if result == "uncertain":
+                    status["uncertain"] += 1
+                status["failed"] += 1
+                status["errors"][str(chat_id)] = type(e).__name__
+                report_rows.append([str(chat_id), chat_names[chat_id], result, f"{type(e).__name__}: {e}"[:200],
+                                    round((time.perf_counter() - t0) * 1000), None])
+                report()
+                raise
+            self.delivery_ledger.add(key)
+            self.stats.record(chat_id, category, True, payload_bytes, request_latency())
+            sent_ids.append([str(chat_id), message.message_id, pool.bot_id(bot)])
+            report_rows.append([str(chat_id), chat_names[chat_id], "ok", "", round((time.perf_counter() - t0) * 1000), message.message_id])
+            status["delivered"] += 1
+            report()
+            return message
+
+        if not pending:
+            status["state"] = "done"
+            return {}
+
+        if attachment_type == 'document' and self.settings.get("COMPRESS_ATTACHMENTS", False):
+            report("Compressione allegato...")
+            attachment_path = await self.loop.run_in_executor(
+                self.compression_pool, compress_attachment, attachment_path,
+                job.get("attachment_hash"), self.settings.get("COMPRESS_MIN_SAVING", 0.2))
+        upload = AttachmentUpload(attachment_path, attachment_type, show_progress) if attachment_path and attachment_type else None
+
+        # Lo stesso pool per tutto l'invio, anche se nel frattempo le impostazioni ricreano i bot
+        pool = self.bot_pool
+        async with pool.in_use():
+            # Con la chat hub il contenuto viene caricato una volta sola e poi copiato/inoltrato
+            hub_message_id = None
+            if hub_chat and fanout_mode != "send" and len(pending) > 1:
+                report("Pubblicazione nella chat hub...")
+                await pool.limiters[0].acquire(SEND_PRIORITIES[lane])
+                if upload:
+                    hub_message, _ = await upload.send(pool.primary, hub_chat, message_text_or_caption)
+                else:
+                    hub_message, _ = await deliver_message(pool.primary, hub_chat, message_text_or_caption)
+                hub_message_id = hub_message.message_id
+                broadcast_meta["forwarded"] = fanout_mode == "forward" # Telegram non ne permette la modifica
+
+            # Fan-out su tutti i bot del pool (una sola chat nel caso normale)
+            try:
+                results = await pool.fan_out(pending, send, lane)
+            except asyncio.CancelledError:
+                status["state"] = "cancelled"
+                raise
+            finally:
+                if sent_ids:
+                    self.write_behind(self.sent_messages.add, status["report"], broadcast_meta, sent_ids)
+                if report_rows:
+                    self.pending_reports.append({
+                        "id": status["report"], "sent": broadcast_meta["sent"],
+                        "job": dict({field: job.get(field) for field in REPORT_JOB_FIELDS}, campaign=campaign),
+                        "rows": report_rows
+                    })
+                self.schedule_results_flush() # Statistiche e rapporti, scritti a blocchi
+                # Le chat già raggiunte restano nel registro: un nuovo invio riprende dalle altre
+                self.persist_chat_bots()
+        errors = [r for r in results.values() if isinstance(r, Exception)]
+        if len(errors) == len(results):
+            status["state"] = "failed"
+            raise errors[0]
+
+        if attachment_path and attachment_type:
+            # Logga il messaggio con un prefisso per l'allegato
+            log_msg = f"[ALLEGATO: {attachment_type}] {message_text_or_caption}"
+        else:
+            log_msg = message_text_or_caption
+        delivered = len(chats) - len(errors)
+        if len(chats) > 1:
+            log_msg = f"[{delivered}/{len(chats)} chat] {log_msg}"
+        self.log_message(log_msg)
+        status["state"] = "done"
+        return results
 
     async def send_message_async(self):
-        if not self.bot:
-            self.status_label.config(text="Errore: Bot non inizializzato.", foreground="red")
-            return
-        
         chat_name = self.chat_combo.get()
-        if not chat_name:
+        if self.bot_pool and not chat_name:
             self.status_label.config(text="Errore: Seleziona una chat.", foreground="red")
             return
-            
-        chat_id = self.config["CHAT_LIST"].get(chat_name)
 
-        if not chat_id:
-            self.status_label.config(text="Errore: Seleziona una chat valida.", foreground="red")
-            return
-        
-        message_text_or_caption = self.get_message()
-        
-        # Verifica se titolo O corpo sono vuoti (necessario per didascalia e testo)
-        if not self.title_entry.get().strip() or not self.body_text.get("1.0", "end-1c").strip():
-            self.status_label.config(text="Errore: Titolo e corpo del messaggio non possono essere vuoti.", foreground="red")
+        job = self.form_job()
+        error = self.validate_job(job)
+        if error:
+            self.status_label.config(text=error, foreground="red")
             return
-            
+
+        status = {}
+        progress_row = None
         try:
+            if not self.undelivered_chats(job):
+                if not messagebox.askyesno("Messaggio già inviato", "Questo messaggio è già stato consegnato a tutte le chat selezionate.\n\nInviarlo di nuovo?"):
+                    self.status_label.config(text="Invio annullato: messaggio già consegnato.", foreground="orange")
+                    return
+                # Nuova campagna: stesse chat, chiavi diverse
+                job["campaign"] = datetime.now().strftime('%Y%m%d%H%M%S%f')
+
             self.status_label.config(text=f"Invio messaggio a {chat_name}...", foreground="blue")
-            
-            # Logica di invio: con o senza allegato
-            if self.current_attachment_path and self.current_attachment_type:
-                # C'è un allegato
-                with open(self.current_attachment_path, 'rb') as f:
-                    if self.current_attachment_type == 'photo':
-                        await self.bot.send_photo(chat_id=chat_id, photo=f, caption=message_text_or_caption, parse_mode='MarkdownV2')
-                    elif self.current_attachment_type == 'document':
-                        await self.bot.send_document(chat_id=chat_id, document=f, caption=message_text_or_caption, parse_mode='MarkdownV2')
-                
-                # Logga il messaggio con un prefisso per l'allegato
-                log_msg = f"[ALLEGATO: {self.current_attachment_type}] {message_text_or_caption}"
-            
-            else:
-                # Invia solo testo
-                await self.bot.send_message(chat_id=chat_id, text=message_text_or_caption, parse_mode='MarkdownV2')
-                log_msg = message_text_or_caption
+            progress_row, bar, info = self.add_send_progress(asyncio.current_task(), job["title"].strip()[:30], len(job["chats"]))
+
+            def progress(text, done, total):
+                if not progress_row.winfo_exists():
+                    return
+                bar.config(maximum=max(total, 1), value=done)
+                info.config(text=text or f"{done}/{total} chat")
+
+            await self.run_broadcast(job, status, progress)
 
             # Se l'invio ha successo:
-            self.status_label.config(text="Messaggio inviato!", foreground="green")
-            self.log_message(log_msg)
+            if status["failed"]:
+                uncertain = f", {status['uncertain']} incerte per timeout" if status["uncertain"] else ""
+                self.status_label.config(text=f"Messaggio inviato a {status['total'] - status['failed']} chat su {status['total']}{uncertain} (dettagli in Cronologia > Rapporti).", foreground="orange")
+            elif status["skipped"]:
+                self.status_label.config(text=f"Messaggio inviato! ({status['skipped']} chat lo avevano già ricevuto)", foreground="green")
+            else:
+                self.status_label.config(text="Messaggio inviato!", foreground="green")
             
             # Pulisci i campi
             self.title_entry.delete(0, "end")
             self.body_text.delete("1.0", "end")
             self.other_signature_entry.delete(0, "end")
             self.remove_attachment() # Rimuovi l'allegato dopo l'invio
+            self.current_draft_id = None
             
+        except asyncio.CancelledError:
+            self.status_label.config(text=f"Invio annullato dopo {status.get('delivered', 0)} chat su {len(job['chats'])}.", foreground="orange")
         except FileNotFoundError:
              self.status_label.config(text=f"Errore: File allegato non trovato.", foreground="red")
              messagebox.showerror("Errore File", f"Impossibile trovare il file da allegare.") # Rimossi: \n{self.current_attachment_path}
@@ -1295,6 +4029,578 @@ Esegue il download e il backup dello script.
         except Exception as e:
             self.status_label.config(text=f"Errore: {e}", foreground="red")
             messagebox.showerror("Errore", f"Si è verificato un errore.") # Rimossi: {e}
+        finally:
+            if progress_row:
+                progress_row.destroy()
+
+    # ---------- Local Submission API ----------
+    async def restart_api_server(self):
+        """Avvia (o riavvia con le nuove impostazioni) l'API locale, se abilitata."""
+        if self.api_server:
+            self.api_server.close()
+            self.api_server = None
+        secret = self.settings.get("API_SECRET", "")
+        if not self.settings.get("API_ENABLED", False) or not secret:
+            return
+        server = SubmissionServer(secret, self.submit_api_job, self.api_jobs.get)
+        try:
+            await server.start(self.settings.get("API_HOST", "127.0.0.1"), int(self.settings.get("API_PORT", 8765)))
+        except OSError as e:
+            self.status_label.config(text=f"API locale non avviata: {e}", foreground="red")
+            return
+        self.api_server = server
+
+    def resolve_chats(self, chats):
+        """Chat del job per nome o per ID, solo tra quelle configurate; "all" = tutte."""
+        chat_list = self.config.get("CHAT_LIST", {})
+        if chats in ("all", ALL_CHATS_OPTION):
+            return [(name, chat_id) for name, chat_id in chat_list.items() if chat_id]
+        if isinstance(chats, (str, int)):
+            chats = [chats]
+        by_id = {str(chat_id): name for name, chat_id in chat_list.items()}
+        resolved = []
+        for chat in chats if isinstance(chats, list) else []:
+            if str(chat) in chat_list:
+                resolved.append((str(chat), chat_list[str(chat)]))
+            elif str(chat) in by_id:
+                resolved.append((by_id[str(chat)], chat_list[by_id[str(chat)]]))
+            else:
+                return None
+        return resolved
+
+    def job_from_payload(self, payload, local_files=False):
+        """
+        Job di invio da un dict JSON (API locale, importazioni), validato come dal modulo Messaggi.
+        Con `local_files` l'allegato può essere un percorso qualsiasi (importazioni scelte
+        dall'utente); altrimenti solo un file dell'archivio allegati, per attachment_hash.
+        """
+        chats = self.resolve_chats(payload.get("chats", []))
+        if chats is None:
+            return None, "Chat sconosciuta"
+        category = str(payload.get("category") or "Nessuna")
+        if category != "Nessuna" and category not in self.settings.get("CATEGORIES", []):
+            return None, "Categoria sconosciuta"
+        job = {
+            "title": str(payload.get("title", "")),
+            "body": str(payload.get("body", "")),
+            "signature": str(payload.get("signature", "")),
+            "category": category,
+            "chats": chats,
+            "attachment_path": payload.get("attachment_path") if local_files else None,
+            "attachment_type": payload.get("attachment_type"),
+            "attachment_hash": None,
+            "expires": None,
+            "priority": str(payload.get("priority") or "interactive")
+        }
+        if payload.get("attachment_path") and not local_files:
+            return None, "Allegato non consentito: usare attachment_hash di un file dell'archivio allegati"
+        if payload.get("attachment_hash"):
+            digest = str(payload["attachment_hash"]).lower()
+            path = self.attachments.path(digest) if re.fullmatch(r"[0-9a-f]{64}", digest) else None
+            if not path:
+                return None, "Allegato sconosciuto"
+            job["attachment_path"], job["attachment_hash"] = path, digest
+            if not job["attachment_type"]:
+                job["attachment_type"] = "photo" if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS else "document"
+        if payload.get("expires_in"):
+            try:
+                expires_in = timedelta(seconds=float(payload["expires_in"]))
+            except (TypeError, ValueError, OverflowError):
+                return None, "expires_in non valido"
+            if expires_in > EXPIRY_MAX:
+                return None, "expires_in oltre le 47 ore: Telegram non permette ai bot di eliminare messaggi più vecchi"
+            job["expires"] = (datetime.now() + expires_in).strftime('%Y-%m-%d %H:%M:%S')
+        if payload.get("resend"):
+            job["campaign"] = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        error = self.validate_job(job)
+        return (None, error) if error else (job, None)
+
+    def submit_api_job(self, payload):
+        job, error = self.job_from_payload(payload)
+        if error:
+            return None, error
+        job_id = uuid.uuid4().hex[:12]
+        status = {"id": job_id, "state": "queued", "submitted": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                  "title": job["title"].strip()}
+        self.api_jobs[job_id] = status
+        self.prune_api_jobs()
+        self.loop.create_task(self.run_api_job(job, status))
+        return job_id, None
+
+    async def run_api_job(self, job, status):
+        try:
+            await self.run_broadcast(job, status)
+        except asyncio.CancelledError:
+            status["state"] = "cancelled"
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = type(e).__name__
+
+    def prune_api_jobs(self):
+        finished = [job_id for job_id, status in self.api_jobs.items() if status["state"] not in ("queued", "running")]
+        for job_id in finished[:max(0, len(finished) - API_MAX_FINISHED_JOBS)]:
+            del self.api_jobs[job_id]
+
+    # ---------- Dry Run ----------
+    def new_dry_run(self, lane):
+        """DryRun con i bot configurati, le chat già assegnate e le misure degli invii precedenti."""
+        latency, upload_rate = self.stats.measured()
+        if self.bot_pool:
+            bot_ids, chat_bots, concurrency = self.bot_pool.bot_ids, self.bot_pool.chat_bots, self.bot_pool.lane_caps[lane]
+        else:
+            bot_ids = [t.split(":", 1)[0] for t in get_bot_tokens(self.config)]
+            chat_bots = self.config.get("CHAT_BOTS", {})
+            concurrency = self.settings.get("BOT_CONCURRENCY", 8) * LANE_SHARES[lane]
+        return DryRun(self.settings, bot_ids, chat_bots, concurrency, latency, upload_rate)
+
+    def dry_run_job(self, dry_run, job):
+        """Valida il job come l'invio reale e lo aggiunge alla stima. Ritorna (chat già consegnate, errori)."""
+        error = self.validate_job(job)
+        if error:
+            return 0, [error]
+        pending = self.undelivered_chats(job)
+        text = format_message(job["title"], job["body"], job.get("signature", ""), job.get("category", ""))
+        errors = dry_run.add(text, pending, job.get("attachment_path"), job.get("attachment_type"))
+        return len(job["chats"]) - len(pending), errors
+
+    def dry_run_summary(self, dry_run, skipped):
+        duration, requests, nbytes = dry_run.estimate()
+        latency_measured, upload_measured = dry_run.measured
+        lines = [
+            f"Messaggi: {dry_run.messages} verso {dry_run.chats} chat" + (f" ({skipped} già consegnate)" if skipped else ""),
+            f"Richieste: {requests} su {len(dry_run.bot_ids)} bot ({dry_run.rate:g}/s ciascuno)",
+            f"Dati inviati: {nbytes / 2**20:.2f} MB",
+            f"Durata stimata: {format_duration(duration)}",
+            "",
+            f"Latenza per richiesta: {dry_run.latency * 1000:.0f} ms ({'misurata' if latency_measured else 'predefinita'})",
+            f"Caricamento: {dry_run.upload_rate / 2**20:.1f} MB/s ({'misurato' if upload_measured else 'predefinito'})"
+        ]
+        if self.settings.get("COMPRESS_ATTACHMENTS", False):
+            lines.append("Dimensioni dei documenti prima della compressione.")
+        return "\n".join(lines)
+
+    def dry_run_form(self):
+        """Stima dell'invio del modulo Messaggi, senza contattare Telegram."""
+        job = self.form_job()
+        dry_run = self.new_dry_run(job["priority"])
+        skipped, errors = self.dry_run_job(dry_run, job)
+        if errors:
+            messagebox.showwarning("Simulazione Invio", "L'invio fallirebbe:\n\n" + "\n".join(errors))
+            return
+        messagebox.showinfo("Simulazione Invio", self.dry_run_summary(dry_run, skipped))
+
+    async def dry_run_import(self, path):
+        """Valida tutte le righe di una campagna e stima il suo invio nella corsia bulk."""
+        base_dir = os.path.dirname(path)
+        dry_run = self.new_dry_run("bulk")
+        skipped = 0
+        rejected = []
+        rows = iter_import_rows(path)
+        self.status_label.config(text="Simulazione della campagna...", foreground="blue")
+        try:
+            while True:
+                batch = await self.loop.run_in_executor(None, lambda: list(itertools.islice(rows, IMPORT_BATCH)))
+                if not batch:
+                    break
+                for line, row, error in batch:
+                    errors = [error] if error else []
+                    if not error:
+                        job, error = self.job_from_payload(import_row_payload(row, base_dir), local_files=True)
+                        if error:
+                            errors = [error]
+                        else:
+                            row_skipped, errors = self.dry_run_job(dry_run, job)
+                            skipped += row_skipped
+                    rejected += [f"Riga {line}: {e}" for e in errors]
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            self.status_label.config(text=f"Errore di lettura durante la simulazione: {e}", foreground="red")
+            return
+        self.status_label.config(text="")
+        text = self.dry_run_summary(dry_run, skipped)
+        if rejected:
+            text += f"\n\n{len(rejected)} errori:\n" + "\n".join(rejected[:10])
+            if len(rejected) > 10:
+                text += "\n..."
+            messagebox.showwarning("Simulazione Campagna", text)
+        else:
+            messagebox.showinfo("Simulazione Campagna", text)
+
+    # ---------- Bulk Import ----------
+    def import_campaign(self):
+        """Sceglie un file CSV/JSONL e mostra l'anteprima delle prime righe prima dell'invio."""
+        path = filedialog.askopenfilename(title="Importa campagna", filetypes=[("CSV o JSONL", "*.csv *.jsonl *.ndjson"), ("Tutti i file", "*.*")])
+        if not path:
+            return
+        base_dir = os.path.dirname(path)
+        try:
+            preview = list(itertools.islice(iter_import_rows(path), IMPORT_PREVIEW_ROWS))
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            messagebox.showerror("Importazione", f"Impossibile leggere il file:\n{e}")
+            return
+
+        win = tk.Toplevel(self.root)
+        win.title(f"Importa Campagna - {os.path.basename(path)}")
+        win.geometry("700x420")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        ttk.Label(frame, text=f"Anteprima delle prime {len(preview)} righe:", font=("Frutiger", 12, "bold")).pack(anchor="w")
+
+        columns = ("line", "chat", "title", "result")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=12)
+        for col, text, width in [("line", "Riga", 50), ("chat", "Chat", 140), ("title", "Titolo", 250), ("result", "Esito", 220)]:
+            tree.heading(col, text=text)
+            tree.column(col, width=width)
+        tree.pack(fill="both", expand=True, pady=5)
+        for line, row, error in preview:
+            if not error:
+                _, error = self.job_from_payload(import_row_payload(row, base_dir), local_files=True)
+            tree.insert("", "end", values=(line, import_field(row, "chat"), import_field(row, "title"), error or "OK"))
+
+        def start():
+            win.destroy()
+            self.loop.create_task(self.run_import(path))
+
+        btn_frame = ttk.Frame(frame)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="Simula", command=lambda: self.loop.create_task(self.dry_run_import(path))).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Invia Tutto", command=start).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Annulla", command=win.destroy).pack(side="left", padx=5)
+
+    async def run_import(self, path):
+        """
+        Invia una campagna importata riga per riga: le righe vengono lette a
+        blocchi in un thread, validate e inviate con concorrenza limitata.
+        Le righe non valide o non consegnate finiscono in <file>.scarti.csv.
+        """
+        base_dir = os.path.dirname(path)
+        rejects_path = f"{os.path.splitext(path)[0]}.scarti.csv"
+        try:
+            total = await self.loop.run_in_executor(None, lambda: sum(1 for _ in iter_import_rows(path)))
+            # Prima della riga di avanzamento: se il file non si può creare non resta nulla a metà
+            rejects_file = open(rejects_path, "w", encoding="utf-8", newline="")
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            self.status_label.config(text=f"Importazione non avviata: {e}", foreground="red")
+            return
+        counts = {"sent": 0, "skipped": 0, "rejected": 0}
+        semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        tasks = set()
+
+        with rejects_file:
+            rejects = csv.writer(rejects_file)
+            rejects.writerow(["riga", "errore", "dati"])
+            progress_row, bar, info = self.add_send_progress(asyncio.current_task(), f"Campagna {os.path.basename(path)}"[:30], total)
+
+            def update():
+                if progress_row.winfo_exists():
+                    done = sum(counts.values())
+                    bar.config(value=done)
+                    info.config(text=f"{done}/{total} righe, {counts['rejected']} scartate")
+
+            def reject(line, error, row):
+                rejects.writerow([line, error, json.dumps(row, ensure_ascii=False)])
+                counts["rejected"] += 1
+                update()
+
+            async def send(line, job, row):
+                status = {}
+                try:
+                    await self.run_broadcast(job, status)
+                    counts["skipped" if status.get("skipped") else "sent"] += 1
+                    update()
+                except Exception as e:
+                    reject(line, f"Invio non riuscito: {type(e).__name__}", row)
+                finally:
+                    semaphore.release()
+
+            rows = iter_import_rows(path)
+            try:
+                while True:
+                    batch = await self.loop.run_in_executor(None, lambda: list(itertools.islice(rows, IMPORT_BATCH)))
+                    if not batch:
+                        break
+                    for line, row, error in batch:
+                        job = None
+                        if not error:
+                            job, error = self.job_from_payload(import_row_payload(row, base_dir), local_files=True)
+                        if error:
+                            reject(line, error, row)
+                            continue
+                        job["priority"] = "bulk" # Non deve rallentare gli invii dal modulo Messaggi
+                        await semaphore.acquire()
+                        task = self.loop.create_task(send(line, job, row))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*tasks)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                self.status_label.config(text=f"Importazione annullata: {counts['sent']} messaggi inviati.", foreground="orange")
+                raise
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                self.status_label.config(text=f"Errore di lettura alla riga {sum(counts.values()) + 1}: {e}", foreground="red")
+                return
+            finally:
+                with contextlib.suppress(ValueError): # Generatore ancora in uso nel thread dopo un annullamento
+                    rows.close()
+                progress_row.destroy()
+
+        if not counts["rejected"]:
+            os.remove(rejects_path)
+        text = f"Campagna importata: {counts['sent']} messaggi inviati"
+        if counts["skipped"]:
+            text += f", {counts['skipped']} già consegnati"
+        if counts["rejected"]:
+            text += f", {counts['rejected']} scartati (vedi {os.path.basename(rejects_path)})"
+        self.status_label.config(text=text, foreground="orange" if counts["rejected"] else "green")
+
+    # ---------- Delivery Reports ----------
+    def show_delivery_reports(self):
+        """Rapporti di consegna per chat, ordinabili per colonna, con nuovo invio ai soli falliti."""
+        win = tk.Toplevel(self.root)
+        win.title("Rapporti di Consegna")
+        win.geometry("800x480")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+
+        reports_list = tk.Listbox(frame, height=6)
+        reports_list.pack(fill="x")
+        columns = ("chat", "status", "error", "latency_ms", "message_id")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=12)
+        for col, text, width in [("chat", "Chat", 150), ("status", "Esito", 70), ("error", "Errore", 380),
+                                 ("latency_ms", "Latenza (ms)", 90), ("message_id", "Message ID", 90)]:
+            tree.heading(col, text=text, command=lambda c=col: sort_by(c))
+            tree.column(col, width=width)
+        tree.pack(fill="both", expand=True, pady=5)
+        status = ttk.Label(frame, text="", font=("Frutiger", 10, "italic"))
+        reports = []
+        sort_state = {"column": None, "reverse": False}
+        status_labels = {"ok": "OK", "failed": "Fallito", "uncertain": "Incerto", "skipped": "Già inviato"}
+
+        def refresh_reports():
+            reports[:] = list(reversed(self.delivery_reports.all()))
+            reports_list.delete(0, "end")
+            for r in reports:
+                uncertain = f", {r['uncertain']} incerti" if r.get("uncertain") else ""
+                reports_list.insert("end", f"{r['sent']} - {r['title'][:40]} ({r['ok']} ok, {r['failed']} falliti{uncertain})")
+
+        def selected_report():
+            """Rapporto completo (righe e job) della voce selezionata, letto solo ora."""
+            sel = reports_list.curselection()
+            return self.delivery_reports.get(reports[sel[0]]["id"]) if sel else None
+
+        def show_rows(event=None):
+            report = selected_report()
+            tree.delete(*tree.get_children())
+            if not report:
+                return
+            for chat_id, name, result, error, latency, message_id in report["rows"]:
+                tree.insert("", "end", values=(name, status_labels.get(result, result), error, latency, message_id or ""))
+
+        def sort_by(column):
+            sort_state["reverse"] = not sort_state["reverse"] if sort_state["column"] == column else False
+            sort_state["column"] = column
+            numeric = column in ("latency_ms", "message_id")
+            items = [(tree.set(item, column), item) for item in tree.get_children()]
+            items.sort(key=lambda pair: (int(pair[0]) if pair[0] else -1) if numeric else pair[0].lower(),
+                       reverse=sort_state["reverse"])
+            for index, (_, item) in enumerate(items):
+                tree.move(item, "", index)
+
+        def retry_failed():
+            report = selected_report()
+            if not report:
+                return
+            failed = [(row[1], row[0]) for row in report["rows"] if row[2] == "failed"]
+            uncertain = [(row[1], row[0]) for row in report["rows"] if row[2] == "uncertain"]
+            if uncertain and messagebox.askyesno(
+                    "Consegne incerte",
+                    f"{len(uncertain)} chat sono andate in timeout: Telegram potrebbe aver già consegnato "
+                    "il messaggio. Reinviarlo anche a queste chat (possibili doppioni)?", parent=win):
+                failed += uncertain
+            if not failed:
+                status.config(text="Nessuna consegna fallita in questo invio.")
+                return
+            job = dict(report["job"], chats=failed)
+            # Il percorso salvato può essere cambiato (archivio ripristinato): vale l'hash
+            if job.get("attachment_hash") and self.attachments.path(job["attachment_hash"]):
+                job["attachment_path"] = self.attachments.path(job["attachment_hash"])
+            error = self.validate_job(job)
+            if error:
+                status.config(text=error)
+                return
+            self.loop.create_task(run_retry(job))
+
+        async def run_retry(job):
+            status.config(text=f"Nuovo invio a {len(job['chats'])} chat...")
+            result = {}
+            try:
+                await self.run_broadcast(job, result)
+            except Exception:
+                pass # L'esito è nel nuovo rapporto
+            await asyncio.wrap_future(self.flush_send_results()) # Il nuovo rapporto deve essere su disco
+            if win.winfo_exists():
+                status.config(text=f"Nuovo invio: {result.get('delivered', 0)} consegnati, {result.get('failed', 0)} falliti.")
+                refresh_reports()
+                reports_list.selection_set(0)
+                show_rows()
+
+        reports_list.bind("<<ListboxSelect>>", show_rows)
+        btn_frame = ttk.Frame(frame)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="Riprova Solo Falliti", command=retry_failed).pack(side="left", padx=5)
+        status.pack()
+        refresh_reports()
+
+    def write_behind(self, fn, *args):
+        """Esegue una scrittura su disco nel thread di I/O, senza bloccare la GUI."""
+        def done(future):
+            if future.exception():
+                self.loop.call_soon_threadsafe(lambda: self.status_label.config(
+                    text=f"Errore di scrittura dei dati: {future.exception()}", foreground="red"))
+        self.io_pool.submit(fn, *args).add_done_callback(done)
+
+    # ---------- Sent Broadcast Management ----------
+    async def edit_broadcast(self, broadcast_id, body):
+        """Modifica il testo di un invio su tutte le chat, in parallelo sotto il rate limiter."""
+        entry = self.sent_messages.all().get(broadcast_id)
+        if not entry or not self.bot_pool:
+            return {}
+        text = format_message(entry["title"], body, entry.get("signature", ""), entry.get("category", ""))
+        messages = self.sent_messages.messages(broadcast_id)
+        message_ids = {str(m[0]): m[1] for m in messages}
+
+        async def edit(bot, chat_id):
+            if entry.get("caption"):
+                return await bot.edit_message_caption(chat_id=chat_id, message_id=message_ids[chat_id], caption=text, parse_mode='MarkdownV2')
+            return await bot.edit_message_text(chat_id=chat_id, message_id=message_ids[chat_id], text=text, parse_mode='MarkdownV2')
+
+        results = await self.bot_pool.fan_out(list(message_ids), edit, senders=message_senders(messages))
+        if any(not isinstance(r, Exception) for r in results.values()):
+            self.sent_messages.update(broadcast_id, body=body)
+        return results
+
+    async def delete_broadcast(self, broadcast_id):
+        """Elimina un invio da tutte le chat; le chat riuscite escono dall'archivio."""
+        if not self.bot_pool:
+            return {}
+        messages = self.sent_messages.messages(broadcast_id)
+        message_ids = {str(m[0]): m[1] for m in messages}
+
+        async def delete(bot, chat_id):
+            return await bot.delete_message(chat_id=chat_id, message_id=message_ids[chat_id])
+
+        results = await self.bot_pool.fan_out(list(message_ids), delete, senders=message_senders(messages))
+        self.sent_messages.remove_messages(broadcast_id, [c for c, r in results.items() if not isinstance(r, Exception)])
+        return results
+
+    def check_expired_broadcasts(self):
+        """Programma l'eliminazione degli invii scaduti e si ri-schedula."""
+        for broadcast_id in self.sent_messages.expired():
+            if broadcast_id not in self.expiring: # Un'eliminazione lenta non va ripartita al controllo successivo
+                self.expiring.add(broadcast_id)
+                self.loop.create_task(self.delete_expired_broadcast(broadcast_id))
+        self.root.after(EXPIRY_CHECK_MS, self.check_expired_broadcasts)
+
+    async def delete_expired_broadcast(self, broadcast_id):
+        try:
+            results = await self.delete_broadcast(broadcast_id)
+            # Le chat dove l'eliminazione è fallita (es. messaggio troppo vecchio) non vengono ritentate
+            self.sent_messages.update(broadcast_id, expires=None)
+        finally:
+            self.expiring.discard(broadcast_id)
+        failed = sum(1 for r in results.values() if isinstance(r, Exception))
+        if failed:
+            self.status_label.config(text=f"Messaggio scaduto: eliminazione non riuscita in {failed} chat.", foreground="orange")
+
+    def show_sent_broadcasts(self):
+        """Finestra con gli invii recenti: modifica o eliminazione su tutte le chat."""
+        win = tk.Toplevel(self.root)
+        win.title("Messaggi Inviati")
+        win.geometry("650x400")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+
+        columns = ("sent", "title", "chats", "expires")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=12)
+        for col, text, width in [("sent", "Inviato", 140), ("title", "Titolo", 250), ("chats", "Chat", 60), ("expires", "Scadenza", 140)]:
+            tree.heading(col, text=text)
+            tree.column(col, width=width)
+        tree.pack(fill="both", expand=True)
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            broadcasts = self.sent_messages.all()
+            for bid in sorted(broadcasts, key=lambda b: broadcasts[b]["sent"], reverse=True):
+                entry = broadcasts[bid]
+                tree.insert("", "end", iid=bid, values=(entry["sent"], entry["title"], entry["chats"], entry.get("expires") or "-"))
+
+        def selected():
+            sel = tree.selection()
+            return sel[0] if sel else None
+
+        async def run(action, label, *args):
+            status.config(text=f"{label} in corso...")
+            results = await action(*args)
+            failed = sum(1 for r in results.values() if isinstance(r, Exception))
+            status.config(text=f"{label}: {len(results) - failed} riuscite, {failed} fallite.")
+            if win.winfo_exists():
+                refresh()
+
+        def edit():
+            bid = selected()
+            if not bid: return
+            entry = self.sent_messages.all()[bid]
+            if entry.get("forwarded"):
+                messagebox.showwarning("Modifica", "Questo messaggio è stato inoltrato dalla chat hub: Telegram non permette di modificarlo, solo di eliminarlo.", parent=win)
+                return
+            body = self.ask_text("Modifica Messaggio", "Nuovo testo del messaggio:", entry.get("body", ""), parent=win)
+            if body and body != entry.get("body"):
+                self.loop.create_task(run(self.edit_broadcast, "Modifica", bid, body))
+
+        def delete():
+            bid = selected()
+            if not bid: return
+            if messagebox.askyesno("Elimina", "Eliminare questo messaggio da tutte le chat?", parent=win):
+                self.loop.create_task(run(self.delete_broadcast, "Eliminazione", bid))
+
+        btn_frame = ttk.Frame(frame)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="Modifica Testo", command=edit).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Elimina da Tutte le Chat", command=delete).pack(side="left", padx=5)
+        status = ttk.Label(frame, text="", font=("Frutiger", 10, "italic"))
+        status.pack()
+        refresh()
+
+    def ask_text(self, title, prompt, initial="", parent=None):
+        """Come simpledialog.askstring, ma con un campo di testo su più righe."""
+        dialog = tk.Toplevel(parent or self.root)
+        dialog.title(title)
+        dialog.transient(parent or self.root)
+        ttk.Label(dialog, text=prompt).pack(anchor="w", padx=10, pady=(10, 0))
+        text = tk.Text(dialog, height=12, width=60, wrap="word", font=("Frutiger", 11))
+        text.pack(fill="both", expand=True, padx=10, pady=5)
+        text.insert("1.0", initial)
+        result = []
+
+        def confirm():
+            result.append(text.get("1.0", "end-1c").strip())
+            dialog.destroy()
+
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="OK", command=confirm).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Annulla", command=dialog.destroy).pack(side="left", padx=5)
+        dialog.grab_set()
+        dialog.wait_window()
+        return result[0] if result else None
+
+    def persist_chat_bots(self):
+        """Salva in config l'associazione chat -> bot scoperta durante l'invio."""
+        if self.bot_pool and self.bot_pool.chat_bots != self.config.get("CHAT_BOTS", {}):
+            chat_bots = dict(self.bot_pool.chat_bots)
+            self.config["CHAT_BOTS"] = chat_bots
+            update_json(CONFIG_FILE, {}, lambda config: config.setdefault("CHAT_BOTS", {}).update(chat_bots))
 
 
 # ---------- Main Execution Block ----------